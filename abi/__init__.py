@@ -2,3 +2,4 @@ from abi.erc20_abi import ERC20_ABI
 from abi.stargate_router_abi import STARGATE_ROUTER_ABI
 from abi.btcb_abi import BTCB_ABI
 from abi.optimism_gas_oracle_abi import OPTIMISM_GAS_ORACLE_ABI
+from abi.multicall3_abi import MULTICALL3_ABI
@@ -1,12 +1,13 @@
 import logging
-import random
 import time
+from dataclasses import dataclass
+from typing import Optional
 
 from eth_account.signers.local import LocalAccount
 from web3.types import TxParams
 
 from abi import BTCB_ABI
-from network import EVMNetwork, Optimism, Avalanche
+from network import EVMNetwork, Optimism, Avalanche, TransactionStatus
 from btcb.constants import BTCbConstants
 
 logger = logging.getLogger(__name__)
@@ -64,8 +65,10 @@ class BTCbUtils:
         return gas_price
 
     @staticmethod
-    def is_enough_native_balance_for_bridge_fee(src_network: EVMNetwork, dst_network: EVMNetwork, address: str):
-        account_balance = src_network.get_balance(address)
+    def is_enough_native_balance_for_bridge_fee(src_network: EVMNetwork, dst_network: EVMNetwork, address: str,
+                                                account_balance: Optional[int] = None):
+        if account_balance is None:
+            account_balance = src_network.get_balance(address)
         gas_price = BTCbUtils.estimate_bridge_gas_price(src_network, dst_network, address)
         layerzero_fee = BTCbUtils.estimate_layerzero_bridge_fee(src_network, dst_network, address)
 
@@ -74,20 +77,27 @@ class BTCbUtils:
         return enough_native_token_balance
 
     @staticmethod
-    def get_btcb_balance(network: EVMNetwork, address: str) -> int:
+    def get_btcb_contract_address(network: EVMNetwork) -> str:
+        """ Method that returns the BTC.b token contract (on Avalanche the OFT contract wraps the base token) """
+
         if isinstance(network, Avalanche):
-            return network.get_token_balance(BTCbConstants.BTCB_BASE_AVALANCHE_CONTRACT_ADDRESS, address)
+            return BTCbConstants.BTCB_BASE_AVALANCHE_CONTRACT_ADDRESS
+
+        return BTCbConstants.BTCB_CONTRACT_ADDRESS
 
-        return network.get_token_balance(BTCbConstants.BTCB_CONTRACT_ADDRESS, address)
+    @staticmethod
+    def get_btcb_balance(network: EVMNetwork, address: str) -> int:
+        return network.get_token_balance(BTCbUtils.get_btcb_contract_address(network), address)
 
     @staticmethod
     def build_bridge_transaction(src_network: EVMNetwork, dst_network: EVMNetwork,
-                                 amount: int, address: str) -> TxParams:
+                                 amount: int, address: str, nonce: Optional[int] = None) -> TxParams:
         btcb_contract = src_network.w3.eth.contract(address=BTCbConstants.BTCB_CONTRACT_ADDRESS, abi=BTCB_ABI)
 
         layerzero_fee = BTCbUtils.estimate_layerzero_bridge_fee(src_network, dst_network, address)
 
-        nonce = src_network.get_nonce(address)
+        if nonce is None:
+            nonce = src_network.get_nonce(address)
         gas_params = src_network.get_transaction_gas_params()
         logger.info(f'Estimated fees. LayerZero fee: {layerzero_fee}. Gas settings: {gas_params}')
 
@@ -106,6 +116,7 @@ class BTCbUtils:
                 'value': layerzero_fee,
                 'gas': BTCbConstants.get_randomized_bridge_gas_limit(src_network.name),
                 **gas_params,
+                'chainId': src_network.get_chain_id(),
                 'nonce': nonce
             }
         )
@@ -113,6 +124,13 @@ class BTCbUtils:
         return tx
 
 
+@dataclass
+class PreparedBridge:
+    amount: int
+    tx: TxParams  # Built bridge transaction (unsigned)
+    prepared_at: float
+
+
 class BTCbBridgeHelper:
     def __init__(self, account: LocalAccount, src_network: EVMNetwork, dst_network: EVMNetwork, amount: int) -> None:
         self.account = account
@@ -120,22 +138,79 @@ class BTCbBridgeHelper:
         self.dst_network = dst_network
         self.amount = amount
 
-    def make_bridge(self) -> bool:
+    def prepare(self) -> Optional[PreparedBridge]:
+        """ Method that performs the bridge checks and builds the bridge transaction in advance.
+        Returns None if the bridge isn't possible or an approval is required first """
+
         if not self._is_bridge_possible():
-            return False
+            return None
 
-        if isinstance(self.src_network, Avalanche):
-            result = self._approve_btcb_usage(self.amount)
+        if self._is_approval_required():
+            return None
+
+        tx = BTCbUtils.build_bridge_transaction(self.src_network, self.dst_network, self.amount, self.account.address)
+
+        return PreparedBridge(self.amount, tx, time.time())
+
+    def make_bridge(self, prepared: Optional[PreparedBridge] = None) -> bool:
+        """ Method that performs bridge from src_network to dst_network. The prepared bridge transaction
+        is sent at once, without the checks """
 
-            if not result:
+        if prepared:
+            if not self._simulate_bridge(prepared.tx):
                 return False
 
-            time.sleep(random.randint(10, 60))
+            try:
+                tx_hash = self._send_bridge_transaction(prepared.tx)
+            except ValueError as ex:
+                # Nonce or fees became outdated
+                logger.warning(f"Prepared bridge transaction was rejected: {ex}. Building a new one")
+            else:
+                return self._wait_for_bridge(tx_hash)
+
+        if not self._is_bridge_possible():
+            return False
+
+        if self._is_approval_required():
+            # The bridge can't be simulated before the approve is mined
+            return self._make_bridge_with_approval()
 
-        tx_hash = self._send_bridge_transaction()
+        tx = BTCbUtils.build_bridge_transaction(self.src_network, self.dst_network, self.amount, self.account.address)
+        if not self._simulate_bridge(tx):
+            return False
+
+        return self._wait_for_bridge(self._send_bridge_transaction(tx))
+
+    def _simulate_bridge(self, tx: TxParams) -> bool:
+        """ Method that simulates the bridge and returns False if it would revert """
+
+        revert_reason = self.src_network.simulate_transaction(tx, ('btcb', self.src_network.name,
+                                                                   self.dst_network.name))
+        if revert_reason is None:
+            return True
+
+        # The cached allowance could be stale and make the bridge revert. The next attempt reads it on-chain
+        if isinstance(self.src_network, Avalanche):
+            self.src_network.record_allowance_spend(BTCbConstants.BTCB_BASE_AVALANCHE_CONTRACT_ADDRESS,
+                                                    self.account.address, BTCbConstants.BTCB_CONTRACT_ADDRESS,
+                                                    self.amount, False)
+
+        logger.error(f"BTC.b bridge simulation failed: {revert_reason}. The bridge is skipped")
+        return False
+
+    def _wait_for_bridge(self, tx_hash) -> bool:
         result = self.src_network.wait_for_transaction(tx_hash)
 
-        return self.src_network.check_tx_result(result, "BTC.b bridge")
+        return self._check_bridge_result(result)
+
+    def _check_bridge_result(self, result: TransactionStatus) -> bool:
+        succeed = self.src_network.check_tx_result(result, "BTC.b bridge")
+        if isinstance(self.src_network, Avalanche) and result != TransactionStatus.NOT_FOUND:
+            self.src_network.record_allowance_spend(BTCbConstants.BTCB_BASE_AVALANCHE_CONTRACT_ADDRESS,
+                                                    self.account.address, BTCbConstants.BTCB_CONTRACT_ADDRESS,
+                                                    self.amount, succeed)
+
+        return succeed
 
     def _is_bridge_possible(self) -> bool:
         """ Method that checks BTC.b balance on the source chain and decides if it is possible to make bridge """
@@ -152,27 +227,30 @@ class BTCbBridgeHelper:
 
         return True
 
-    def _approve_btcb_usage(self, amount: int) -> bool:
+    def _is_approval_required(self) -> bool:
+        """ BTC.b needs approval only on Avalanche chain """
+
         if not isinstance(self.src_network, Avalanche):
-            raise ValueError("BTC.b needs approval only on Avalanche chain")
+            return False
 
-        allowance = self.src_network.get_token_allowance(BTCbConstants.BTCB_BASE_AVALANCHE_CONTRACT_ADDRESS,
-                                                         self.account.address, BTCbConstants.BTCB_CONTRACT_ADDRESS)
-        if allowance >= amount:
-            return True
+        return self.src_network.is_approval_required(BTCbConstants.BTCB_BASE_AVALANCHE_CONTRACT_ADDRESS,
+                                                     self.account.address, BTCbConstants.BTCB_CONTRACT_ADDRESS,
+                                                     self.amount)
 
-        tx_hash = self.src_network.approve_token_usage(self.account.key,
-                                                       BTCbConstants.BTCB_BASE_AVALANCHE_CONTRACT_ADDRESS,
-                                                       BTCbConstants.BTCB_CONTRACT_ADDRESS, amount)
-        result = self.src_network.wait_for_transaction(tx_hash)
+    def _make_bridge_with_approval(self) -> bool:
+        """ Method that sends the approve and the bridge transactions together """
 
-        return self.src_network.check_tx_result(result, f"Approve BTC.b usage")
+        result = self.src_network.send_approval_bundle(
+            self.account.key, BTCbConstants.BTCB_BASE_AVALANCHE_CONTRACT_ADDRESS, BTCbConstants.BTCB_CONTRACT_ADDRESS,
+            self.amount,
+            lambda nonce: BTCbUtils.build_bridge_transaction(self.src_network, self.dst_network, self.amount,
+                                                             self.account.address, nonce),
+            'bridge')
 
-    def _send_bridge_transaction(self):
-        tx = BTCbUtils.build_bridge_transaction(self.src_network, self.dst_network, self.amount, self.account.address)
+        return self._check_bridge_result(result)
 
-        signed_tx = self.src_network.w3.eth.account.sign_transaction(tx, self.account.key)
-        tx_hash = self.src_network.w3.eth.send_raw_transaction(signed_tx.rawTransaction)
+    def _send_bridge_transaction(self, tx: TxParams):
+        tx_hash = self.src_network.sign_and_send_transaction(tx, self.account.key, 'bridge')
 
         logger.info(f'BTC.b bridge transaction signed and sent. Hash: {tx_hash.hex()}')
 
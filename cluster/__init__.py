@@ -0,0 +1,4 @@
+from cluster.shared import SharedResources, SharedLimiter, ResourcesManager, install_shared_resources
+from cluster.process_runner import ProcessRunner
+from cluster.coordinator import Coordinator, AccountRoster
+from cluster.worker import Worker
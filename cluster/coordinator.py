@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing.managers import BaseManager
+from typing import Deque, Dict, List, Optional, Tuple
+
+from config import BridgerMode, RefuelMode, RateLimits, ClusterSettings
+from cluster.shared import SharedResources
+from utility import KeyFileSource
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AccountLease:
+    position: int  # Position of the key inside the key source
+    worker_id: str
+    remaining_bridges: Optional[int]
+    expires_at: float
+
+
+class AccountRoster:
+    """ Thread-safe registry of accounts leased to the workers. Leases that are not extended by
+    heartbeats expire and the accounts are handed out again with the last reported progress """
+
+    def __init__(self, private_keys: KeyFileSource, bridges_limit: Optional[int],
+                 lease_timeout: float = ClusterSettings.RELEASE_TIMEOUT) -> None:
+        self._private_keys = private_keys
+        self._bridges_limit = bridges_limit
+        self._lease_timeout = lease_timeout
+
+        self._next_position = 0  # Keys after this position have never been leased
+        self._returned: Deque[Tuple[int, Optional[int]]] = deque()  # (position, remaining bridges)
+        self._leases: Dict[int, AccountLease] = {}  # account_id -> lease
+        self._completed = 0
+        self._lock = threading.Lock()
+
+    def _expire_leases(self) -> None:
+        now = time.time()
+
+        for account_id, lease in list(self._leases.items()):
+            if lease.expires_at < now:
+                logger.warning(f"Lease of Account-{account_id} by {lease.worker_id} expired. Returning it to roster")
+                del self._leases[account_id]
+                self._returned.append((lease.position, lease.remaining_bridges))
+
+    def _next_account(self) -> Optional[Tuple[int, Optional[int]]]:
+        if self._returned:
+            return self._returned.popleft()
+
+        if self._next_position < len(self._private_keys):
+            position = self._next_position
+            self._next_position += 1
+            return position, self._bridges_limit
+
+        return None
+
+    def lease(self, worker_id: str, max_accounts: int) -> List[Tuple[int, str, Optional[int]]]:
+        """ Method that leases up to max_accounts accounts to the worker.
+        Returns (account_id, private_key, remaining_bridges) tuples """
+
+        result = []
+
+        with self._lock:
+            self._expire_leases()
+
+            while len(result) < max_accounts:
+                account = self._next_account()
+                if account is None:
+                    break
+
+                position, remaining_bridges = account
+                account_id = self._private_keys.get_account_id(position)
+                self._leases[account_id] = AccountLease(position, worker_id, remaining_bridges,
+                                                        time.time() + self._lease_timeout)
+                result.append((account_id, self._private_keys[position], remaining_bridges))
+
+        if result:
+            logger.info(f"{len(result)} accounts leased to {worker_id}")
+
+        return result
+
+    def heartbeat(self, worker_id: str, progress: Dict[int, Optional[int]]) -> List[int]:
+        """ Method that extends the worker leases and saves the remaining bridges of its accounts.
+        Returns ids of the accounts that are not leased to the worker anymore and must be stopped """
+
+        revoked = []
+
+        with self._lock:
+            self._expire_leases()
+
+            for account_id, remaining_bridges in progress.items():
+                lease = self._leases.get(account_id)
+                if not lease or lease.worker_id != worker_id:
+                    revoked.append(account_id)
+                    continue
+
+                lease.remaining_bridges = remaining_bridges
+                lease.expires_at = time.time() + self._lease_timeout
+
+        return revoked
+
+    def complete(self, worker_id: str, account_id: int) -> None:
+        """ Method that marks the account as finished (bridge limit is reached) """
+
+        with self._lock:
+            lease = self._leases.get(account_id)
+            if lease and lease.worker_id == worker_id:
+                del self._leases[account_id]
+                self._completed += 1
+
+    def release(self, worker_id: str, account_id: int, remaining_bridges: Optional[int]) -> None:
+        """ Method that returns the account to the roster to be leased by another worker """
+
+        with self._lock:
+            lease = self._leases.get(account_id)
+            if lease and lease.worker_id == worker_id:
+                del self._leases[account_id]
+                self._returned.append((lease.position, remaining_bridges))
+
+    def is_finished(self) -> bool:
+        with self._lock:
+            return not self._leases and not self._returned and self._next_position >= len(self._private_keys)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'total': len(self._private_keys),
+                'leased': len(self._leases),
+                'waiting': len(self._returned) + len(self._private_keys) - self._next_position,
+                'completed': self._completed
+            }
+
+
+class CoordinatorManager(BaseManager):
+    pass
+
+
+# Worker side registration. The coordinator registers the same type ids with the callables
+CoordinatorManager.register('get_settings')  # Plain dict, use _getvalue()
+CoordinatorManager.register('get_roster')
+CoordinatorManager.register('get_resources', method_to_typeid={'get_exchange': 'Exchange'})
+CoordinatorManager.register('Exchange', create_method=False)
+
+
+class Coordinator:
+    """ Process that owns the account roster, the shared limits and the exchange clients.
+    Workers connect to it over TCP and lease accounts """
+
+    STATS_INTERVAL = 60  # seconds
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes, private_keys: KeyFileSource,
+                 bridger_mode: BridgerMode, refuel_mode: RefuelMode, bridges_limit: Optional[int]) -> None:
+        self.address = address
+        self.authkey = authkey
+        self.settings = {
+            'bridger_mode': bridger_mode.value,
+            'refuel_mode': refuel_mode.value,
+            'bridges_limit': bridges_limit
+        }
+        self.roster = AccountRoster(private_keys, bridges_limit)
+        self.resources = SharedResources(RateLimits.RPC_REQUESTS_PER_SECOND, RateLimits.BRIDGES_PER_MINUTE)
+
+    def _create_manager(self) -> CoordinatorManager:
+        class _Manager(CoordinatorManager):
+            pass
+
+        _Manager.register('get_settings', callable=lambda: self.settings)
+        _Manager.register('get_roster', callable=lambda: self.roster)
+        _Manager.register('get_resources', callable=lambda: self.resources,
+                          method_to_typeid={'get_exchange': 'Exchange'})
+
+        return _Manager(address=self.address, authkey=self.authkey)
+
+    def run(self) -> None:
+        server = self._create_manager().get_server()
+
+        server_thread = threading.Thread(target=server.serve_forever, name="Coordinator", daemon=True)
+        server_thread.start()
+        logger.info(f"Coordinator is listening on {self.address[0]}:{self.address[1]}")
+
+        while not self.roster.is_finished():
+            time.sleep(self.STATS_INTERVAL)
+            logger.info(f"Roster: {self.roster.get_stats()}")
+
+        logger.info("All accounts are completed")
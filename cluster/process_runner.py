@@ -0,0 +1,72 @@
+import logging
+import multiprocessing
+from typing import Optional, Tuple
+
+from config import BridgerMode, RefuelMode, RateLimits, SUPPORTED_NETWORKS_STARGATE, SUPPORTED_NETWORKS_BTCB
+from cluster.shared import ResourcesManager, install_shared_resources, _init_resources
+from logger import setup_logger
+from logic import AccountRunner, CheckpointStore
+from utility import KeyFileSource, KeySelection
+
+logger = logging.getLogger(__name__)
+
+
+def run_worker(worker_index: int, workers_count: int, keys_path: str, selection: KeySelection,
+               bridger_mode: BridgerMode, refuel_mode: RefuelMode, bridges_limit: Optional[int],
+               manager_address: Tuple[str, int], authkey: bytes) -> None:
+    """ Entry point of the worker process. Runs its own share of the accounts, while limits
+    and exchange clients are taken from the parent """
+
+    setup_logger()
+
+    manager = ResourcesManager(address=manager_address, authkey=authkey)
+    manager.connect()
+    resources = manager.get_resources()
+
+    bridge_limiter = install_shared_resources(resources, SUPPORTED_NETWORKS_STARGATE + SUPPORTED_NETWORKS_BTCB,
+                                              remote=True)
+
+    with KeyFileSource(keys_path, selection.split(worker_index, workers_count)) as private_keys:
+        logger.info(f"Worker {worker_index}/{workers_count}. Accounts: {len(private_keys)}")
+
+        runner = AccountRunner(bridger_mode, refuel_mode, bridges_limit, bridge_limiter,
+                               CheckpointStore.from_settings())
+        runner.run(private_keys.items())
+
+
+class ProcessRunner:
+    """ Runs accounts sharded between several worker processes to scale past the GIL """
+
+    def __init__(self, processes: int, keys_path: str, selection: KeySelection, bridger_mode: BridgerMode,
+                 refuel_mode: RefuelMode, bridges_limit: Optional[int]) -> None:
+        self.processes = processes
+        self.keys_path = keys_path
+        self.selection = selection
+        self.bridger_mode = bridger_mode
+        self.refuel_mode = refuel_mode
+        self.bridges_limit = bridges_limit
+
+    def run(self) -> None:
+        # Spawn - worker processes shouldn't inherit sockets and locks of the parent
+        ctx = multiprocessing.get_context('spawn')
+
+        manager = ResourcesManager(ctx=ctx)
+        manager.start(_init_resources, (RateLimits.RPC_REQUESTS_PER_SECOND, RateLimits.BRIDGES_PER_MINUTE))
+        authkey = bytes(ctx.current_process().authkey)
+
+        logger.info(f"Starting {self.processes} worker processes")
+
+        workers = []
+        for worker_index in range(self.processes):
+            worker = ctx.Process(target=run_worker, name=f"Worker-{worker_index}",
+                                 args=(worker_index, self.processes, self.keys_path, self.selection,
+                                       self.bridger_mode, self.refuel_mode, self.bridges_limit,
+                                       manager.address, authkey))
+            worker.start()
+            workers.append(worker)
+
+        try:
+            for worker in workers:
+                worker.join()
+        finally:
+            manager.shutdown()
@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from functools import partial
+from multiprocessing.managers import BaseManager
+from typing import Callable, Dict, Iterable, Optional
+
+from exchange import ExchangeFactory
+from exchange.exchange import Exchange
+from network import EVMNetwork
+from utility.rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class SharedResources:
+    """ Limits and exchange clients shared by all accounts. When several processes are used, the only
+    instance lives in the manager process and the workers access it through a proxy """
+
+    def __init__(self, rpc_requests_per_second: float, bridges_per_minute: float) -> None:
+        self.rpc_requests_per_second = rpc_requests_per_second
+        self._rpc_limiters: Dict[str, RateLimiter] = {}
+        # Capacity of 1 - bridges are never executed in a burst
+        self._bridge_limiter = RateLimiter(bridges_per_minute / 60, 1) if bridges_per_minute > 0 else None
+        self._lock = threading.Lock()
+
+    def is_rpc_limited(self) -> bool:
+        return self.rpc_requests_per_second > 0
+
+    def is_bridge_limited(self) -> bool:
+        return self._bridge_limiter is not None
+
+    def reserve_rpc_request(self, rpc: str) -> float:
+        """ Method that reserves one request to the RPC and returns the delay before it can be sent """
+
+        if not self.is_rpc_limited():
+            return 0
+
+        with self._lock:
+            if rpc not in self._rpc_limiters:
+                self._rpc_limiters[rpc] = RateLimiter(self.rpc_requests_per_second)
+            limiter = self._rpc_limiters[rpc]
+
+        return limiter.reserve()
+
+    def reserve_bridge(self) -> float:
+        """ Method that reserves a global bridge slot and returns the delay before the bridge can be started """
+
+        if not self.is_bridge_limited():
+            return 0
+
+        return self._bridge_limiter.reserve()
+
+    def get_exchange(self, exchange_name: str) -> Exchange:
+        # Clients are shared by the factory
+        return ExchangeFactory.create(exchange_name)
+
+
+class SharedLimiter:
+    """ Limiter that reserves a slot in SharedResources (possibly remote) and waits locally,
+    so the shared object is never blocked by a sleeping caller """
+
+    def __init__(self, reserve: Callable[[], float]) -> None:
+        self._reserve = reserve
+
+    def acquire(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def install_shared_resources(resources: SharedResources, networks: Iterable[EVMNetwork],
+                             remote: bool = False) -> Optional[SharedLimiter]:
+    """ Function that applies shared limits to the networks (and the exchange clients in the remote mode)
+    of the current process. Returns the bridge limiter to be passed to the accounts """
+
+    if resources.is_rpc_limited():
+        for network in networks:
+            network.set_request_limiter(SharedLimiter(partial(resources.reserve_rpc_request, network.rpc)))
+
+    if remote:
+        ExchangeFactory.set_provider(resources.get_exchange)
+
+    if resources.is_bridge_limited():
+        return SharedLimiter(resources.reserve_bridge)
+
+    return None
+
+
+# -------- Manager that hosts SharedResources for the worker processes --------
+
+_resources: Optional[SharedResources] = None
+
+
+def _init_resources(rpc_requests_per_second: float, bridges_per_minute: float) -> None:
+    global _resources
+    _resources = SharedResources(rpc_requests_per_second, bridges_per_minute)
+
+
+def _get_resources() -> SharedResources:
+    return _resources
+
+
+class ResourcesManager(BaseManager):
+    pass
+
+
+ResourcesManager.register('get_resources', callable=_get_resources, method_to_typeid={'get_exchange': 'Exchange'})
+ResourcesManager.register('Exchange', create_method=False)
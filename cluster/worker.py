@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+import uuid
+import socket
+from typing import Dict, Optional, Tuple
+
+from config import BridgerMode, RefuelMode, ClusterSettings, SUPPORTED_NETWORKS_STARGATE, SUPPORTED_NETWORKS_BTCB
+from cluster.coordinator import CoordinatorManager
+from cluster.shared import install_shared_resources
+from logic import AccountThread, CheckpointStore
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """ Node that leases accounts from the coordinator, runs them and reports the progress with heartbeats """
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes, capacity: int) -> None:
+        self.address = address
+        self.authkey = authkey
+        self.capacity = capacity
+        self.worker_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+
+        self._accounts: Dict[int, AccountThread] = {}
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._checkpoint_store = CheckpointStore.from_settings()
+
+    def _connect(self) -> CoordinatorManager:
+        manager = CoordinatorManager(address=self.address, authkey=self.authkey)
+        manager.connect()
+
+        return manager
+
+    def _heartbeat_loop(self, roster) -> None:
+        last_heartbeat = time.time()
+
+        while not self._finished.wait(ClusterSettings.HEARTBEAT_INTERVAL):
+            with self._lock:
+                progress = {account_id: account.remaining_bridges for account_id, account in self._accounts.items()}
+
+            try:
+                revoked = roster.heartbeat(self.worker_id, progress)
+            except (OSError, EOFError) as ex:
+                logger.error(f"Heartbeat failed: {ex}")
+                if time.time() - last_heartbeat > ClusterSettings.LEASE_TIMEOUT:
+                    # The coordinator will lease the accounts to another worker
+                    self._stop_accounts()
+                continue
+
+            last_heartbeat = time.time()
+
+            for account_id in revoked:
+                logger.warning(f"Account-{account_id} lease is lost. Stopping it")
+                with self._lock:
+                    account = self._accounts.pop(account_id, None)
+                if account:
+                    account.stop()
+
+    def _stop_accounts(self) -> None:
+        """ Method that asks all local accounts to stop. Finished ones are released by _collect_finished """
+
+        with self._lock:
+            accounts = [account for account in self._accounts.values() if not account.is_stopped()]
+
+        if accounts:
+            logger.warning(f"Coordinator is unreachable. Stopping {len(accounts)} accounts")
+        for account in accounts:
+            account.stop()
+
+    def _collect_finished(self, roster) -> None:
+        with self._lock:
+            finished = [(account_id, account) for account_id, account in self._accounts.items()
+                        if not account.is_alive()]
+            for account_id, _ in finished:
+                del self._accounts[account_id]
+
+        for account_id, account in finished:
+            if account.remaining_bridges is not None and account.remaining_bridges <= 0:
+                roster.complete(self.worker_id, account_id)
+            else:
+                roster.release(self.worker_id, account_id, account.remaining_bridges)
+
+    def _lease_accounts(self, roster, settings: dict, bridge_limiter: Optional[object]) -> int:
+        with self._lock:
+            free = self.capacity - len(self._accounts)
+        if free <= 0:
+            return 0
+
+        leases = roster.lease(self.worker_id, free)
+
+        for account_id, private_key, remaining_bridges in leases:
+            account = AccountThread(account_id, private_key, BridgerMode(settings['bridger_mode']),
+                                    RefuelMode(settings['refuel_mode']), settings['bridges_limit'],
+                                    bridge_limiter, remaining_bridges, self._checkpoint_store)
+            with self._lock:
+                self._accounts[account_id] = account
+            account.start()
+
+        return len(leases)
+
+    def run(self) -> None:
+        manager = self._connect()
+        roster = manager.get_roster()
+        settings = manager.get_settings()._getvalue()
+        resources = manager.get_resources()
+
+        bridge_limiter = install_shared_resources(resources, SUPPORTED_NETWORKS_STARGATE + SUPPORTED_NETWORKS_BTCB,
+                                                  remote=True)
+        logger.info(f"Worker {self.worker_id} connected to {self.address[0]}:{self.address[1]}")
+
+        heartbeat_thread = threading.Thread(target=self._heartbeat_loop, args=(roster,), name="Heartbeat",
+                                            daemon=True)
+        heartbeat_thread.start()
+
+        try:
+            while True:
+                self._collect_finished(roster)
+                leased = self._lease_accounts(roster, settings, bridge_limiter)
+
+                with self._lock:
+                    active = len(self._accounts)
+
+                if not active and not leased and roster.is_finished():
+                    break
+
+                time.sleep(ClusterSettings.LEASE_POLL_INTERVAL)
+        finally:
+            self._finished.set()
+            self._stop_accounts()
+            if self._checkpoint_store:
+                self._checkpoint_store.close()
+
+        logger.info(f"Worker {self.worker_id} finished")
@@ -36,6 +36,7 @@ class RefuelMode(Enum):
     MANUAL = "manual"  # Manual refuel
     OKEX = "okex"  # Automatic refuel from the Okex exchange
     BINANCE = "binance"  # Automatic refuel from the Binance exchange
+    AUTO = "auto"  # Automatic refuel from the exchange expected to deliver faster
 
 
 # Utility class
@@ -48,10 +49,67 @@ class TimeRanges:
 class SleepTimings:
     AFTER_START_RANGE = (0, TimeRanges.MINUTE * 10)  # from 0 seconds to 10 minutes. Sleep after start
     BEFORE_BRIDGE_RANGE = (30, TimeRanges.HOUR)  # from 30 seconds to 1 hour. Sleep before bridge
-    BALANCE_RECHECK_TIME = TimeRanges.MINUTE * 2  # 2 minutes. Recheck time for stablecoin or native token deposit
+    DEPOSIT_WAIT_TIMEOUT = TimeRanges.MINUTE * 30  # 30 minutes. Full balance recheck if no deposit event was seen
+    ARRIVAL_TIMEOUT = TimeRanges.HOUR  # 1 hour. Maximum wait for a bridge delivery before the balance recheck
+    BRIDGE_PREFETCH_LEAD = 20  # seconds. Bridge inputs are fetched and the transaction is built before the bridge
+    BRIDGE_PREFETCH_MAX_AGE = TimeRanges.MINUTE  # 1 minute. Older prepared transactions are built again
     BEFORE_WITHDRAW_RANGE = (30, TimeRanges.HOUR)  # from 30 seconds to 30 minutes. Sleep before withdraw from exchange
 
 
+# Limits shared by all accounts (and all processes in the process-sharded mode). 0 - unlimited
+class RateLimits:
+    RPC_REQUESTS_PER_SECOND = float(os.getenv('RPC_REQUESTS_PER_SECOND', 0))  # Per RPC endpoint
+    BRIDGES_PER_MINUTE = float(os.getenv('BRIDGES_PER_MINUTE', 0))  # Global bridge pacing
+
+
+# Account threads of one process. Accounts over the limit are started as the running ones finish. 0 - unlimited
+class RunnerSettings:
+    MAX_ACTIVE_ACCOUNTS = int(os.getenv('MAX_ACTIVE_ACCOUNTS', 500))
+    SLOT_POLL_INTERVAL = 1  # seconds. How often a full active set is checked for finished accounts
+
+
+# Retry policy of a failed state (seconds). The state is reset to the balance check when attempts are exhausted
+class RetrySettings:
+    MAX_ATTEMPTS = 4
+    BASE_DELAY = 5
+    MAX_DELAY = TimeRanges.MINUTE * 5
+
+
+# Account state checkpoints. Empty path disables checkpoints
+class CheckpointSettings:
+    DB_PATH = os.getenv('CHECKPOINT_DB_PATH', 'checkpoints.db')
+
+
+# Local balance ledger. Balances older than the interval are read from the chain again
+class BalanceLedgerSettings:
+    RECONCILE_INTERVAL = float(os.getenv('BALANCE_RECONCILE_INTERVAL', TimeRanges.HOUR))  # seconds
+
+
+# Exchange client settings
+class ExchangeSettings:
+    METADATA_TTL = TimeRanges.MINUTE * 30  # 30 minutes. Currencies, withdraw networks and markets are cached that long
+    METADATA_MAX_STALE_AGE = TimeRanges.HOUR * 24  # 1 day. Older markets aren't used while they're reloaded
+    WITHDRAW_POLL_INTERVAL = 10  # seconds. Pending withdrawals of an exchange are checked by one request
+    WITHDRAWAL_STREAM = os.getenv('WITHDRAWAL_STREAM', '0') == '1'  # Withdrawal updates pushed by websockets (OKX)
+    REFUEL_BATCH_WINDOW = 3  # seconds. Refuels of the same token requested within the window are bought at once
+    BALANCE_TTL = TimeRanges.MINUTE  # 1 minute. Funding balances used by the refuel routing are cached that long
+    WITHDRAW_LATENCY_SAMPLES = 20  # Number of the last withdrawal times kept per token and network
+    BINANCE_API_WEIGHT_LIMIT = int(os.getenv('BINANCE_API_WEIGHT_LIMIT', 6000))  # Weight of /api requests per minute
+
+
+# Coordinator/worker mode settings
+class ClusterSettings:
+    AUTHKEY = os.getenv('CLUSTER_AUTHKEY')  # Shared secret of the coordinator and the workers
+    MIN_AUTHKEY_LENGTH = 32
+    PLACEHOLDER_AUTHKEYS = ('change-me', 'changeme')
+    HEARTBEAT_INTERVAL = 15  # seconds
+    LEASE_TIMEOUT = 60  # seconds. A worker that couldn't send heartbeats for that long stops its accounts
+    # Accounts without heartbeats for that long are leased again. The time covers the stop of the accounts
+    # and a bridge that was already being sent
+    RELEASE_TIMEOUT = TimeRanges.MINUTE * 15
+    LEASE_POLL_INTERVAL = 10  # seconds. How often a worker with free capacity asks for new accounts
+
+
 # -------- Utility class --------
 class ConfigurationHelper:
     @staticmethod
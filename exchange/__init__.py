@@ -1,4 +1,5 @@
 from exchange.factory import ExchangeFactory
+from exchange.refuel_router import RefuelRouter
 
 from exchange.binance.binance import Binance
 from exchange.okex.okex import Okex
@@ -1,12 +1,11 @@
 import logging
-import random
 from typing import List
 
 import ccxt
 
-from base.errors import ExchangeError, NotWhitelistedAddress, WithdrawNotFound
+from base.errors import ExchangeError, NotWhitelistedAddress
 from exchange.binance.constants import BinanceConstants
-from exchange.exchange import Exchange, WithdrawInfo, WithdrawStatus
+from exchange.exchange import Exchange, RequestWeightLimiter, WithdrawInfo
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +17,8 @@ class Binance(Exchange):
                 'defaultType': 'spot'
             }
         }
-        super().__init__('binance', api_key, secret_key, ccxt_args)
+        super().__init__('binance', api_key, secret_key, ccxt_args,
+                         RequestWeightLimiter(BinanceConstants.REQUEST_LIMITS, BinanceConstants.REQUEST_WEIGHTS))
 
     def withdraw(self, symbol: str, amount: float, network: str, address: str) -> str:
         """ Method that initiates the withdrawal and returns the withdrawal id """
@@ -36,6 +36,8 @@ class Binance(Exchange):
             if 'Withdrawal address is not whitelisted for verification exemption' in str(ex):
                 raise NotWhitelistedAddress(f'Unable to withdraw {symbol}({network}) to {address}. '
                                             f'The address must be added to the whitelist') from ex
+            # Fees or limits could be changed
+            self.invalidate_metadata()
             raise
 
         logger.debug(f'Withdraw result: {result}')
@@ -44,7 +46,7 @@ class Binance(Exchange):
         return str(withdraw_id)
 
     def _get_withdraw_infos(self, symbol: str) -> List[WithdrawInfo]:
-        currencies = self._ccxt_exc.fetch_currencies()
+        currencies = self.fetch_currencies()
         chains_info = currencies[symbol]['networks']
 
         result = []
@@ -72,19 +74,9 @@ class Binance(Exchange):
 
         return withdraw_info
 
-    def get_withdraw_status(self, withdrawal_id: str) -> WithdrawStatus:
-        withdrawals_info = self._ccxt_exc.fetch_withdrawals()
-        withdrawal_info = next((withdrawal for withdrawal in withdrawals_info if withdrawal['id'] == withdrawal_id),
-                               None)
-
-        if not withdrawal_info:
-            raise WithdrawNotFound(f"Withdraw {withdrawal_id} can't be found on Binance")
-
-        return self._parse_withdraw_status(withdrawal_info)
-
     def _get_min_notional(self, symbol: str) -> float:
         trading_symbol = symbol + '/USDT'
-        markets = self._ccxt_exc.load_markets()
+        markets = self.load_markets()
 
         market = markets[trading_symbol]
         minimal_notional = market['info']['filters'][6]['minNotional']
@@ -92,7 +84,7 @@ class Binance(Exchange):
         return float(minimal_notional)
 
     def _get_precision(self, symbol: str) -> int:
-        currencies = self._ccxt_exc.fetch_currencies()
+        currencies = self.fetch_currencies()
         currency_info = currencies[symbol]
         decimals = int(currency_info['precision'])
 
@@ -135,24 +127,6 @@ class Binance(Exchange):
 
         return token_balance
 
-    def buy_token_and_withdraw(self, symbol: str, amount: float, network: str, address: str) -> None:
-        withdraw_info = self.get_withdraw_info(symbol, network)
-
-        if withdraw_info.min_amount > amount:
-            mul = random.uniform(1, 2)
-            amount = withdraw_info.min_amount * mul
-            decimal = random.randint(4, 7)
-            amount = round(amount, decimal)
-
-        amount += withdraw_info.fee * 3
-        amount_to_withdraw = amount
-
-        balance = self.get_funding_balance(symbol)
-        if balance < amount:
-            # Multiplying to avoid decimals casting
-            bought_amount = self.buy_tokens_with_usdt(symbol, amount) * 0.99
-            if bought_amount < amount:
-                amount_to_withdraw = bought_amount
-
-        withdraw_id = self.withdraw(symbol, amount_to_withdraw, network, address)
-        self.wait_for_withdraw_to_finish(withdraw_id)
+    def buy_for_withdraw(self, symbol: str, amount: float) -> float:
+        # Multiplying to avoid decimals casting
+        return self.buy_tokens_with_usdt(symbol, amount) * 0.99
@@ -1,3 +1,7 @@
+from config import ExchangeSettings
+from exchange.exchange import RequestLimit
+
+
 class BinanceConstants:
     # Mapping inside chain names to OKX chain names
     NETWORKS = {
@@ -21,3 +25,23 @@ class BinanceConstants:
         'FTM': ['BSC', 'FTM', 'ETH'],
         'AVAX': ['BSC', 'Avalanche']
     }
+
+    # Request weight limits. Withdrawal endpoints are limited by the IP and by the account (UID)
+    REQUEST_LIMITS = {
+        'api': RequestLimit(ExchangeSettings.BINANCE_API_WEIGHT_LIMIT, 60, 'x-mbx-used-weight-1m'),
+        'sapi_ip': RequestLimit(12000, 60, 'x-sapi-used-ip-weight-1m'),
+        'sapi_uid': RequestLimit(180000, 60, 'x-sapi-used-uid-weight-1m'),
+    }
+
+    # ccxt method -> (limit, weight) of every request it sends
+    REQUEST_WEIGHTS = {
+        'fetch_currencies': [('sapi_ip', 10)],  # GET /sapi/v1/capital/config/getall
+        'fetch_withdrawals': [('sapi_ip', 10)],  # GET /sapi/v1/capital/withdraw/history
+        'withdraw': [('sapi_uid', 600)],  # POST /sapi/v1/capital/withdraw/apply
+        # fetch_currencies and GET exchangeInfo of spot (20), USD-M and COIN-M futures (1 each).
+        # The futures weights are counted in the spot bucket
+        'load_markets': [('sapi_ip', 10), ('api', 20 + 1 + 1)],
+        'fetch_balance': [('api', 20)],  # GET /api/v3/account
+        'fetch_ticker': [('api', 2)],  # GET /api/v3/ticker/24hr
+        'create_limit_buy_order': [('api', 1)],  # POST /api/v3/order
+    }
@@ -1,11 +1,18 @@
 import logging
+import random
+import statistics
+import threading
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 import ccxt
 
-from base.errors import NotSupported, WithdrawCanceled, WithdrawTimeout
+from base.errors import ExchangeError, NotSupported, WithdrawCanceled, WithdrawNotFound, WithdrawTimeout
+from config import ExchangeSettings, TimeRanges
+from utility.metadata_snapshot import MetadataSnapshot
+from utility.rate_limiter import RateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -25,43 +32,496 @@ class WithdrawInfo:
     min_amount: float
 
 
-# Base exchange class
+@dataclass
+class RefuelQuote:
+    exchange: str
+    fee: float
+    min_amount: float
+    funding_balance: float
+    latency: Optional[float]  # Median time of the finished withdrawals (seconds). None - no withdrawals yet
+
+
+@dataclass
+class RequestLimit:
+    limit: float  # Maximum weight per window
+    window: float  # seconds
+    header: Optional[str] = None  # Response header with the weight used in the current window
+
+
+class RequestWeightLimiter:
+    """ Limiter of the exchange request weights. Every endpoint has a weight in one of the limit buckets.
+    Weights are reserved before the request, so concurrent callers are queued instead of exceeding the limit,
+    and the buckets are lowered to the used weight reported by the exchange """
+
+    SAFETY_MARGIN = 0.9  # Part of the exchange limit that can be used
+
+    def __init__(self, limits: Dict[str, RequestLimit], weights: Dict[str, List[Tuple[str, float]]]) -> None:
+        self.limits = limits
+        self.weights = weights  # ccxt method -> (limit bucket, weight) of every request it sends
+        self._buckets = {name: RateLimiter(limit.limit * self.SAFETY_MARGIN / limit.window,
+                                           limit.limit * self.SAFETY_MARGIN)
+                         for name, limit in limits.items()}
+
+    def acquire(self, method: str) -> None:
+        """ Method that waits until the request fits into the limit. Methods without a weight are throttled
+        by the ccxt rate limiter only """
+
+        for bucket, weight in self.weights.get(method, []):
+            self._buckets[bucket].acquire(weight)
+
+    def update(self, headers: Optional[Dict[str, str]]) -> None:
+        """ Method that applies the used weight headers of the last response """
+
+        if not headers:
+            return
+
+        headers = {key.lower(): value for key, value in headers.items()}
+        for name, limit in self.limits.items():
+            if limit.header and limit.header in headers:
+                used_weight = float(headers[limit.header])
+                self._buckets[name].sync(limit.limit * self.SAFETY_MARGIN - used_weight)
+
+    def drain(self, method: str) -> None:
+        """ Method that empties the bucket of the method after the exchange rejected a request """
+
+        for bucket, _ in self.weights.get(method, []):
+            self._buckets[bucket].sync(0)
+
+
+class SynchronizedClient:
+    """ Wrapper of a ccxt client that serializes its method calls. Sync ccxt clients throttle requests
+    without a lock, so concurrent callers would bypass the rate limiter. Request weights are reserved
+    before the lock is taken """
+
+    MARKET_METHODS = ('load_markets', 'fetch_markets', 'fetch_currencies')
+
+    def __init__(self, client: ccxt.Exchange, request_limiter: Optional[RequestWeightLimiter] = None) -> None:
+        self._client = client
+        self._request_limiter = request_limiter
+        self._lock = threading.RLock()
+        self._markets_lock = threading.Lock()
+
+    def _ensure_markets(self) -> None:
+        """ Method that loads the markets through the weighted path. Otherwise ccxt methods load them
+        (and the currencies) implicitly, and their weight isn't reserved """
+
+        with self._markets_lock:
+            if not self._client.markets:
+                self.load_markets()
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if self._request_limiter and name in self._request_limiter.weights and name not in self.MARKET_METHODS:
+                self._ensure_markets()
+
+            if self._request_limiter:
+                self._request_limiter.acquire(name)
+
+            with self._lock:
+                try:
+                    return attr(*args, **kwargs)
+                except ccxt.RateLimitExceeded:
+                    if self._request_limiter:
+                        self._request_limiter.drain(name)
+                    raise
+                finally:
+                    if self._request_limiter:
+                        self._request_limiter.update(self._client.last_response_headers)
+
+        return call
+
+
+class MetadataCache:
+    """ TTL cache of rarely changing exchange metadata. Values are persisted to the metadata snapshot. An expired
+    value of a stale key (or one of the previous run) is returned at once and reloaded in the background, unless
+    it's older than the maximum stale age. Other keys are reloaded before they're returned """
+
+    def __init__(self, ttl: float, max_stale_age: float = 0, snapshot: Optional[MetadataSnapshot] = None,
+                 namespace: str = '', stale_keys: Iterable[str] = ()) -> None:
+        self.ttl = ttl
+        self.max_stale_age = max_stale_age
+        self.stale_keys = set(stale_keys)
+        self._snapshot = snapshot
+        self._namespace = namespace
+        self._entries: Dict[str, Tuple[float, Any]] = {}  # key -> (load time, value)
+        self._refreshing: Set[str] = set()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _get_snapshot_key(self, key: str) -> str:
+        return f"{self._namespace}.{key}"
+
+    def _get_key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _get_entry(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None or not self._snapshot:
+            return entry
+
+        # The snapshot is read outside the cache lock, it can be a large file
+        entry = self._snapshot.get(self._get_snapshot_key(key))
+        if entry:
+            with self._lock:
+                entry = self._entries.setdefault(key, entry)
+
+        return entry
+
+    def _store(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+        if self._snapshot:
+            self._snapshot.put(self._get_snapshot_key(key), value)
+
+    def peek(self, key: str) -> Optional[Any]:
+        """ Method that returns the value without loading it """
+
+        entry = self._get_entry(key)
+
+        return entry[1] if entry else None
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Any:
+        entry = self._get_entry(key)
+        if entry and time.time() - entry[0] <= self.ttl:
+            return entry[1]
+
+        if entry and key in self.stale_keys and time.time() - entry[0] <= self.max_stale_age:
+            with self._lock:
+                is_refreshing = key in self._refreshing
+                self._refreshing.add(key)
+            if not is_refreshing:
+                threading.Thread(target=self._refresh, args=(key, loader), name=f"Refresh-{key}",
+                                 daemon=True).start()
+            return entry[1]
+
+        # Loading under the key lock, so concurrent callers of the key wait for one request
+        with self._get_key_lock(key):
+            entry = self._get_entry(key)
+            if entry and time.time() - entry[0] <= self.ttl:
+                return entry[1]
+
+            value = loader()
+            self._store(key, value)
+
+            return value
+
+    def _refresh(self, key: str, loader: Callable[[], Any]) -> None:
+        try:
+            with self._get_key_lock(key):
+                self._store(key, loader())
+        except Exception as ex:
+            logger.warning(f"Unable to refresh {key}: {ex}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def put(self, key: str, value: Any) -> None:
+        self._store(key, value)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self._lock:
+            keys = list(self._entries) if key is None else [key]
+            for item in keys:
+                self._entries.pop(item, None)
+                if self._snapshot:
+                    self._snapshot.delete(self._get_snapshot_key(item))
+
+
+@dataclass
+class _PendingWithdraw:
+    tracked_at: float
+    event: threading.Event
+    status: WithdrawStatus = WithdrawStatus.INITIATED
+    misses: int = 0  # Consecutive withdrawal lists without the withdrawal
+    not_found: bool = False  # Missing in the withdrawal lists for NOT_FOUND_MISSES polls and NOT_FOUND_GRACE
+
+
+class WithdrawTracker:
+    """ Tracker of the pending withdrawals of one exchange. A single thread fetches the recent withdrawals once
+    per interval (since the oldest pending one), updates all of them at once and wakes the waiters. Withdrawal
+    lists lag behind the withdraw requests, so a withdrawal is reported as not found only if it's missing for
+    several polls and a grace period. Updates pushed by an exchange stream wake the waiters at once,
+    polling stays as the fallback """
+
+    SINCE_MARGIN = TimeRanges.MINUTE * 5  # seconds. Exchange and local clocks can differ
+    NOT_FOUND_MISSES = 3  # Consecutive withdrawal lists without the withdrawal
+    NOT_FOUND_GRACE = TimeRanges.MINUTE * 2  # seconds since the withdraw request
+    MAX_EARLY_PUSHES = 1000  # Pushed statuses kept for withdrawals nobody waits for yet
+
+    def __init__(self, name: str, fetch_withdrawals: Callable[[int], List[dict]], poll_interval: float) -> None:
+        self.name = name
+        self.poll_interval = poll_interval
+        self._fetch_withdrawals = fetch_withdrawals  # since (ms) -> ccxt withdrawal structures
+        self._pending: Dict[str, _PendingWithdraw] = {}
+        self._early_pushes: Dict[str, WithdrawStatus] = {}  # Pushes received before the wait() call
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def wait(self, withdraw_id: str, timeout: float) -> WithdrawStatus:
+        """ Method that waits until the withdrawal is finished or canceled. Returns the last known status
+        on timeout. Raises WithdrawNotFound if the exchange doesn't know the withdrawal """
+
+        with self._lock:
+            pending = self._pending.setdefault(withdraw_id, _PendingWithdraw(time.time(), threading.Event()))
+            if withdraw_id in self._early_pushes:
+                self._set_status(pending, self._early_pushes.pop(withdraw_id))
+
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll_loop, name=f"Withdrawals-{self.name}",
+                                                daemon=True)
+                self._thread.start()
+
+        pending.event.wait(timeout)
+
+        with self._lock:
+            self._pending.pop(withdraw_id, None)
+
+        if pending.not_found:
+            raise WithdrawNotFound(f"Withdraw {withdraw_id} can't be found on {self.name}")
+
+        return pending.status
+
+    def _poll_loop(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                # Withdrawals tracked before the request were created before it, so the list must contain them
+                polled_ids = set(self._pending)
+                since = min(pending.tracked_at for pending in self._pending.values()) - self.SINCE_MARGIN
+
+            try:
+                withdrawals = self._fetch_withdrawals(int(since * 1000))
+            except Exception as ex:
+                logger.error(f"{self.name} withdrawals request error: {ex}")
+                continue
+
+            self._update(withdrawals, polled_ids)
+
+    def _update(self, withdrawals: List[dict], polled_ids: Set[str]) -> None:
+        with self._lock:
+            found_ids = set()
+            for withdrawal in withdrawals:
+                withdraw_id = str(withdrawal.get('id'))
+                pending = self._pending.get(withdraw_id)
+                if not pending:
+                    continue
+                found_ids.add(withdraw_id)
+                pending.misses = 0
+
+                try:
+                    self._set_status(pending, Exchange._parse_withdraw_status(withdrawal))
+                except ValueError as ex:
+                    logger.warning(ex)
+
+            for withdraw_id in polled_ids - found_ids:
+                pending = self._pending.get(withdraw_id)
+                # Withdrawals known from the stream are found
+                if not pending or pending.status != WithdrawStatus.INITIATED:
+                    continue
+
+                pending.misses += 1
+                if pending.misses >= self.NOT_FOUND_MISSES and \
+                        time.time() - pending.tracked_at >= self.NOT_FOUND_GRACE:
+                    pending.not_found = True
+                    pending.event.set()
+
+    def push(self, withdraw_id: str, status: WithdrawStatus) -> None:
+        """ Method that applies a status update received from an exchange stream """
+
+        with self._lock:
+            pending = self._pending.get(withdraw_id)
+            if pending:
+                self._set_status(pending, status)
+                return
+
+            self._early_pushes[withdraw_id] = status
+            if len(self._early_pushes) > self.MAX_EARLY_PUSHES:
+                self._early_pushes.pop(next(iter(self._early_pushes)))
+
+    @staticmethod
+    def _set_status(pending: _PendingWithdraw, status: WithdrawStatus) -> None:
+        pending.status = status
+        if status in (WithdrawStatus.FINISHED, WithdrawStatus.CANCELED):
+            pending.event.set()
+
+
+@dataclass
+class _RefuelRequest:
+    amount: float
+    reserved: float = 0
+    error: Optional[Exception] = None
+
+
+@dataclass
+class _RefuelBatch:
+    requests: List[_RefuelRequest] = field(default_factory=list)
+    done: threading.Event = field(default_factory=threading.Event)
+
+
+class RefuelAggregator:
+    """ Aggregator of the concurrent refuels of one exchange. Requests of the same token made within the batch
+    window are bought with one order. The funding balance is reserved for every request until its withdrawal
+    is initiated, so concurrent refuels don't spend the same balance """
+
+    def __init__(self, exchange: 'Exchange', window: float) -> None:
+        self.exchange = exchange
+        self.window = window
+        self._batches: Dict[str, _RefuelBatch] = {}  # symbol -> batch collecting requests
+        self._reserved: Dict[str, float] = {}  # symbol -> balance reserved for the initiating withdrawals
+        self._lock = threading.Lock()
+        self._purchase_lock = threading.Lock()
+
+    def reserve(self, symbol: str, amount: float) -> float:
+        """ Method that reserves the funding balance for the withdrawal (buying the token if it isn't enough).
+        Returns the reserved amount that can be lower than requested after the trading fees """
+
+        request = _RefuelRequest(amount)
+
+        with self._lock:
+            batch = self._batches.get(symbol)
+            is_leader = batch is None
+            if is_leader:
+                batch = _RefuelBatch()
+                self._batches[symbol] = batch
+            batch.requests.append(request)
+
+        if is_leader:
+            time.sleep(self.window)
+            with self._lock:
+                self._batches.pop(symbol)
+            self._fill(symbol, batch)
+        else:
+            batch.done.wait()
+
+        if request.error:
+            raise request.error
+
+        return request.reserved
+
+    def release(self, symbol: str, amount: float) -> None:
+        with self._lock:
+            self._reserved[symbol] = max(0.0, self._reserved.get(symbol, 0) - amount)
+
+    def _fill(self, symbol: str, batch: _RefuelBatch) -> None:
+        try:
+            # Balance check, purchase and reservation must not interleave with other batches
+            with self._purchase_lock:
+                total = sum(request.amount for request in batch.requests)
+                with self._lock:
+                    reserved = self._reserved.get(symbol, 0)
+                available = self.exchange.get_funding_balance(symbol) - reserved
+
+                if available < total:
+                    logger.info(f"{symbol} purchase for {len(batch.requests)} refuels. Amount: {total - available}")
+                    available += self.exchange.buy_for_withdraw(symbol, total - available)
+
+                with self._lock:
+                    for request in batch.requests:
+                        request.reserved = min(request.amount, max(0.0, available))
+                        available -= request.reserved
+
+                        if request.reserved <= 0:
+                            request.error = ExchangeError(f"Not enough {symbol} funding balance to refuel")
+                        else:
+                            self._reserved[symbol] = self._reserved.get(symbol, 0) + request.reserved
+        except Exception as ex:
+            for request in batch.requests:
+                request.error = ex
+        finally:
+            batch.done.set()
+
+
+# Base exchange class. Instances are shared by all account threads
 class Exchange:
 
-    def __init__(self, name: str, api_key: str, secret_key: str, ccxt_args: dict) -> None:
+    def __init__(self, name: str, api_key: str, secret_key: str, ccxt_args: dict,
+                 request_limiter: Optional[RequestWeightLimiter] = None) -> None:
         self.name = name
         ccxt_exchange = getattr(ccxt, name)
-        self._ccxt_exc = ccxt_exchange({
+        self._ccxt_exc = SynchronizedClient(ccxt_exchange({
             'apiKey': api_key,
             'secret': secret_key,
             'enableRateLimit': True,
             **ccxt_args
-        })
+        }), request_limiter)
+        # Withdraw fees and limits of the currencies must be current, so only the markets are served stale
+        self._metadata = MetadataCache(ExchangeSettings.METADATA_TTL, ExchangeSettings.METADATA_MAX_STALE_AGE,
+                                       MetadataSnapshot.get_default(), name, stale_keys=['markets'])
+
+        self._withdraw_tracker = WithdrawTracker(name, self.fetch_recent_withdrawals,
+                                                 ExchangeSettings.WITHDRAW_POLL_INTERVAL)
+        self._refuel_aggregator = RefuelAggregator(self, ExchangeSettings.REFUEL_BATCH_WINDOW)
+        self._balances = MetadataCache(ExchangeSettings.BALANCE_TTL)
+        self._withdrawal_stream: Optional[Any] = None
+        self._withdrawal_stream_lock = threading.Lock()
+
+        # Markets of the previous run, so the ccxt client doesn't download them before the first order
+        markets = self._metadata.peek('markets')
+        if markets:
+            self._ccxt_exc.set_markets(markets, self._metadata.peek('currencies'))
+
+    def fetch_currencies(self) -> dict:
+        """ Method that returns currencies with their withdraw networks, fees and limits (cached) """
+
+        return self._metadata.get('currencies', self._ccxt_exc.fetch_currencies)
+
+    def load_markets(self) -> dict:
+        """ Method that returns markets with their filters (cached) """
+
+        return self._metadata.get('markets', lambda: self._ccxt_exc.load_markets(reload=True))
+
+    def invalidate_metadata(self) -> None:
+        """ Method that drops the cached metadata, e.g. after a request rejected because of outdated fees """
+
+        self._metadata.invalidate('currencies')
+        self._metadata.invalidate('markets')
 
     def withdraw(self, symbol: str, amount: float, network: str, address: str) -> WithdrawStatus:
         """ Method that initiates withdraw funds from the exchange """
         raise NotSupported(f"{self.name} withdraw() is not implemented")
 
     def wait_for_withdraw_to_finish(self, withdraw_id: str, timeout: int = 1800) -> None:
-        time.sleep(10)  # Sleep to let the exchange process the withdrawal request
+        logger.info(f'Waiting for {withdraw_id} withdraw to be sent')
+        self._start_withdrawal_stream()
+        status = self._withdraw_tracker.wait(withdraw_id, timeout)
 
-        start_time = time.time()
+        if status == WithdrawStatus.FINISHED:
+            logger.info(f"Withdraw {withdraw_id} finished")
+            return
 
-        logger.info(f'Waiting for {withdraw_id} withdraw to be sent')
-        while True:
-            status = self.get_withdraw_status(withdraw_id)
+        if status == WithdrawStatus.CANCELED:
+            raise WithdrawCanceled(f'Withdraw {withdraw_id} canceled')
 
-            if status == WithdrawStatus.FINISHED:
-                logger.info(f"Withdraw {withdraw_id} finished")
-                return
+        raise WithdrawTimeout(f"Withdraw timeout reached. Id: {withdraw_id}")
+
+    def _create_withdrawal_stream(self) -> Optional[Any]:
+        """ Method that creates the stream pushing withdrawal updates to the tracker. None - polling only """
+        return None
 
-            if status == WithdrawStatus.CANCELED:
-                raise WithdrawCanceled(f'Withdraw {withdraw_id} canceled')
+    def _start_withdrawal_stream(self) -> None:
+        if not ExchangeSettings.WITHDRAWAL_STREAM:
+            return
 
-            if time.time() - start_time >= timeout:
-                raise WithdrawTimeout(f"Withdraw timeout reached. Id: {withdraw_id}")
+        with self._withdrawal_stream_lock:
+            if self._withdrawal_stream is None:
+                self._withdrawal_stream = self._create_withdrawal_stream()
+                if self._withdrawal_stream:
+                    self._withdrawal_stream.start()
 
-            time.sleep(10)  # Wait for 10 seconds before checking again
+    def fetch_recent_withdrawals(self, since: int) -> List[dict]:
+        """ Method that fetches withdrawals made after the since timestamp (ms) """
+
+        return self._ccxt_exc.fetch_withdrawals(since=since)
 
     def is_withdraw_supported(self, symbol: str, network: str) -> bool:
         """ Method that checks if the symbol can be withdrawn """
@@ -75,13 +535,76 @@ class Exchange:
         """ Method that fetches non-trading balance from which we can initiate withdraw (can be named differently) """
         raise NotSupported(f"{self.name} get_funding_balance() is not implemented")
 
-    def get_withdraw_status(self, withdraw_id: str) -> WithdrawStatus:
-        """ Method that fetches withdraw status """
-        raise NotSupported(f"{self.name} get_withdraw_info() is not implemented")
+    def buy_for_withdraw(self, symbol: str, amount: float) -> float:
+        """ Method that buys the token, moves it to the funding balance and returns the received amount """
+        raise NotSupported(f"{self.name} buy_for_withdraw() is not implemented")
+
+    def _get_refuel_amount(self, symbol: str, amount: float, network: str) -> float:
+        withdraw_info = self.get_withdraw_info(symbol, network)
+
+        if withdraw_info.min_amount > amount:
+            mul = random.uniform(1, 2)
+            amount = withdraw_info.min_amount * mul
+            decimal = random.randint(4, 7)
+            amount = round(amount, decimal)
+
+        amount += withdraw_info.fee * 3
+
+        return amount
 
     def buy_token_and_withdraw(self, symbol: str, amount: float, network: str, address: str) -> None:
-        """ Method that checks balance of symbol token, buys it if it's not enough and withdraws this token """
-        raise NotSupported(f"{self.name} buy_token_and_withdraw() is not implemented")
+        """ Method that checks balance of symbol token, buys it if it's not enough and withdraws this token.
+        Concurrent refuels of the same token are bought with one order """
+
+        amount_to_withdraw = self.reserve_refuel(symbol, amount, network)
+        self.withdraw_reserved(symbol, amount_to_withdraw, network, address)
+
+    def reserve_refuel(self, symbol: str, amount: float, network: str) -> float:
+        """ Method that reserves the funding balance for the refuel (buying the token if it isn't enough).
+        Returns the amount to withdraw. Nothing is withdrawn yet, so another exchange can be used on errors """
+
+        amount = self._get_refuel_amount(symbol, amount, network)
+        return self._refuel_aggregator.reserve(symbol, amount)
+
+    def withdraw_reserved(self, symbol: str, amount_to_withdraw: float, network: str, address: str) -> None:
+        """ Method that withdraws the amount reserved by reserve_refuel and waits for the withdrawal.
+        The withdrawal may be accepted even if the request fails """
+
+        start_time = time.time()
+
+        try:
+            withdraw_id = self.withdraw(symbol, amount_to_withdraw, network, address)
+        finally:
+            self._refuel_aggregator.release(symbol, amount_to_withdraw)
+            self._balances.invalidate(symbol)
+
+        self.wait_for_withdraw_to_finish(withdraw_id)
+        self._record_withdraw_latency(symbol, network, time.time() - start_time)
+
+    def get_cached_funding_balance(self, symbol: str) -> float:
+        """ Method that returns the funding balance fetched at most BALANCE_TTL seconds ago """
+
+        return self._balances.get(symbol, lambda: self.get_funding_balance(symbol))
+
+    def _record_withdraw_latency(self, symbol: str, network: str, latency: float) -> None:
+        key = f"withdraw_latency.{symbol}.{network}"
+        samples = self._metadata.peek(key) or []
+        self._metadata.put(key, (samples + [latency])[-ExchangeSettings.WITHDRAW_LATENCY_SAMPLES:])
+
+    def get_withdraw_latency(self, symbol: str, network: str) -> Optional[float]:
+        """ Method that returns the median time of the recent finished withdrawals (seconds) """
+
+        samples = self._metadata.peek(f"withdraw_latency.{symbol}.{network}")
+
+        return statistics.median(samples) if samples else None
+
+    def get_refuel_quote(self, symbol: str, network: str) -> RefuelQuote:
+        """ Method that returns the current withdraw fee and limit, funding balance and withdrawal latency """
+
+        withdraw_info = self.get_withdraw_info(symbol, network)
+
+        return RefuelQuote(self.name, withdraw_info.fee, withdraw_info.min_amount,
+                           self.get_cached_funding_balance(symbol), self.get_withdraw_latency(symbol, network))
 
     @staticmethod
     def _parse_withdraw_status(withdraw_info: dict) -> WithdrawStatus:
@@ -92,7 +615,7 @@ class Exchange:
             return WithdrawStatus.FINISHED
         if withdraw_info['status'] == 'pending':
             return WithdrawStatus.PENDING
-        if withdraw_info['status'] == 'canceled':
+        if withdraw_info['status'] in ('canceled', 'failed'):
             return WithdrawStatus.CANCELED
 
         raise ValueError(f'Unknown withdraw status: {withdraw_info}')
@@ -1,4 +1,7 @@
 import os
+import threading
+from typing import Callable, Dict, Optional
+
 from dotenv import load_dotenv
 
 from exchange.binance.binance import Binance
@@ -9,14 +12,39 @@ load_dotenv()
 
 
 class ExchangeFactory:
+    """ Creates one client per exchange and process. The client is shared by all account threads, so they share
+    the connection pool, the rate limiter and the loaded markets """
+
+    _provider: Optional[Callable[[str], Exchange]] = None
+    _exchanges: Dict[str, Exchange] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def set_provider(provider: Optional[Callable[[str], Exchange]]) -> None:
+        """ Method that overrides the exchange creation (e.g. to use clients owned by another process) """
+
+        ExchangeFactory._provider = provider
+
     @staticmethod
     def create(exchange_name) -> Exchange:
-        if exchange_name.lower() == "binance":
+        if ExchangeFactory._provider:
+            return ExchangeFactory._provider(exchange_name)
+
+        exchange_name = exchange_name.lower()
+        with ExchangeFactory._lock:
+            if exchange_name not in ExchangeFactory._exchanges:
+                ExchangeFactory._exchanges[exchange_name] = ExchangeFactory._create_exchange(exchange_name)
+
+            return ExchangeFactory._exchanges[exchange_name]
+
+    @staticmethod
+    def _create_exchange(exchange_name: str) -> Exchange:
+        if exchange_name == "binance":
             api_key = os.getenv("BINANCE_API_KEY")
             secret_key = os.getenv("BINANCE_SECRET_KEY")
 
             return Binance(api_key, secret_key)
-        elif exchange_name.lower() == "okex":
+        elif exchange_name == "okex":
             api_key = os.getenv("OKEX_API_KEY")
             secret_key = os.getenv("OKEX_SECRET_KEY")
             password = os.getenv("OKEX_PASSWORD")
@@ -1,4 +1,11 @@
+import os
+
+from exchange.exchange import RequestLimit
+
+
 class OkexConstants:
+    WS_BUSINESS_URL = os.getenv('OKEX_WS_URL', 'wss://ws.okx.com:8443/ws/v5/business')  # withdrawal-info channel
+
     # Mapping inside chain names to OKX chain names
     NETWORKS = {
         'Ethereum': 'ERC-20',
@@ -20,3 +27,29 @@ class OkexConstants:
         'FTM': ['FTM'],
         'AVAX': ['Avalanche']
     }
+
+    # Per-endpoint request limits. OKX doesn't report the used limits in the response headers
+    REQUEST_LIMITS = {
+        'currencies': RequestLimit(6, 1),  # GET /api/v5/asset/currencies
+        'withdrawal': RequestLimit(6, 1),  # POST /api/v5/asset/withdrawal
+        'withdrawal_history': RequestLimit(6, 1),  # GET /api/v5/asset/withdrawal-history
+        'asset_balances': RequestLimit(6, 1),  # GET /api/v5/asset/balances
+        'transfer': RequestLimit(1, 1),  # POST /api/v5/asset/transfer
+        'instruments': RequestLimit(20, 2),  # GET /api/v5/public/instruments
+        'ticker': RequestLimit(20, 2),  # GET /api/v5/market/ticker
+        'order': RequestLimit(60, 2),  # POST /api/v5/trade/order
+        'order_details': RequestLimit(60, 2),  # GET /api/v5/trade/order
+    }
+
+    # ccxt method -> (limit, weight) of every request it sends
+    REQUEST_WEIGHTS = {
+        'fetch_currencies': [('currencies', 1)],
+        'withdraw': [('withdrawal', 1)],
+        'fetch_withdrawals': [('withdrawal_history', 1)],
+        'fetch_balance': [('asset_balances', 1)],
+        'transfer': [('transfer', 1)],
+        'load_markets': [('currencies', 1), ('instruments', 4)],  # fetch_currencies and instruments of 4 types
+        'fetch_ticker': [('ticker', 1)],
+        'create_market_order': [('order', 1)],
+        'fetch_order': [('order_details', 1)],
+    }
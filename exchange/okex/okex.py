@@ -1,12 +1,12 @@
 import logging
-import random
 from typing import List
 
 import ccxt
 
 from base.errors import ExchangeError, NotWhitelistedAddress
-from exchange.exchange import Exchange, WithdrawInfo, WithdrawStatus
+from exchange.exchange import Exchange, RequestWeightLimiter, WithdrawInfo
 from exchange.okex.constants import OkexConstants
+from exchange.okex.withdrawal_stream import OkexWithdrawalStream
 
 logger = logging.getLogger(__name__)
 
@@ -14,13 +14,18 @@ logger = logging.getLogger(__name__)
 class Okex(Exchange):
     def __init__(self, api_key: str, secret_key: str, api_password: str):
         ccxt_args = {'password': api_password}
-        super().__init__('okex', api_key, secret_key, ccxt_args)
+        super().__init__('okex', api_key, secret_key, ccxt_args,
+                         RequestWeightLimiter(OkexConstants.REQUEST_LIMITS, OkexConstants.REQUEST_WEIGHTS))
 
         self.funding_account = 'funding'
         self.trading_account = 'spot'
 
+    def _create_withdrawal_stream(self) -> OkexWithdrawalStream:
+        return OkexWithdrawalStream(OkexConstants.WS_BUSINESS_URL, self._ccxt_exc.apiKey, self._ccxt_exc.secret,
+                                    self._ccxt_exc.password, self._withdraw_tracker.push)
+
     def _get_withdraw_infos(self, symbol: str) -> List[WithdrawInfo]:
-        currencies = self._ccxt_exc.fetch_currencies()
+        currencies = self.fetch_currencies()
         chains_info = currencies[symbol]['networks']
 
         result = []
@@ -65,6 +70,8 @@ class Okex(Exchange):
             if 'Withdrawal address is not whitelisted for verification exemption' in str(ex):
                 raise NotWhitelistedAddress(f'Unable to withdraw {symbol}({network}) to {address}. '
                                             f'The address must be added to the whitelist') from ex
+            # Fees or limits could be changed
+            self.invalidate_metadata()
             raise
 
         logger.debug(f'Withdraw result: {result}')
@@ -72,11 +79,6 @@ class Okex(Exchange):
 
         return str(withdraw_id)
 
-    def get_withdraw_status(self, withdraw_id: str) -> WithdrawStatus:
-        withdraw_info = self._ccxt_exc.fetch_withdrawal(withdraw_id)
-
-        return self._parse_withdraw_status(withdraw_info)
-
     def transfer_funds(self, symbol: str, amount: float, from_account: str, to_account: str):
         logger.info(f'{symbol} transfer initiated. From {from_account} to {to_account}')
         result = self._ccxt_exc.transfer(symbol, amount, from_account, to_account)
@@ -104,24 +106,9 @@ class Okex(Exchange):
 
         return token_balance
 
-    def buy_token_and_withdraw(self, symbol: str, amount: float, network: str, address: str) -> None:
-        withdraw_info = self.get_withdraw_info(symbol, network)
-
-        if withdraw_info.min_amount > amount:
-            mul = random.uniform(1, 2)
-            amount = withdraw_info.min_amount * mul
-            decimal = random.randint(4, 7)
-            amount = round(amount, decimal)
-
-        amount += withdraw_info.fee * 3
-
-        balance = self.get_funding_balance(symbol)
-        if balance < amount:
-            # Multiplying to avoid decimals casting
-            amount_to_withdraw = self.buy_tokens_with_usdt(symbol, amount) * 0.99
-            self.transfer_funds(symbol, amount_to_withdraw, self.trading_account, self.funding_account)
-        else:
-            amount_to_withdraw = amount
+    def buy_for_withdraw(self, symbol: str, amount: float) -> float:
+        # Multiplying to avoid decimals casting
+        bought_amount = self.buy_tokens_with_usdt(symbol, amount) * 0.99
+        self.transfer_funds(symbol, bought_amount, self.trading_account, self.funding_account)
 
-        withdraw_id = self.withdraw(symbol, amount_to_withdraw, network, address)
-        self.wait_for_withdraw_to_finish(withdraw_id)
+        return bought_amount
@@ -0,0 +1,112 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from typing import Callable
+
+import websockets
+
+from base.errors import ExchangeError
+from config import TimeRanges
+from exchange.exchange import WithdrawStatus
+
+logger = logging.getLogger(__name__)
+
+
+class OkexWithdrawalStream:
+    """ Client of the OKX withdrawal-info private channel. It runs an asyncio loop in a daemon thread, reconnects
+    with a backoff and passes every withdrawal state update to the callback. Updates missed while disconnected
+    are picked up by the REST polling """
+
+    CHANNEL = 'withdrawal-info'
+    PING_INTERVAL = 25  # seconds. OKX closes the connections idle for 30 seconds
+    RESPONSE_TIMEOUT = 10  # seconds
+    MAX_RECONNECT_DELAY = TimeRanges.MINUTE
+
+    def __init__(self, url: str, api_key: str, secret_key: str, password: str,
+                 on_update: Callable[[str, WithdrawStatus], None]) -> None:
+        self.url = url
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.password = password
+        self.on_update = on_update
+        self.connected = threading.Event()  # Set while the channel is subscribed
+
+    def start(self) -> None:
+        thread = threading.Thread(target=lambda: asyncio.run(self._run()), name="OkexWithdrawalStream", daemon=True)
+        thread.start()
+
+    @staticmethod
+    def parse_state(state: str) -> WithdrawStatus:
+        """ Method that maps the withdrawal state of OKX to the withdraw status """
+
+        if state == '2':  # Withdraw success
+            return WithdrawStatus.FINISHED
+        if state in ('-1', '-2'):  # Failed, canceled
+            return WithdrawStatus.CANCELED
+
+        return WithdrawStatus.PENDING
+
+    async def _run(self) -> None:
+        delay = 1
+        while True:
+            try:
+                await self._listen()
+                delay = 1
+            except Exception as ex:
+                logger.warning(f"OKX withdrawal stream error: {ex}. Reconnecting in {delay} seconds")
+            finally:
+                self.connected.clear()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+
+    def _get_login_args(self) -> dict:
+        timestamp = str(int(time.time()))
+        signature = hmac.new(self.secret_key.encode(), f"{timestamp}GET/users/self/verify".encode(), hashlib.sha256)
+
+        return {
+            'apiKey': self.api_key,
+            'passphrase': self.password,
+            'timestamp': timestamp,
+            'sign': base64.b64encode(signature.digest()).decode()
+        }
+
+    async def _request(self, ws, op: str, args: list) -> None:
+        await ws.send(json.dumps({'op': op, 'args': args}))
+
+        response = json.loads(await asyncio.wait_for(ws.recv(), self.RESPONSE_TIMEOUT))
+        if response.get('event') != op:
+            raise ExchangeError(f"OKX {op} failed: {response.get('msg', response)}")
+
+    async def _ping(self, ws) -> None:
+        while True:
+            await asyncio.sleep(self.PING_INTERVAL)
+            await ws.send('ping')
+
+    async def _listen(self) -> None:
+        async with websockets.connect(self.url, ping_interval=None) as ws:
+            await self._request(ws, 'login', [self._get_login_args()])
+            await self._request(ws, 'subscribe', [{'channel': self.CHANNEL}])
+            self.connected.set()
+            logger.debug("OKX withdrawal stream subscribed")
+
+            ping = asyncio.ensure_future(self._ping(ws))
+            try:
+                async for message in ws:
+                    self._handle(message)
+            finally:
+                ping.cancel()
+
+    def _handle(self, message: str) -> None:
+        if message == 'pong':
+            return
+
+        data = json.loads(message)
+        for withdrawal in data.get('data', []):
+            if 'wdId' in withdrawal:
+                self.on_update(str(withdrawal['wdId']), self.parse_state(str(withdrawal.get('state'))))
@@ -0,0 +1,78 @@
+import logging
+from typing import List, Optional, Tuple
+
+from base.errors import ExchangeError
+from config import TimeRanges
+from exchange.exchange import RefuelQuote
+from exchange.factory import ExchangeFactory
+
+logger = logging.getLogger(__name__)
+
+
+class RefuelRouter:
+    """ Router of the refuels between several exchanges. Every refuel is sent to the exchange expected to deliver
+    it first (by the recent withdrawal times and the need to buy the token), the next exchanges are used
+    if the refuel fails before the withdrawal request is sent (quote, market and balance errors) """
+
+    DEFAULT_LATENCY = TimeRanges.MINUTE * 10  # Expected withdrawal time of an exchange without finished withdrawals
+    PURCHASE_PENALTY = TimeRanges.MINUTE  # Extra time of a refuel that needs a token purchase
+
+    def __init__(self, exchange_names: List[str]) -> None:
+        self.exchange_names = exchange_names
+
+    def get_quotes(self, symbol: str, network: str) -> List[RefuelQuote]:
+        quotes = []
+
+        for exchange_name in self.exchange_names:
+            exchange = ExchangeFactory.create(exchange_name)
+            if not exchange.is_withdraw_supported(symbol, network):
+                continue
+
+            try:
+                quotes.append(exchange.get_refuel_quote(symbol, network))
+            except Exception as ex:
+                logger.warning(f"Unable to get {exchange_name} {symbol}({network}) refuel quote: {ex}")
+
+        return quotes
+
+    def get_expected_time(self, quote: RefuelQuote, amount: float) -> float:
+        expected_time = quote.latency if quote.latency is not None else self.DEFAULT_LATENCY
+
+        # Same amount as the exchange withdraws (min amount and fees are the upper bounds)
+        if quote.funding_balance < max(amount, quote.min_amount * 2) + quote.fee * 3:
+            expected_time += self.PURCHASE_PENALTY
+
+        return expected_time
+
+    def rank(self, symbol: str, amount: float, network: str) -> List[Tuple[float, RefuelQuote]]:
+        """ Method that returns (expected time, quote) of the exchanges starting from the fastest one """
+
+        ranked = [(self.get_expected_time(quote, amount), quote) for quote in self.get_quotes(symbol, network)]
+        ranked.sort(key=lambda item: (item[0], item[1].fee))
+
+        return ranked
+
+    def buy_token_and_withdraw(self, symbol: str, amount: float, network: str, address: str) -> None:
+        ranked = self.rank(symbol, amount, network)
+        if not ranked:
+            raise ExchangeError(f"No exchange supports {symbol}({network}) refuels")
+
+        last_error: Optional[Exception] = None
+        for expected_time, quote in ranked:
+            logger.info(f"{symbol}({network}) refuel routed to {quote.exchange}. "
+                        f"Expected time: {int(expected_time)} seconds. Fee: {quote.fee}")
+
+            exchange = ExchangeFactory.create(quote.exchange)
+            try:
+                amount_to_withdraw = exchange.reserve_refuel(symbol, amount, network)
+            except Exception as ex:
+                logger.warning(f"{quote.exchange} refuel failed: {ex}")
+                last_error = ex
+                continue
+
+            # Errors of the withdrawal request aren't retried on another exchange: the first withdrawal
+            # may have been accepted (timeouts, unknown withdrawals), so it would be refueled twice
+            exchange.withdraw_reserved(symbol, amount_to_withdraw, network, address)
+            return
+
+        raise last_error
@@ -1 +1,5 @@
 from logic.account_thread import AccountThread
+from logic.account_runner import AccountRunner
+from logic.checkpoint import CheckpointStore
+from logic.withdraw_pipeline import WithdrawPipeline, WithdrawResult
+from logic.refuel_planner import RefuelPlanner, RefuelPlanItem
@@ -0,0 +1,63 @@
+import logging
+from typing import Any, Iterable, List, Optional, Tuple
+
+from config import BridgerMode, RefuelMode, RunnerSettings
+from logic.account_thread import AccountThread
+from logic.checkpoint import CheckpointStore
+
+logger = logging.getLogger(__name__)
+
+
+class AccountRunner:
+    """ Utility class that runs an account thread for every (account_id, private_key) pair. At most
+    max_active_accounts threads run at once, the next pair is taken from the key source when one of them finishes """
+
+    def __init__(self, bridger_mode: BridgerMode, refuel_mode: RefuelMode, bridges_limit: Optional[int],
+                 bridge_limiter: Optional[Any] = None, checkpoint_store: Optional[CheckpointStore] = None,
+                 max_active_accounts: int = RunnerSettings.MAX_ACTIVE_ACCOUNTS) -> None:
+        self.bridger_mode = bridger_mode
+        self.refuel_mode = refuel_mode
+        self.bridges_limit = bridges_limit
+        self.bridge_limiter = bridge_limiter
+        self.checkpoint_store = checkpoint_store
+        self.max_active_accounts = max_active_accounts
+
+    def _wait_for_slot(self, accounts: List[AccountThread]) -> List[AccountThread]:
+        """ Method that waits until the active set has room for one more account. Returns the running accounts """
+
+        while self.max_active_accounts and len(accounts) >= self.max_active_accounts:
+            accounts[0].join(RunnerSettings.SLOT_POLL_INTERVAL)
+            accounts = [account for account in accounts if account.is_alive()]
+
+        return accounts
+
+    def run(self, private_keys: Iterable[Tuple[int, str]]) -> None:
+        accounts = []
+        started = 0
+        private_keys = iter(private_keys)
+
+        while True:
+            # The next key is read and decoded only when the active set has room for its account
+            accounts = self._wait_for_slot(accounts)
+            entry = next(private_keys, None)
+            if entry is None:
+                break
+
+            account_id, private_key = entry
+            account = AccountThread(account_id, private_key, self.bridger_mode, self.refuel_mode,
+                                    self.bridges_limit, self.bridge_limiter,
+                                    checkpoint_store=self.checkpoint_store)
+            account.start()
+            accounts.append(account)
+
+            started += 1
+            if started == self.max_active_accounts:
+                logger.info(f"{started} accounts started. The rest are started as they finish")
+
+        logger.info(f"All {started} accounts started")
+
+        for account in accounts:
+            account.join()
+
+        if self.checkpoint_store:
+            self.checkpoint_store.close()
@@ -1,33 +1,45 @@
 import logging
 import threading
 import time
-from typing import Optional
+from typing import Any, Optional, Tuple
 
 import requests
 from ccxt.base.errors import RateLimitExceeded, InsufficientFunds
 from eth_account import Account
 
 from base.errors import BaseError
-from config import TimeRanges, BridgerMode, RefuelMode
+from config import TimeRanges, SleepTimings, BridgerMode, RefuelMode, BalanceLedgerSettings
 from logger import setup_thread_logger
 from logic.stargate_states import SleepBeforeStartStargateBridgerState, CheckStablecoinBalanceState
 from logic.btcb_states import SleepBeforeStartBTCBridgerState, CheckBTCbBalanceState
-from logic.state import InitialState
+from logic.state import InitialState, State
+from logic.checkpoint import CheckpointStore, StateSerializer
+from network.arrival_tracker import ArrivalTracker
+from network.balance_ledger import BalanceLedger
+from network.transaction_journal import TransactionJournal
 
 logger = logging.getLogger(__name__)
 
 
 class AccountThread(threading.Thread):
     def __init__(self, account_id: int, private_key: str, bridger_mode: BridgerMode, refuel_mode: RefuelMode,
-                 bridges_limit: Optional[int]) -> None:
+                 bridges_limit: Optional[int], bridge_limiter: Optional[Any] = None,
+                 remaining_bridges: Optional[int] = None,
+                 checkpoint_store: Optional[CheckpointStore] = None) -> None:
         super().__init__(name=f"Account-{account_id}")
         self.account_id = account_id
         self.account = Account.from_key(private_key)
         self.bridger_mode = bridger_mode
         self.refuel_mode = refuel_mode
         self.bridges_limit = bridges_limit
-        self.remaining_bridges = bridges_limit
+        self.remaining_bridges = remaining_bridges if remaining_bridges is not None else bridges_limit
+        self.bridge_limiter = bridge_limiter
+        self.checkpoint_store = checkpoint_store
+        self.balance_ledger = BalanceLedger(BalanceLedgerSettings.RECONCILE_INTERVAL)
+        self._prepared_bridge: Optional[Tuple[tuple, Any]] = None  # (route, prepared transaction)
         self.state = InitialState()
+        self._state_attempts = 0
+        self._stop_event = threading.Event()
 
     def run(self) -> None:
         setup_thread_logger("logs")
@@ -42,8 +54,104 @@ class AccountThread(threading.Thread):
         else:
             raise ValueError("Unknown BridgeMode")
 
+    def stop(self) -> None:
+        """ Method that asks the account to stop. It's checked between state transitions """
+
+        self._stop_event.set()
+
+    def is_stopped(self) -> bool:
+        return self._stop_event.is_set()
+
+    def sleep(self, seconds: float) -> bool:
+        """ Method that sleeps until the timeout or the stop request. Returns False if the account was stopped """
+
+        return not self._stop_event.wait(seconds)
+
     def set_state(self, state) -> None:
         self.state = state
+        self._state_attempts = 0
+        self._save_checkpoint()
+
+    def _save_checkpoint(self) -> None:
+        if not self.checkpoint_store:
+            return
+
+        checkpoint = StateSerializer.to_checkpoint(self.state, self.account.address, self.bridger_mode,
+                                                   self.remaining_bridges, self.balance_ledger.to_json())
+        if checkpoint:
+            self.checkpoint_store.save(checkpoint)
+
+    def _reconcile_transactions(self) -> bool:
+        """ Method that resolves transactions journaled by the previous run.
+        Returns True if a bridge transaction from the previous run was confirmed """
+
+        journal = TransactionJournal.get_default()
+        if not journal:
+            return False
+
+        networks = {network.name: network for network in StateSerializer.NETWORKS[self.bridger_mode]}
+
+        try:
+            confirmed = journal.reconcile(self.account.address, networks)
+        except (BaseError, requests.exceptions.RequestException) as ex:
+            logger.error(f'Unable to reconcile journaled transactions: {ex}')
+            return False
+
+        if not any(entry.purpose in ('swap', 'bridge') for entry in confirmed):
+            return False
+
+        logger.info("Bridge from the previous run is confirmed")
+        self.balance_ledger.clear()
+        if self.remaining_bridges:
+            self.remaining_bridges -= 1
+
+        return True
+
+    def _restore_state(self) -> Optional[State]:
+        """ Method that restores the last checkpointed state and the bridge counter of the account """
+
+        if not self.checkpoint_store:
+            return None
+
+        checkpoint = self.checkpoint_store.load(self.account.address, self.bridger_mode)
+        if not checkpoint:
+            return None
+
+        state = StateSerializer.restore(checkpoint)
+        if not state:
+            logger.warning(f"Unable to restore {checkpoint.state} checkpoint. Starting from the beginning")
+            return None
+
+        if checkpoint.remaining_bridges is not None and self.remaining_bridges is not None:
+            self.remaining_bridges = min(self.remaining_bridges, checkpoint.remaining_bridges)
+
+        if checkpoint.balances:
+            self.balance_ledger.load_json(checkpoint.balances)
+
+        logger.info(f"Resuming from the {checkpoint.state} checkpoint")
+        return state
+
+    def set_prepared_bridge(self, route: tuple, prepared: Any) -> None:
+        self._prepared_bridge = (route, prepared)
+
+    def pop_prepared_bridge(self, route: tuple) -> Optional[Any]:
+        """ Method that returns the bridge transaction prepared for the route if it's still fresh """
+
+        prepared_bridge, self._prepared_bridge = self._prepared_bridge, None
+        if not prepared_bridge or prepared_bridge[0] != route:
+            return None
+
+        prepared = prepared_bridge[1]
+        if time.time() - prepared.prepared_at > SleepTimings.BRIDGE_PREFETCH_MAX_AGE:
+            return None
+
+        return prepared
+
+    def wait_for_bridge_slot(self) -> None:
+        """ Method that waits for the global bridge pacing (shared by all accounts and processes) """
+
+        if self.bridge_limiter:
+            self.bridge_limiter.acquire()
 
     def are_bridges_left(self) -> bool:
         if self.remaining_bridges is None:
@@ -54,48 +162,111 @@ class AccountThread(threading.Thread):
             logger.info('The bridge limit has been reached. The work is over')
         return bridges_left
 
-    def _run_stargate_mode(self) -> None:
-        logger.info("Running Stargate bridger")
+    def _retry_state(self, ex: Exception) -> bool:
+        """ Method that sleeps before retrying the current state if its retry policy allows it """
+
+        policy = self.state.retry_policy
+        if not policy or not policy.is_retryable(ex):
+            return False
+
+        self._state_attempts += 1
+        if self._state_attempts >= policy.max_attempts:
+            logger.error(f'{type(self.state).__name__} failed {self._state_attempts} times')
+            return False
+
+        delay = policy.get_delay(self._state_attempts)
+        logger.warning(f'{type(self.state).__name__} failed: {ex}. Retrying in {round(delay, 1)} seconds '
+                       f'({self._state_attempts}/{policy.max_attempts - 1})')
+        time.sleep(delay)
+
+        return True
+
+    def _settle_sent_transactions(self) -> Optional[bool]:
+        """ Method that waits for the transactions journaled by the failed state before the error. Returns True
+        if the bridge was confirmed, False if nothing is pending and None if the transactions are still unknown
+        (or aren't journaled) """
+
+        journal = TransactionJournal.get_default()
+        if not journal:
+            # Nothing tells whether the bridge was broadcast, so the balances are read again before the next one
+            logger.error(f'{type(self.state).__name__} failed without the transaction journal. Not retrying it')
+            return None
+
+        policy = self.state.retry_policy
+        if not policy:
+            return None
+
+        for attempt in range(1, policy.max_attempts):
+            if not journal.get_pending(self.account.address):
+                return False
+
+            if self._reconcile_transactions():
+                return True
+
+            if not journal.get_pending(self.account.address):
+                return False
 
-        self.set_state(SleepBeforeStartStargateBridgerState())
-        while self.are_bridges_left():
+            time.sleep(policy.get_delay(attempt))
+
+        logger.error(f'Journaled transactions of {type(self.state).__name__} are still pending')
+        return None
+
+    def _reset_state(self, ex: Exception, state: State) -> None:
+        if self.state.sends_bridge or self.state.waits_for_arrival:
+            # The reset state reads the balances again, the destination chain isn't watched for the bridge anymore
+            ArrivalTracker.get_default().cancel(self.account.address)
+
+        if isinstance(ex, BaseError):
+            logger.error(f'Exception: {ex}')
+            self.set_state(state)
+        elif isinstance(ex, requests.exceptions.RequestException):
+            logger.error(f'Too many request to HTTP Provider!')
+            self.set_state(state)
+            self.sleep(TimeRanges.MINUTE)
+        elif isinstance(ex, RateLimitExceeded):
+            logger.error(f'Too many request to exchange!')
+            self.set_state(state)
+            self.sleep(TimeRanges.MINUTE)
+        elif isinstance(ex, InsufficientFunds):
+            logger.error(f'Not enough balance on exchange!')
+            self.set_state(state)
+            self.sleep(10 * TimeRanges.MINUTE)
+
+    def _run_state_loop(self, reset_state_class: type) -> None:
+        while self.are_bridges_left() and not self.is_stopped():
             try:
                 self.state.handle(self)
-            except BaseError as ex:
-                logger.error(f'Exception: {ex}')
-                self.set_state(CheckStablecoinBalanceState())
-            except requests.exceptions.HTTPError:
-                logger.error(f'Too many request to HTTP Provider!')
-                self.set_state(CheckStablecoinBalanceState())
-                time.sleep(TimeRanges.MINUTE)
-            except RateLimitExceeded:
-                logger.error(f'Too many request to exchange!')
-                self.set_state(CheckStablecoinBalanceState())
-                time.sleep(TimeRanges.MINUTE)
-            except InsufficientFunds:
-                logger.error(f'Not enough balance on exchange!')
-                self.set_state(CheckStablecoinBalanceState())
-                time.sleep(10 * TimeRanges.MINUTE)
+            except (BaseError, requests.exceptions.RequestException, RateLimitExceeded, InsufficientFunds) as ex:
+                if self.state.sends_bridge:
+                    # Only the part before the broadcast is retried, a sent bridge is awaited by its hash
+                    settled = self._settle_sent_transactions()
+                    if settled:
+                        ArrivalTracker.get_default().cancel(self.account.address)
+                        self.set_state(reset_state_class())
+                        continue
+                    if settled is None:
+                        self._reset_state(ex, reset_state_class())
+                        continue
+
+                if not self._retry_state(ex):
+                    self._reset_state(ex, reset_state_class())
+
+    def _run_stargate_mode(self) -> None:
+        logger.info("Running Stargate bridger")
+
+        state = self._restore_state() or SleepBeforeStartStargateBridgerState()
+        if self._reconcile_transactions():
+            state = CheckStablecoinBalanceState()
+        self.set_state(state)
+
+        self._run_state_loop(CheckStablecoinBalanceState)
 
     def _run_btcb_mode(self) -> None:
         logger.info("Running BTC.b bridger")
 
-        self.set_state(SleepBeforeStartBTCBridgerState())
-        while self.are_bridges_left():
-            try:
-                self.state.handle(self)
-            except BaseError as ex:
-                logger.error(f'Exception: {ex}')
-                self.set_state(CheckBTCbBalanceState())
-            except requests.exceptions.HTTPError:
-                logger.error(f'Too many request to HTTP Provider!')
-                self.set_state(CheckBTCbBalanceState())
-                time.sleep(TimeRanges.MINUTE)
-            except RateLimitExceeded:
-                logger.error(f'Too many request to exchange!')
-                self.set_state(CheckBTCbBalanceState())
-                time.sleep(TimeRanges.MINUTE)
-            except InsufficientFunds:
-                logger.error(f'Not enough balance on exchange!')
-                self.set_state(CheckBTCbBalanceState())
-                time.sleep(10 * TimeRanges.MINUTE)
+        state = self._restore_state() or SleepBeforeStartBTCBridgerState()
+        if self._reconcile_transactions():
+            state = CheckBTCbBalanceState()
+        self.set_state(state)
+
+        self._run_state_loop(CheckBTCbBalanceState)
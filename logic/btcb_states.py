@@ -1,3 +1,4 @@
+import concurrent.futures
 import logging
 import datetime
 import random
@@ -5,15 +6,19 @@ import time
 import os
 from dataclasses import dataclass
 from dotenv import load_dotenv
-from typing import List
+from typing import Dict, List, Optional
 
-from base.errors import ConfigurationError, NotWhitelistedAddress
+import requests
+
+from base.errors import BaseError, ConfigurationError, NotWhitelistedAddress
 from config import SUPPORTED_NETWORKS_BTCB, SleepTimings, RefuelMode
-from logic.state import State
+from logic.state import State, RPC_RETRY_POLICY
 from network import EVMNetwork
+from network.deposit_watcher import wait_for_deposit
+from network.arrival_tracker import ArrivalTracker
 from network.polygon.polygon import Polygon
 from utility import Stablecoin
-from exchange import ExchangeFactory
+from exchange import ExchangeFactory, RefuelRouter
 from btcb import BTCbBridgeHelper, BTCbUtils, BTCbConstants
 
 logger = logging.getLogger(__name__)
@@ -22,37 +27,56 @@ load_dotenv()
 
 # State for waiting before start to randomize start time
 class SleepBeforeStartBTCBridgerState(State):
-    def __init__(self) -> None:
-        pass
+    def __init__(self, wake_up_time: Optional[float] = None) -> None:
+        if wake_up_time is None:
+            sleep_time = random.randint(SleepTimings.AFTER_START_RANGE[0], SleepTimings.AFTER_START_RANGE[1])
+            wake_up_time = time.time() + sleep_time
+        self.wake_up_time = wake_up_time
 
     def handle(self, thread) -> None:
-        sleep_time = random.randint(SleepTimings.AFTER_START_RANGE[0], SleepTimings.AFTER_START_RANGE[1])
+        sleep_time = max(0, int(self.wake_up_time - time.time()))
 
         logger.info(f"Sleeping {sleep_time} seconds before start")
-        time.sleep(sleep_time)
+        if not thread.sleep(sleep_time):
+            return
 
         thread.set_state(CheckBTCbBalanceState())
 
 
 # State for waiting for the BTC.b deposit
 class WaitForBTCbDeposit(State):
-    def __init__(self) -> None:
-        pass
+    def __init__(self, from_blocks: Optional[Dict[str, int]] = None) -> None:
+        self.from_blocks = from_blocks  # Blocks of the preceding balance check, by network name
 
     def handle(self, thread) -> None:
         logger.info("Waiting for BTC.b deposit")
-        time.sleep(SleepTimings.BALANCE_RECHECK_TIME)
+
+        watched = {network: [BTCbUtils.get_btcb_contract_address(network)] for network in SUPPORTED_NETWORKS_BTCB}
+        deposits = wait_for_deposit(thread.account.address, watched, SleepTimings.DEPOSIT_WAIT_TIMEOUT,
+                                    from_blocks=self.from_blocks)
+
+        for deposit in deposits:
+            logger.info(f"{deposit.network}. BTC.b deposit received")
+            thread.balance_ledger.credit(deposit.network, deposit.token, deposit.amount)
+
+        if not deposits:
+            # Full recheck of the balances
+            thread.balance_ledger.clear()
 
         thread.set_state(CheckBTCbBalanceState())
 
 
 # State for checking the BTC.b balance
 class CheckBTCbBalanceState(State):
+    retry_policy = RPC_RETRY_POLICY
+
     def __init__(self) -> None:
         pass
 
-    def is_enough_balance(self, network: EVMNetwork, address: str) -> bool:
-        balance = BTCbUtils.get_btcb_balance(network, address)
+    def is_enough_balance(self, network: EVMNetwork, thread) -> bool:
+        balance = thread.balance_ledger.get_or_fetch(
+            network.name, BTCbUtils.get_btcb_contract_address(network),
+            lambda: BTCbUtils.get_btcb_balance(network, thread.account.address))
         min_balance = float(os.getenv('BTCB_MIN_BALANCE')) * 10 ** BTCbConstants.BTCB_DECIMALS
         min_balance = int(min_balance)
 
@@ -69,7 +93,7 @@ class CheckBTCbBalanceState(State):
         result = []
 
         for network in SUPPORTED_NETWORKS_BTCB:
-            if self.is_enough_balance(network, thread.account.address):
+            if self.is_enough_balance(network, thread):
                 result.append(network)
 
         return result
@@ -77,10 +101,13 @@ class CheckBTCbBalanceState(State):
     def handle(self, thread) -> None:
         logger.info("Checking BTC.b balance")
 
+        # Deposits made after the check are looked for from these blocks
+        from_blocks = {network.name: network.get_cached_block_number() for network in SUPPORTED_NETWORKS_BTCB}
+
         networks = self.find_networks_with_balance(thread)
         if len(networks) == 0:
             logger.info("Not enough BTC.b balance. Refill one of the supported networks")
-            thread.set_state(WaitForBTCbDeposit())
+            thread.set_state(WaitForBTCbDeposit(from_blocks))
         elif len(networks) == 1:
             logger.info(f"{networks[0].name} network meet the minimum BTC.b balance requirements")
             thread.set_state(ChooseDestinationNetworkState(networks[0]))
@@ -114,60 +141,77 @@ class ChooseDestinationNetworkState(State):
 
 # State for deciding whether gas will be refueled automatically or manually
 class RefuelDecisionState(State):
-    def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork) -> None:
+    def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork,
+                 native_balance: Optional[int] = None) -> None:
         self.src_network = src_network
         self.dst_network = dst_network
+        self.native_balance = native_balance  # Balance of the preceding check
 
     def handle(self, thread) -> None:
         logger.info("Checking possible refuel options")
 
-        if thread.refuel_mode in [RefuelMode.OKEX, RefuelMode.BINANCE]:
+        if thread.refuel_mode in [RefuelMode.OKEX, RefuelMode.BINANCE, RefuelMode.AUTO]:
             thread.set_state(SleepBeforeExchangeRefuelState(self.src_network, self.dst_network))
         else:
-            thread.set_state(WaitForManualRefuelState(self.src_network, self.dst_network))
+            thread.set_state(WaitForManualRefuelState(self.src_network, self.dst_network, self.native_balance))
 
 
 # State for waiting for a manual native token deposit (in case the auto-refuel failed or disabled)
 class WaitForManualRefuelState(State):
-    def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork) -> None:
+    def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork,
+                 native_balance: Optional[int] = None) -> None:
         self.src_network = src_network
         self.dst_network = dst_network
+        self.native_balance = native_balance  # Balance of the preceding check
 
     def handle(self, thread) -> None:
         logger.info(f"{self.src_network.name}. Manual refuel chosen. Waiting for the native token deposit")
-        time.sleep(SleepTimings.BALANCE_RECHECK_TIME)
+
+        native_balances = {self.src_network.name: self.native_balance} if self.native_balance is not None else None
+        if wait_for_deposit(thread.account.address, {self.src_network: []}, SleepTimings.DEPOSIT_WAIT_TIMEOUT,
+                            native=True, native_balances=native_balances):
+            logger.info(f"{self.src_network.name}. Native token deposit received")
         thread.set_state(CheckNativeTokenBalanceForGasState(self.src_network, self.dst_network))
 
 
 # State for waiting before the exchange withdraw to make an account unique
 class SleepBeforeExchangeRefuelState(State):
-    def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork) -> None:
+    def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork,
+                 wake_up_time: Optional[float] = None) -> None:
         self.src_network = src_network
         self.dst_network = dst_network
 
+        if wake_up_time is None:
+            sleep_time = random.randint(SleepTimings.BEFORE_WITHDRAW_RANGE[0], SleepTimings.BEFORE_WITHDRAW_RANGE[1])
+            wake_up_time = time.time() + sleep_time
+        self.wake_up_time = wake_up_time
+
     def handle(self, thread) -> None:
-        sleep_time = random.randint(SleepTimings.BEFORE_WITHDRAW_RANGE[0], SleepTimings.BEFORE_WITHDRAW_RANGE[1])
+        sleep_time = max(0, int(self.wake_up_time - time.time()))
 
-        withdraw_dt = datetime.datetime.fromtimestamp(time.time() + sleep_time)
+        withdraw_dt = datetime.datetime.fromtimestamp(self.wake_up_time)
         logger.info(f"Sleeping {sleep_time} seconds before withdraw from exchange. Withdraw time: {withdraw_dt}")
-        time.sleep(sleep_time)
+        if not thread.sleep(sleep_time):
+            return
 
         thread.set_state(RefuelWithExchangeState(self.src_network, self.dst_network))
 
 
 # State for refueling native token from exchange to cover gas fees
 class RefuelWithExchangeState(State):
+    retry_policy = RPC_RETRY_POLICY
+
     def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork) -> None:
         self.src_network = src_network
         self.dst_network = dst_network
 
     def refuel(self, thread, amount: float) -> None:
-        factory = ExchangeFactory()
-
-        if thread.refuel_mode == RefuelMode.OKEX:
-            exchange = factory.create("okex")
+        if thread.refuel_mode == RefuelMode.AUTO:
+            exchange = RefuelRouter(["binance", "okex"])
+        elif thread.refuel_mode == RefuelMode.OKEX:
+            exchange = ExchangeFactory.create("okex")
         else:
-            exchange = factory.create("binance")
+            exchange = ExchangeFactory.create("binance")
 
         symbol = self.src_network.native_token
 
@@ -209,6 +253,8 @@ class RefuelWithExchangeState(State):
 
 # State for checking the native token balance
 class CheckNativeTokenBalanceForGasState(State):
+    retry_policy = RPC_RETRY_POLICY
+
     def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork) -> None:
         self.src_network = src_network
         self.dst_network = dst_network
@@ -216,54 +262,140 @@ class CheckNativeTokenBalanceForGasState(State):
     def handle(self, thread) -> None:
         logger.info("Checking native token balance")
 
+        balance = self.src_network.get_balance(thread.account.address)
         if BTCbUtils.is_enough_native_balance_for_bridge_fee(self.src_network, self.dst_network,
-                                                             thread.account.address):
+                                                             thread.account.address, balance):
             logger.info("Enough native token amount on source chain. Moving to the bridge")
             thread.set_state(SleepBeforeBridgeState(self.src_network, self.dst_network))
         else:
             logger.info("Not enough native token amount on source chain to cover the fees")
-            thread.set_state(RefuelDecisionState(self.src_network, self.dst_network))
+            thread.set_state(RefuelDecisionState(self.src_network, self.dst_network, balance))
 
 
 # State for waiting before every bridge to make an account unique
 class SleepBeforeBridgeState(State):
-    def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork) -> None:
+    def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork,
+                 wake_up_time: Optional[float] = None) -> None:
         self.src_network = src_network
         self.dst_network = dst_network
 
+        if wake_up_time is None:
+            sleep_time = random.randint(SleepTimings.BEFORE_BRIDGE_RANGE[0], SleepTimings.BEFORE_BRIDGE_RANGE[1])
+            wake_up_time = time.time() + sleep_time
+        self.wake_up_time = wake_up_time
+
     def handle(self, thread) -> None:
-        sleep_time = random.randint(SleepTimings.BEFORE_BRIDGE_RANGE[0], SleepTimings.BEFORE_BRIDGE_RANGE[1])
+        sleep_time = max(0, int(self.wake_up_time - time.time()))
 
-        next_swap_dt = datetime.datetime.fromtimestamp(time.time() + sleep_time)
+        next_swap_dt = datetime.datetime.fromtimestamp(self.wake_up_time)
         logger.info(f"Sleeping {sleep_time} seconds before bridge. Next bridge time: {next_swap_dt}")
-        time.sleep(sleep_time)
+        if not thread.sleep(max(0, self.wake_up_time - SleepTimings.BRIDGE_PREFETCH_LEAD - time.time())):
+            return
+
+        self.prefetch(thread)
+        if not thread.sleep(max(0, self.wake_up_time - time.time())):
+            return
 
         thread.set_state(BTCBridgeState(self.src_network, self.dst_network))
 
+    def prefetch(self, thread) -> None:
+        """ Method that reads the bridge inputs and builds the bridge transaction before the wake up time """
+
+        try:
+            amount = BTCbUtils.get_btcb_balance(self.src_network, thread.account.address)
+            prepared = BTCbBridgeHelper(thread.account, self.src_network, self.dst_network, amount).prepare()
+        except (BaseError, requests.exceptions.RequestException, ValueError) as ex:
+            logger.warning(f"Unable to prepare the bridge in advance: {ex}")
+            return
+
+        if prepared:
+            thread.set_prepared_bridge((self.src_network.name, self.dst_network.name), prepared)
+
 
 # State for swapping tokens
 class BTCBridgeState(State):
+    retry_policy = RPC_RETRY_POLICY
+    sends_bridge = True
+
     def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork) -> None:
         self.src_network = src_network
         self.dst_network = dst_network
 
     def handle(self, thread) -> None:
-        amount = BTCbUtils.get_btcb_balance(self.src_network, thread.account.address)
+        thread.wait_for_bridge_slot()
+
+        btcb_address = BTCbUtils.get_btcb_contract_address(self.src_network)
+        prepared = thread.pop_prepared_bridge((self.src_network.name, self.dst_network.name))
+        if prepared:
+            amount = prepared.amount
+        else:
+            # The amount is always read from the chain
+            amount = BTCbUtils.get_btcb_balance(self.src_network, thread.account.address)
+        thread.balance_ledger.set(self.src_network.name, btcb_address, amount)
 
         logger.info(f"Bridging {amount / 10 ** BTCbConstants.BTCB_DECIMALS} BTC.b through BTC bridge. "
                     f"{self.src_network.name} -> {self.dst_network.name}")
 
+        # BTC.b has the same decimals on all chains, so the whole amount is delivered
+        arrival_tracker = ArrivalTracker.get_default()
+        arrival_tracker.track(thread.account.address, self.src_network, self.dst_network,
+                              BTCbUtils.get_btcb_contract_address(self.dst_network), amount)
+
         bh = BTCbBridgeHelper(thread.account, self.src_network, self.dst_network, amount)
-        bridge_result = bh.make_bridge()
+        bridge_result = bh.make_bridge(prepared)
 
         if bridge_result:
             logger.info(f"BTC bridge finished successfully")
             if thread.remaining_bridges:
                 thread.remaining_bridges -= 1
+            thread.balance_ledger.apply_bridge(self.src_network.name, btcb_address, amount)
         else:
             logger.info(f"BTC bridge finished with error")
+            thread.balance_ledger.invalidate(self.src_network.name, btcb_address)
+            thread.balance_ledger.invalidate(self.src_network.name, None)
 
         if thread.remaining_bridges:
             logger.info(f"Remaining bridges: {thread.remaining_bridges}/{thread.bridges_limit}")
 
+        if bridge_result and thread.remaining_bridges != 0:
+            thread.set_state(WaitForBTCbArrivalState(self.src_network, self.dst_network))
+        else:
+            arrival_tracker.cancel(thread.account.address)
+            thread.set_state(CheckBTCbBalanceState())
+
+
+# State for waiting until the bridged BTC.b lands on the destination chain
+class WaitForBTCbArrivalState(State):
+    waits_for_arrival = True
+
+    def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork) -> None:
+        self.src_network = src_network
+        self.dst_network = dst_network
+
+    def handle(self, thread) -> None:
+        btcb_address = BTCbUtils.get_btcb_contract_address(self.dst_network)
+
+        # The arrival stays tracked while it is awaited, so a reset of the account cancels it
+        arrival = ArrivalTracker.get_default().get(thread.account.address)
+        if arrival is None:
+            # Restored after restart, the transfer isn't tracked anymore
+            thread.balance_ledger.invalidate(self.dst_network.name, btcb_address)
+            thread.set_state(CheckBTCbBalanceState())
+            return
+
+        logger.info(f"Waiting for BTC.b arrival on {self.dst_network.name}")
+
+        arrival_timeout = ArrivalTracker.get_default().get_timeout(arrival, SleepTimings.ARRIVAL_TIMEOUT)
+        timeout = max(0.0, arrival.started_at + arrival_timeout - time.time())
+        try:
+            deposit = arrival.future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            arrival.future.cancel()
+            logger.warning(f"BTC.b hasn't arrived on {self.dst_network.name} in "
+                           f"{int(arrival_timeout)} seconds. Checking balances")
+            thread.balance_ledger.invalidate(self.dst_network.name, btcb_address)
+        else:
+            thread.balance_ledger.credit(deposit.network, deposit.token, deposit.amount)
+
+        ArrivalTracker.get_default().pop(thread.account.address)
         thread.set_state(CheckBTCbBalanceState())
@@ -0,0 +1,200 @@
+import inspect
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass, astuple, fields
+from typing import Dict, List, Optional
+
+from config import BridgerMode, CheckpointSettings, SUPPORTED_NETWORKS_STARGATE, SUPPORTED_NETWORKS_BTCB
+from logic import stargate_states, btcb_states
+from logic.state import State
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StateCheckpoint:
+    address: str
+    bridger_mode: str
+    state: str
+    src_network: Optional[str] = None
+    dst_network: Optional[str] = None
+    src_stablecoin: Optional[str] = None
+    dst_stablecoin: Optional[str] = None
+    wake_up_time: Optional[float] = None
+    remaining_bridges: Optional[int] = None
+    updated_at: float = 0
+    balances: Optional[str] = None  # JSON of the account balance ledger
+
+
+class StateSerializer:
+    """ Converts states to checkpoints and back. A state can be restored if all its constructor
+    arguments are checkpoint fields (networks and stablecoins are stored by name) """
+
+    STATE_MODULES = {
+        BridgerMode.STARGATE: stargate_states,
+        BridgerMode.BTCB: btcb_states,
+    }
+
+    NETWORKS = {
+        BridgerMode.STARGATE: SUPPORTED_NETWORKS_STARGATE,
+        BridgerMode.BTCB: SUPPORTED_NETWORKS_BTCB,
+    }
+
+    @staticmethod
+    def to_checkpoint(state: State, address: str, bridger_mode: BridgerMode, remaining_bridges: Optional[int],
+                      balances: Optional[str] = None) -> Optional[StateCheckpoint]:
+        module = StateSerializer.STATE_MODULES.get(bridger_mode)
+        if module is None or getattr(module, type(state).__name__, None) is not type(state):
+            return None
+
+        src_network = getattr(state, 'src_network', None)
+        dst_network = getattr(state, 'dst_network', None)
+        src_stablecoin = getattr(state, 'src_stablecoin', None)
+        dst_stablecoin = getattr(state, 'dst_stablecoin', None)
+
+        return StateCheckpoint(address, bridger_mode.value, type(state).__name__,
+                               src_network.name if src_network else None,
+                               dst_network.name if dst_network else None,
+                               src_stablecoin.symbol if src_stablecoin else None,
+                               dst_stablecoin.symbol if dst_stablecoin else None,
+                               getattr(state, 'wake_up_time', None),
+                               remaining_bridges, time.time(), balances)
+
+    @staticmethod
+    def restore(checkpoint: StateCheckpoint) -> Optional[State]:
+        bridger_mode = BridgerMode(checkpoint.bridger_mode)
+        state_class = getattr(StateSerializer.STATE_MODULES[bridger_mode], checkpoint.state, None)
+        if state_class is None:
+            return None
+
+        networks = {network.name: network for network in StateSerializer.NETWORKS[bridger_mode]}
+        src_network = networks.get(checkpoint.src_network)
+        dst_network = networks.get(checkpoint.dst_network)
+
+        values = {
+            'src_network': src_network,
+            'dst_network': dst_network,
+            'src_stablecoin': src_network.supported_stablecoins.get(checkpoint.src_stablecoin)
+            if src_network else None,
+            'dst_stablecoin': dst_network.supported_stablecoins.get(checkpoint.dst_stablecoin)
+            if dst_network else None,
+            'wake_up_time': checkpoint.wake_up_time,
+        }
+
+        kwargs = {}
+        for name, parameter in inspect.signature(state_class.__init__).parameters.items():
+            if name == 'self':
+                continue
+            if name not in values:
+                if parameter.default is not inspect.Parameter.empty:
+                    # Run-time hint that isn't checkpointed
+                    continue
+                return None
+            if values[name] is None and parameter.default is inspect.Parameter.empty:
+                # Network or stablecoin was removed from the configuration
+                return None
+            kwargs[name] = values[name]
+
+        return state_class(**kwargs)
+
+
+class CheckpointStore:
+    """ SQLite (WAL mode) store of the latest account states. Writes are queued and committed in batches
+    by a background thread, so the state loop is never blocked by the disk """
+
+    BATCH_INTERVAL = 0.5  # seconds
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = threading.Event()
+
+        with closing(self._connect()) as connection, connection:
+            columns = ", ".join(field.name for field in fields(StateCheckpoint) if field.name not in
+                                ('address', 'bridger_mode'))
+            connection.execute(f"CREATE TABLE IF NOT EXISTS checkpoints (address TEXT, bridger_mode TEXT, "
+                               f"{columns}, PRIMARY KEY (address, bridger_mode))")
+
+            # Databases created by older versions lack the new columns
+            existing = {row[1] for row in connection.execute("PRAGMA table_info(checkpoints)")}
+            for field in fields(StateCheckpoint):
+                if field.name not in existing:
+                    connection.execute(f"ALTER TABLE checkpoints ADD COLUMN {field.name}")
+
+        self._writer = threading.Thread(target=self._write_loop, name="Checkpoints", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def from_settings() -> Optional['CheckpointStore']:
+        if not CheckpointSettings.DB_PATH:
+            return None
+
+        return CheckpointStore(CheckpointSettings.DB_PATH)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+
+        return connection
+
+    def save(self, checkpoint: StateCheckpoint) -> None:
+        self._queue.put(checkpoint)
+
+    def load(self, address: str, bridger_mode: BridgerMode) -> Optional[StateCheckpoint]:
+        with closing(self._connect()) as connection:
+            columns = ", ".join(field.name for field in fields(StateCheckpoint))
+            row = connection.execute(f"SELECT {columns} FROM checkpoints WHERE address = ? AND bridger_mode = ?",
+                                     (address, bridger_mode.value)).fetchone()
+
+        return StateCheckpoint(*row) if row else None
+
+    def _drain(self, timeout: float) -> List[StateCheckpoint]:
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _write_batch(self, connection: sqlite3.Connection, batch: List[StateCheckpoint]) -> None:
+        # Only the latest checkpoint of every account matters
+        latest: Dict[tuple, StateCheckpoint] = {}
+        for checkpoint in batch:
+            latest[(checkpoint.address, checkpoint.bridger_mode)] = checkpoint
+
+        columns = ", ".join(field.name for field in fields(StateCheckpoint))
+        placeholders = ", ".join("?" * len(fields(StateCheckpoint)))
+        with connection:
+            connection.executemany(f"INSERT OR REPLACE INTO checkpoints ({columns}) VALUES ({placeholders})",
+                                   [astuple(checkpoint) for checkpoint in latest.values()])
+
+    def _write_loop(self) -> None:
+        connection = self._connect()
+
+        try:
+            while not (self._closed.is_set() and self._queue.empty()):
+                batch = self._drain(self.BATCH_INTERVAL)
+                if not batch:
+                    continue
+
+                try:
+                    self._write_batch(connection, batch)
+                except sqlite3.Error as ex:
+                    logger.error(f"Unable to save {len(batch)} checkpoints: {ex}")
+        finally:
+            connection.close()
+
+    def close(self) -> None:
+        """ Method that flushes the queued checkpoints and stops the writer """
+
+        self._closed.set()
+        self._writer.join()
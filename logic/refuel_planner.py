@@ -0,0 +1,159 @@
+import csv
+import logging
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+from btcb.btcb import BTCbUtils
+from config import BridgerMode, SUPPORTED_NETWORKS_STARGATE, SUPPORTED_NETWORKS_BTCB
+from network.network import EVMNetwork
+from stargate.stargate import StargateUtils
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RefuelPlanItem:
+    account_id: int
+    address: str
+    network: str
+    token: str
+    amount: float
+    priority: int  # 0 - gas of the next bridge, 1 - gas of the later bridges
+
+
+class RefuelPlanner:
+    """ Planner of the gas refuels of all accounts. It reads the balances of the accounts with batched calls,
+    estimates the gas needed for the next bridges of every account from one fee quote per route and returns
+    the native token deficits as a withdrawal schedule """
+
+    RESERVE_MULTIPLIER = 1.1  # Same reserve as the exchange refuel states
+
+    def __init__(self, bridger_mode: BridgerMode, bridges_ahead: int) -> None:
+        self.bridger_mode = bridger_mode
+        self.bridges_ahead = bridges_ahead
+
+        if bridger_mode == BridgerMode.STARGATE:
+            self.networks: List[EVMNetwork] = SUPPORTED_NETWORKS_STARGATE
+        elif bridger_mode == BridgerMode.BTCB:
+            self.networks = SUPPORTED_NETWORKS_BTCB
+        else:
+            raise ValueError(f"Refuel planning isn't supported in the {bridger_mode.value} mode")
+
+    def quote_route_costs(self, address: str) -> np.ndarray:
+        """ Method that returns the cost (gas and LayerZero fee, in native tokens) of a bridge for every
+        (source, destination) network pair. The costs don't depend on the account, so they're quoted once """
+
+        costs = np.zeros((len(self.networks), len(self.networks)))
+
+        for i, src_network in enumerate(self.networks):
+            for j, dst_network in enumerate(self.networks):
+                if i == j:
+                    continue
+
+                if self.bridger_mode == BridgerMode.STARGATE:
+                    cost = StargateUtils.estimate_swap_gas_price(src_network, dst_network, address) + \
+                        StargateUtils.estimate_layerzero_swap_fee(src_network, dst_network, address)
+                else:
+                    cost = BTCbUtils.estimate_bridge_gas_price(src_network, dst_network, address) + \
+                        BTCbUtils.estimate_layerzero_bridge_fee(src_network, dst_network, address)
+
+                costs[i, j] = cost / 10 ** 18
+
+        return costs
+
+    def snapshot_balances(self, addresses: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """ Method that returns native token and bridged token balances as (accounts, networks) arrays """
+
+        native = np.zeros((len(addresses), len(self.networks)))
+        funds = np.zeros((len(addresses), len(self.networks)))
+
+        for idx, network in enumerate(self.networks):
+            native[:, idx] = np.array(network.get_balances(addresses), dtype=float) / 10 ** 18
+
+            if self.bridger_mode == BridgerMode.STARGATE:
+                for stablecoin in network.supported_stablecoins.values():
+                    balances = network.get_balances(addresses, stablecoin.contract_address)
+                    funds[:, idx] += np.array(balances, dtype=float) / 10 ** stablecoin.decimals
+            else:
+                balances = network.get_balances(addresses, BTCbUtils.get_btcb_contract_address(network))
+                funds[:, idx] = np.array(balances, dtype=float)
+
+        return native, funds
+
+    def get_expected_bridges(self, funds: np.ndarray) -> np.ndarray:
+        """ Method that returns the expected number of bridges from every network among the next ones.
+        The first bridge starts in the network holding the funds, every next one in a random other network """
+
+        network_count = len(self.networks)
+        if network_count < 2:
+            # No other network to bridge to
+            return np.zeros_like(funds)
+
+        has_funds = funds.max(axis=1) > 0
+
+        # Holder network of every account as a one-hot row
+        sources = np.zeros_like(funds)
+        sources[np.arange(len(funds)), funds.argmax(axis=1)] = 1
+        sources[~has_funds] = 0
+
+        transition = (np.ones((network_count, network_count)) - np.eye(network_count)) / (network_count - 1)
+
+        expected = np.zeros_like(funds)
+        for _ in range(self.bridges_ahead):
+            expected += sources
+            sources = sources @ transition
+
+        return expected
+
+    def plan(self, accounts: List[Tuple[int, str]]) -> List[RefuelPlanItem]:
+        """ Method that returns the refuels that cover the gas of the next bridges of the (account_id, address)
+        accounts. Refuels of the next bridges go first """
+
+        if not accounts:
+            return []
+
+        if len(self.networks) < 2:
+            logger.warning(f"{len(self.networks)} supported networks. There are no bridges to plan refuels for")
+            return []
+
+        addresses = [address for _, address in accounts]
+        route_costs = self.quote_route_costs(addresses[0])
+        native, funds = self.snapshot_balances(addresses)
+
+        # The most expensive destination is taken, as the destination is random
+        bridge_costs = route_costs.max(axis=1)
+        expected_bridges = self.get_expected_bridges(funds)
+
+        need = expected_bridges * bridge_costs * self.RESERVE_MULTIPLIER
+        deficits = np.maximum(need - native, 0)
+
+        next_bridge = np.zeros_like(funds, dtype=bool)
+        next_bridge[np.arange(len(funds)), funds.argmax(axis=1)] = funds.max(axis=1) > 0
+
+        items = []
+        for account_idx, network_idx in zip(*np.nonzero(deficits)):
+            account_id, address = accounts[account_idx]
+            network = self.networks[network_idx]
+            items.append(RefuelPlanItem(account_id, address, network.name, network.native_token,
+                                        round(float(deficits[account_idx, network_idx]), 6),
+                                        0 if next_bridge[account_idx, network_idx] else 1))
+
+        items.sort(key=lambda item: item.priority)
+
+        for network_idx, network in enumerate(self.networks):
+            column = deficits[:, network_idx]
+            logger.info(f"{network.name}. {np.count_nonzero(column)} refuels. "
+                        f"Total: {round(float(column.sum()), 6)} {network.native_token}")
+
+        return items
+
+    @staticmethod
+    def to_csv(items: List[RefuelPlanItem], filename: str) -> None:
+        with open(filename, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['account_id', 'address', 'network', 'token', 'amount', 'priority'])
+            for item in items:
+                writer.writerow([item.account_id, item.address, item.network, item.token, item.amount,
+                                 item.priority])
@@ -1,3 +1,4 @@
+import concurrent.futures
 import logging
 import datetime
 import random
@@ -5,17 +6,21 @@ import time
 import os
 from dataclasses import dataclass
 from dotenv import load_dotenv
-from typing import List
+from typing import Dict, List, Optional
 
-from base.errors import ConfigurationError, StablecoinNotSupportedByChain, NotWhitelistedAddress
+import requests
+
+from base.errors import BaseError, ConfigurationError, StablecoinNotSupportedByChain, NotWhitelistedAddress
 from config import SUPPORTED_NETWORKS_STARGATE, SleepTimings, \
     RefuelMode
-from logic.state import State
+from logic.state import State, RPC_RETRY_POLICY
 from network import EVMNetwork
 from network.polygon.polygon import Polygon
 from utility import Stablecoin
 from network.balance_helper import BalanceHelper
-from exchange import ExchangeFactory
+from network.deposit_watcher import wait_for_deposit
+from network.arrival_tracker import ArrivalTracker
+from exchange import ExchangeFactory, RefuelRouter
 from stargate import StargateBridgeHelper, StargateUtils
 
 logger = logging.getLogger(__name__)
@@ -24,26 +29,42 @@ load_dotenv()
 
 # State for waiting before start to randomize start time
 class SleepBeforeStartStargateBridgerState(State):
-    def __init__(self) -> None:
-        pass
+    def __init__(self, wake_up_time: Optional[float] = None) -> None:
+        if wake_up_time is None:
+            sleep_time = random.randint(SleepTimings.AFTER_START_RANGE[0], SleepTimings.AFTER_START_RANGE[1])
+            wake_up_time = time.time() + sleep_time
+        self.wake_up_time = wake_up_time
 
     def handle(self, thread) -> None:
-        sleep_time = random.randint(SleepTimings.AFTER_START_RANGE[0], SleepTimings.AFTER_START_RANGE[1])
+        sleep_time = max(0, int(self.wake_up_time - time.time()))
 
         logger.info(f"Sleeping {sleep_time} seconds before start")
-        time.sleep(sleep_time)
+        if not thread.sleep(sleep_time):
+            return
 
         thread.set_state(CheckStablecoinBalanceState())
 
 
 # State for waiting for the stablecoin deposit
 class WaitForStablecoinDepositState(State):
-    def __init__(self) -> None:
-        pass
+    def __init__(self, from_blocks: Optional[Dict[str, int]] = None) -> None:
+        self.from_blocks = from_blocks  # Blocks of the preceding balance check, by network name
 
     def handle(self, thread) -> None:
         logger.info("Waiting for stablecoin deposit")
-        time.sleep(SleepTimings.BALANCE_RECHECK_TIME)
+
+        watched = {network: [stablecoin.contract_address for stablecoin in network.supported_stablecoins.values()]
+                   for network in SUPPORTED_NETWORKS_STARGATE}
+        deposits = wait_for_deposit(thread.account.address, watched, SleepTimings.DEPOSIT_WAIT_TIMEOUT,
+                                    from_blocks=self.from_blocks)
+
+        for deposit in deposits:
+            logger.info(f"{deposit.network}. Stablecoin deposit received")
+            thread.balance_ledger.credit(deposit.network, deposit.token, deposit.amount)
+
+        if not deposits:
+            # Full recheck of the balances
+            thread.balance_ledger.clear()
 
         thread.set_state(CheckStablecoinBalanceState())
 
@@ -57,6 +78,8 @@ class NetworkWithStablecoinBalance:
 
 # State for checking the stablecoin balance
 class CheckStablecoinBalanceState(State):
+    retry_policy = RPC_RETRY_POLICY
+
     def __init__(self) -> None:
         pass
 
@@ -80,7 +103,7 @@ class CheckStablecoinBalanceState(State):
 
         for network in SUPPORTED_NETWORKS_STARGATE:
             for stablecoin in network.supported_stablecoins.values():
-                if self.is_enough_balance(BalanceHelper(network, thread.account.address),
+                if self.is_enough_balance(BalanceHelper(network, thread.account.address, thread.balance_ledger),
                                           stablecoin):
                     result.append(NetworkWithStablecoinBalance(network, stablecoin))
 
@@ -89,10 +112,13 @@ class CheckStablecoinBalanceState(State):
     def handle(self, thread) -> None:
         logger.info("Checking stablecoin balance")
 
+        # Deposits made after the check are looked for from these blocks
+        from_blocks = {network.name: network.get_cached_block_number() for network in SUPPORTED_NETWORKS_STARGATE}
+
         networks = self.find_networks_with_balance(thread)
         if len(networks) == 0:
             logger.info("Not enough stablecoin balance. Refill one of the supported networks")
-            thread.set_state(WaitForStablecoinDepositState())
+            thread.set_state(WaitForStablecoinDepositState(from_blocks))
         elif len(networks) == 1:
             logger.info(f"{networks[0].network.name} network meet the minimum stablecoin balance requirements")
             thread.set_state(ChooseDestinationNetworkState(networks[0].network, networks[0].stablecoin))
@@ -151,37 +177,45 @@ class ChooseDestinationStablecoinState(State):
 # State for deciding whether gas will be refueled automatically or manually
 class RefuelDecisionState(State):
     def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork,
-                 src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin) -> None:
+                 src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin,
+                 native_balance: Optional[int] = None) -> None:
         self.src_network = src_network
         self.dst_network = dst_network
         self.src_stablecoin = src_stablecoin
         self.dst_stablecoin = dst_stablecoin
+        self.native_balance = native_balance  # Balance of the preceding check
 
     def handle(self, thread) -> None:
         logger.info("Checking possible refuel options")
 
         # TODO: Add auto refuel with Bungee/WooFi
 
-        if thread.refuel_mode == RefuelMode.OKEX or thread.refuel_mode == RefuelMode.BINANCE:
+        if thread.refuel_mode in [RefuelMode.OKEX, RefuelMode.BINANCE, RefuelMode.AUTO]:
             thread.set_state(SleepBeforeExchangeRefuelState(self.src_network, self.dst_network,
                                                             self.src_stablecoin, self.dst_stablecoin))
         else:
             thread.set_state(WaitForManualRefuelState(self.src_network, self.dst_network,
-                                                      self.src_stablecoin, self.dst_stablecoin))
+                                                      self.src_stablecoin, self.dst_stablecoin, self.native_balance))
 
 
 # State for waiting for a manual native token deposit (in case the auto-refuel failed or disabled)
 class WaitForManualRefuelState(State):
     def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork,
-                 src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin) -> None:
+                 src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin,
+                 native_balance: Optional[int] = None) -> None:
         self.src_network = src_network
         self.dst_network = dst_network
         self.src_stablecoin = src_stablecoin
         self.dst_stablecoin = dst_stablecoin
+        self.native_balance = native_balance  # Balance of the preceding check
 
     def handle(self, thread) -> None:
         logger.info(f"{self.src_network.name}. Manual refuel chosen. Waiting for the native token deposit")
-        time.sleep(SleepTimings.BALANCE_RECHECK_TIME)
+
+        native_balances = {self.src_network.name: self.native_balance} if self.native_balance is not None else None
+        if wait_for_deposit(thread.account.address, {self.src_network: []}, SleepTimings.DEPOSIT_WAIT_TIMEOUT,
+                            native=True, native_balances=native_balances):
+            logger.info(f"{self.src_network.name}. Native token deposit received")
         thread.set_state(CheckNativeTokenBalanceForGasState(self.src_network, self.dst_network,
                                                             self.src_stablecoin, self.dst_stablecoin))
 
@@ -189,18 +223,25 @@ class WaitForManualRefuelState(State):
 # State for waiting before the exchange withdraw to make an account unique
 class SleepBeforeExchangeRefuelState(State):
     def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork,
-                 src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin) -> None:
+                 src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin,
+                 wake_up_time: Optional[float] = None) -> None:
         self.src_network = src_network
         self.dst_network = dst_network
         self.src_stablecoin = src_stablecoin
         self.dst_stablecoin = dst_stablecoin
 
+        if wake_up_time is None:
+            sleep_time = random.randint(SleepTimings.BEFORE_WITHDRAW_RANGE[0], SleepTimings.BEFORE_WITHDRAW_RANGE[1])
+            wake_up_time = time.time() + sleep_time
+        self.wake_up_time = wake_up_time
+
     def handle(self, thread) -> None:
-        sleep_time = random.randint(SleepTimings.BEFORE_WITHDRAW_RANGE[0], SleepTimings.BEFORE_WITHDRAW_RANGE[1])
+        sleep_time = max(0, int(self.wake_up_time - time.time()))
 
-        withdraw_dt = datetime.datetime.fromtimestamp(time.time() + sleep_time)
+        withdraw_dt = datetime.datetime.fromtimestamp(self.wake_up_time)
         logger.info(f"Sleeping {sleep_time} seconds before withdraw from exchange. Withdraw time: {withdraw_dt}")
-        time.sleep(sleep_time)
+        if not thread.sleep(sleep_time):
+            return
 
         thread.set_state(RefuelWithExchangeState(self.src_network, self.dst_network,
                                                  self.src_stablecoin, self.dst_stablecoin))
@@ -208,6 +249,8 @@ class SleepBeforeExchangeRefuelState(State):
 
 # State for refueling native token from exchange to cover gas fees
 class RefuelWithExchangeState(State):
+    retry_policy = RPC_RETRY_POLICY
+
     def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork,
                  src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin) -> None:
         self.src_network = src_network
@@ -216,12 +259,12 @@ class RefuelWithExchangeState(State):
         self.dst_stablecoin = dst_stablecoin
 
     def refuel(self, thread, amount: float) -> None:
-        factory = ExchangeFactory()
-
-        if thread.refuel_mode == RefuelMode.OKEX:
-            exchange = factory.create("okex")
+        if thread.refuel_mode == RefuelMode.AUTO:
+            exchange = RefuelRouter(["binance", "okex"])
+        elif thread.refuel_mode == RefuelMode.OKEX:
+            exchange = ExchangeFactory.create("okex")
         else:
-            exchange = factory.create("binance")
+            exchange = ExchangeFactory.create("binance")
 
         symbol = self.src_network.native_token
 
@@ -274,6 +317,8 @@ class RefuelWithBungeeState(State):
 
 # State for checking the native token balance
 class CheckNativeTokenBalanceForGasState(State):
+    retry_policy = RPC_RETRY_POLICY
+
     def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork,
                  src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin) -> None:
         self.src_network = src_network
@@ -284,39 +329,78 @@ class CheckNativeTokenBalanceForGasState(State):
     def handle(self, thread) -> None:
         logger.info("Checking native token balance")
 
+        balance = self.src_network.get_balance(thread.account.address)
         if StargateUtils.is_enough_native_balance_for_swap_fee(self.src_network, self.dst_network,
-                                                               thread.account.address):
+                                                               thread.account.address, balance):
             logger.info("Enough native token amount on source chain. Moving to the swap")
             thread.set_state(SleepBeforeBridgeState(self.src_network, self.dst_network,
                                                     self.src_stablecoin, self.dst_stablecoin))
         else:
             logger.info("Not enough native token amount on source chain to cover the fees")
             thread.set_state(RefuelDecisionState(self.src_network, self.dst_network,
-                                                 self.src_stablecoin, self.dst_stablecoin))
+                                                 self.src_stablecoin, self.dst_stablecoin, balance))
+
+
+def get_stargate_route(src_network: EVMNetwork, dst_network: EVMNetwork,
+                       src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin) -> tuple:
+    return src_network.name, dst_network.name, src_stablecoin.symbol, dst_stablecoin.symbol
 
 
 # State for waiting before every bridge to make an account unique
 class SleepBeforeBridgeState(State):
     def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork,
-                 src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin) -> None:
+                 src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin,
+                 wake_up_time: Optional[float] = None) -> None:
         self.src_network = src_network
         self.dst_network = dst_network
         self.src_stablecoin = src_stablecoin
         self.dst_stablecoin = dst_stablecoin
 
+        if wake_up_time is None:
+            sleep_time = random.randint(SleepTimings.BEFORE_BRIDGE_RANGE[0], SleepTimings.BEFORE_BRIDGE_RANGE[1])
+            wake_up_time = time.time() + sleep_time
+        self.wake_up_time = wake_up_time
+
     def handle(self, thread) -> None:
-        sleep_time = random.randint(SleepTimings.BEFORE_BRIDGE_RANGE[0], SleepTimings.BEFORE_BRIDGE_RANGE[1])
+        sleep_time = max(0, int(self.wake_up_time - time.time()))
 
-        next_swap_dt = datetime.datetime.fromtimestamp(time.time() + sleep_time)
+        next_swap_dt = datetime.datetime.fromtimestamp(self.wake_up_time)
         logger.info(f"Sleeping {sleep_time} seconds before bridge. Next bridge time: {next_swap_dt}")
-        time.sleep(sleep_time)
+        if not thread.sleep(max(0, self.wake_up_time - SleepTimings.BRIDGE_PREFETCH_LEAD - time.time())):
+            return
+
+        self.prefetch(thread)
+        if not thread.sleep(max(0, self.wake_up_time - time.time())):
+            return
 
         thread.set_state(StargateSwapState(self.src_network, self.dst_network,
                                            self.src_stablecoin, self.dst_stablecoin))
 
+    def prefetch(self, thread) -> None:
+        """ Method that reads the bridge inputs and builds the swap transaction before the wake up time """
+
+        try:
+            balance_helper = BalanceHelper(self.src_network, thread.account.address)
+            amount = balance_helper.get_stablecoin_balance(self.src_stablecoin)
+
+            bridge_helper = StargateBridgeHelper(thread.account, self.src_network, self.dst_network,
+                                                 self.src_stablecoin, self.dst_stablecoin, amount,
+                                                 float(os.getenv('STARGATE_SLIPPAGE', 0.01)))
+            prepared = bridge_helper.prepare()
+        except (BaseError, requests.exceptions.RequestException, ValueError) as ex:
+            logger.warning(f"Unable to prepare the swap in advance: {ex}")
+            return
+
+        if prepared:
+            thread.set_prepared_bridge(get_stargate_route(self.src_network, self.dst_network, self.src_stablecoin,
+                                                          self.dst_stablecoin), prepared)
+
 
 # State for swapping tokens
 class StargateSwapState(State):
+    retry_policy = RPC_RETRY_POLICY
+    sends_bridge = True
+
     def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork,
                  src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin) -> None:
         self.src_network = src_network
@@ -325,26 +409,84 @@ class StargateSwapState(State):
         self.dst_stablecoin = dst_stablecoin
 
     def handle(self, thread) -> None:
-        balance_helper = BalanceHelper(self.src_network, thread.account.address)
-        amount = balance_helper.get_stablecoin_balance(self.src_stablecoin)
+        thread.wait_for_bridge_slot()
+
+        prepared = thread.pop_prepared_bridge(get_stargate_route(self.src_network, self.dst_network,
+                                                                 self.src_stablecoin, self.dst_stablecoin))
+        if prepared:
+            amount = prepared.amount
+        else:
+            # The amount is always read from the chain
+            balance_helper = BalanceHelper(self.src_network, thread.account.address)
+            amount = balance_helper.get_stablecoin_balance(self.src_stablecoin)
+        thread.balance_ledger.set(self.src_network.name, self.src_stablecoin.contract_address, amount)
 
         logger.info(f"Swapping {amount / 10 ** self.src_stablecoin.decimals} tokens through Stargate bridge. "
                     f"{self.src_stablecoin.symbol}({self.src_network.name}) -> "
                     f"{self.dst_stablecoin.symbol}({self.dst_network.name})")
 
+        slippage = float(os.getenv('STARGATE_SLIPPAGE', 0.01))
+        arrival_tracker = ArrivalTracker.get_default()
+        min_arrival_amount = int(amount * 10 ** self.dst_stablecoin.decimals / 10 ** self.src_stablecoin.decimals
+                                 * (1 - slippage))
+        arrival_tracker.track(thread.account.address, self.src_network, self.dst_network,
+                              self.dst_stablecoin.contract_address, min_arrival_amount)
+
         bridge_helper = StargateBridgeHelper(thread.account, self.src_network, self.dst_network,
-                                             self.src_stablecoin, self.dst_stablecoin, amount,
-                                             float(os.getenv('STARGATE_SLIPPAGE', 0.01)))
-        bridge_result = bridge_helper.make_bridge()
+                                             self.src_stablecoin, self.dst_stablecoin, amount, slippage)
+        bridge_result = bridge_helper.make_bridge(prepared)
 
         if bridge_result:
             logger.info(f"Stargate bridge finished successfully")
             if thread.remaining_bridges:
                 thread.remaining_bridges -= 1
+            thread.balance_ledger.apply_bridge(self.src_network.name, self.src_stablecoin.contract_address, amount)
         else:
             logger.info(f"Stargate bridge finished with error")
+            thread.balance_ledger.invalidate(self.src_network.name, self.src_stablecoin.contract_address)
+            thread.balance_ledger.invalidate(self.src_network.name, None)
 
         if thread.remaining_bridges:
             logger.info(f"Remaining bridges: {thread.remaining_bridges}/{thread.bridges_limit}")
 
+        if bridge_result and thread.remaining_bridges != 0:
+            thread.set_state(WaitForStablecoinArrivalState(self.src_network, self.dst_network, self.dst_stablecoin))
+        else:
+            arrival_tracker.cancel(thread.account.address)
+            thread.set_state(CheckStablecoinBalanceState())
+
+
+# State for waiting until the bridged stablecoins land on the destination chain
+class WaitForStablecoinArrivalState(State):
+    waits_for_arrival = True
+
+    def __init__(self, src_network: EVMNetwork, dst_network: EVMNetwork, dst_stablecoin: Stablecoin) -> None:
+        self.src_network = src_network
+        self.dst_network = dst_network
+        self.dst_stablecoin = dst_stablecoin
+
+    def handle(self, thread) -> None:
+        # The arrival stays tracked while it is awaited, so a reset of the account cancels it
+        arrival = ArrivalTracker.get_default().get(thread.account.address)
+        if arrival is None:
+            # Restored after restart, the transfer isn't tracked anymore
+            thread.balance_ledger.invalidate(self.dst_network.name, self.dst_stablecoin.contract_address)
+            thread.set_state(CheckStablecoinBalanceState())
+            return
+
+        logger.info(f"Waiting for {self.dst_stablecoin.symbol} arrival on {self.dst_network.name}")
+
+        arrival_timeout = ArrivalTracker.get_default().get_timeout(arrival, SleepTimings.ARRIVAL_TIMEOUT)
+        timeout = max(0.0, arrival.started_at + arrival_timeout - time.time())
+        try:
+            deposit = arrival.future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            arrival.future.cancel()
+            logger.warning(f"{self.dst_stablecoin.symbol} hasn't arrived on {self.dst_network.name} in "
+                           f"{int(arrival_timeout)} seconds. Checking balances")
+            thread.balance_ledger.invalidate(self.dst_network.name, self.dst_stablecoin.contract_address)
+        else:
+            thread.balance_ledger.credit(deposit.network, deposit.token, deposit.amount)
+
+        ArrivalTracker.get_default().pop(thread.account.address)
         thread.set_state(CheckStablecoinBalanceState())
@@ -1,5 +1,42 @@
+import random
+from dataclasses import dataclass
+from typing import Optional, Tuple, Type
+
+import requests
+
+from config import RetrySettings
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """ Describes how a failed state is retried before the account is reset to the balance check """
+
+    retryable: Tuple[Type[BaseException], ...]
+    max_attempts: int = RetrySettings.MAX_ATTEMPTS
+    base_delay: float = RetrySettings.BASE_DELAY
+    max_delay: float = RetrySettings.MAX_DELAY
+
+    def is_retryable(self, ex: BaseException) -> bool:
+        return isinstance(ex, self.retryable)
+
+    def get_delay(self, attempt: int) -> float:
+        """ Exponential backoff with jitter. Half of the delay is randomized to spread the retries of
+        many accounts that failed at once """
+
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+# Transient RPC provider problems
+RPC_RETRY_POLICY = RetryPolicy((requests.exceptions.RequestException,))
+
+
 # State interface defining the behavior of different states
 class State:
+    retry_policy: Optional[RetryPolicy] = None  # None - the account is reset on any error
+    sends_bridge = False  # True - the state broadcasts a bridge, so it's retried only if nothing was sent
+    waits_for_arrival = False  # True - the state awaits the tracked arrival, a reset of the account cancels it
+
     def handle(self, thread):
         pass
 
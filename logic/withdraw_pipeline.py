@@ -0,0 +1,127 @@
+import logging
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, Tuple
+
+from base.errors import NotWhitelistedAddress
+from exchange.exchange import Exchange
+from utility import WalletHelper
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WithdrawResult:
+    account_id: int
+    address: str
+    amount: float
+    withdraw_id: Optional[str]
+    error: Optional[str]  # None - the withdrawal is finished
+
+    @property
+    def succeed(self) -> bool:
+        return self.error is None
+
+
+class WithdrawPipeline:
+    """ Withdrawal of funds to many accounts with up to `concurrency` withdrawals in flight. Addresses are resolved
+    by a separate thread while earlier withdrawals are pending, withdrawal starts are paced by the interval range
+    and exchange requests are throttled by the shared exchange client. Results are yielded as they finish """
+
+    _DONE = None
+
+    def __init__(self, exchange: Exchange, token: str, network: str, amount_range: Tuple[float, float],
+                 interval_range: Tuple[float, float], concurrency: int) -> None:
+        self.exchange = exchange
+        self.token = token
+        self.network = network
+        self.amount_range = amount_range
+        self.interval_range = interval_range  # seconds between withdrawal starts
+        self.concurrency = concurrency
+
+        self._wh = WalletHelper()
+        self._accounts: queue.Queue = queue.Queue(maxsize=concurrency * 2)
+        self._results: queue.Queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._next_start = 0.0
+        self._start_lock = threading.Lock()
+
+    def run(self, private_keys: Iterable[Tuple[int, str]]) -> Iterator[WithdrawResult]:
+        resolver = threading.Thread(target=self._resolve_addresses, args=(private_keys,), name="AddressResolver",
+                                    daemon=True)
+        resolver.start()
+
+        workers = [threading.Thread(target=self._worker_loop, name=f"Withdraw-{idx}", daemon=True)
+                   for idx in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+
+        finished_workers = 0
+        while finished_workers < len(workers):
+            result = self._results.get()
+            if result is self._DONE:
+                finished_workers += 1
+            else:
+                yield result
+
+    def stop(self) -> None:
+        """ Method that stops starting new withdrawals. Pending ones are still awaited """
+
+        self._stop_event.set()
+
+    def _resolve_addresses(self, private_keys: Iterable[Tuple[int, str]]) -> None:
+        try:
+            for account_id, private_key in private_keys:
+                if self._stop_event.is_set():
+                    break
+                self._accounts.put((account_id, self._wh.resolve_address(private_key)))
+        finally:
+            for _ in range(self.concurrency):
+                self._accounts.put(self._DONE)
+
+    def _worker_loop(self) -> None:
+        while True:
+            account = self._accounts.get()
+            if account is self._DONE:
+                self._results.put(self._DONE)
+                return
+
+            if self._stop_event.is_set():
+                continue
+
+            self._results.put(self._process(*account))
+
+    def _wait_for_start(self) -> None:
+        with self._start_lock:
+            start_time = max(time.time(), self._next_start)
+            self._next_start = start_time + random.uniform(*self.interval_range)
+
+        time.sleep(max(0.0, start_time - time.time()))
+
+    def _process(self, account_id: int, address: str) -> WithdrawResult:
+        amount = random.uniform(*self.amount_range)
+        decimals = random.randint(3, 6)  # May be improved
+        amount = round(amount, decimals)
+
+        self._wait_for_start()
+        if self._stop_event.is_set():
+            return WithdrawResult(account_id, address, amount, None, 'Stopped')
+
+        try:
+            withdraw_id = self.exchange.withdraw(self.token, amount, self.network, address)
+        except NotWhitelistedAddress as ex:
+            # The rest of the addresses can't be funded either
+            self.stop()
+            return WithdrawResult(account_id, address, amount, None, str(ex))
+        except Exception as ex:
+            return WithdrawResult(account_id, address, amount, None, str(ex))
+
+        try:
+            self.exchange.wait_for_withdraw_to_finish(withdraw_id)
+        except Exception as ex:
+            return WithdrawResult(account_id, address, amount, withdraw_id, str(ex))
+
+        return WithdrawResult(account_id, address, amount, withdraw_id, None)
@@ -3,15 +3,17 @@ import logging
 import random
 import sys
 import time
-from typing import Any
+from typing import Any, Tuple
 
 from base.errors import NotWhitelistedAddress
-from logic import AccountThread
-from config import ConfigurationHelper, DEFAULT_PRIVATE_KEYS_FILE_PATH, BridgerMode, RefuelMode
+from cluster import ProcessRunner, SharedResources, Coordinator, Worker, install_shared_resources
+from logic import AccountRunner, CheckpointStore, RefuelPlanner, WithdrawPipeline
+from config import ConfigurationHelper, DEFAULT_PRIVATE_KEYS_FILE_PATH, BridgerMode, RefuelMode, RateLimits, \
+    ClusterSettings, SUPPORTED_NETWORKS_STARGATE, SUPPORTED_NETWORKS_BTCB
 from logger import setup_logger
 from exchange import ExchangeFactory
 
-from utility import WalletHelper
+from utility import WalletHelper, KeyGenerator, KeyFileSource, KeySelection
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +31,9 @@ class LayerZeroBridger:
         self._create_generate_parser(subparsers)
         self._create_withdraw_parser(subparsers)
         self._create_run_bridger_parser(subparsers)
+        self._create_plan_refuel_parser(subparsers)
+        self._create_coordinate_parser(subparsers)
+        self._create_worker_parser(subparsers)
 
         args = parser.parse_args()
         if hasattr(args, "func"):
@@ -41,23 +46,26 @@ class LayerZeroBridger:
             logger.info("Number of keys must be a positive integer")
             sys.exit(1)
 
-        filename = args.filename if args.filename else ""
-        private_keys = []
+        if args.processes is not None and args.processes <= 0:
+            logger.info("Number of processes must be a positive integer")
+            sys.exit(1)
+
+        if args.chunk_size <= 0:
+            logger.info("Chunk size must be a positive integer")
+            sys.exit(1)
 
-        for _ in range(args.num_keys):
-            pk = self.wh.generate_private_key()
-            private_keys.append(pk)
+        filename = self.wh.get_keys_filename(args.filename if args.filename else "")
 
-        self.wh.to_txt(private_keys, filename)
+        generator = KeyGenerator(args.processes, args.chunk_size, args.addresses)
+        generator.generate_to_file(args.num_keys, filename)
 
     def withdraw_funds(self, args: argparse.Namespace) -> None:
         token = args.token.upper()
         network = args.network
 
-        private_keys = self.wh.load_private_keys(args.private_keys)
-        addresses = self.wh.resolve_addresses(private_keys)
+        private_keys = self._open_key_source(args)
 
-        if not addresses:
+        if not len(private_keys):
             logger.info('You should specify at least 1 address for the withdrawal')
             sys.exit(1)
 
@@ -67,8 +75,13 @@ class LayerZeroBridger:
             logger.info(f'{token} withdrawal on the {network} network is not available')
             sys.exit(1)
 
-        for idx, address in enumerate(addresses):
-            logger.info(f'Processing {idx}/{len(addresses)}')
+        if args.concurrency is not None:
+            self._withdraw_funds_concurrently(args, exchange, token, network, private_keys)
+            return
+
+        for idx, private_key in enumerate(private_keys):
+            address = self.wh.resolve_address(private_key)
+            logger.info(f'Processing {idx}/{len(private_keys)}')
 
             amount = random.uniform(args.min_amount, args.max_amount)
             decimals = random.randint(3, 6)  # May be improved
@@ -80,7 +93,7 @@ class LayerZeroBridger:
                 logger.info(str(ex))
                 sys.exit(1)
 
-            if idx == len(addresses) - 1:
+            if idx == len(private_keys) - 1:
                 logger.info('All withdrawals are successfully completed')
                 sys.exit(0)
 
@@ -88,6 +101,32 @@ class LayerZeroBridger:
             logger.info(f'Waiting {round(waiting_time, 1)} minutes before the next withdrawal')
             time.sleep(waiting_time * 60)  # Convert waiting time to seconds
 
+    @staticmethod
+    def _withdraw_funds_concurrently(args: argparse.Namespace, exchange: Any, token: str, network: str,
+                                     private_keys: KeyFileSource) -> None:
+        if args.concurrency <= 0:
+            logger.info("Concurrency must be a positive integer")
+            sys.exit(1)
+
+        pipeline = WithdrawPipeline(exchange, token, network, (args.min_amount, args.max_amount),
+                                    (args.min_time * 60, args.max_time * 60), args.concurrency)
+
+        failed = 0
+        for idx, result in enumerate(pipeline.run(private_keys.items())):
+            if result.succeed:
+                logger.info(f'{idx + 1}/{len(private_keys)}. Account {result.account_id} ({result.address}). '
+                            f'{result.amount} {token} withdrawn. Id: {result.withdraw_id}')
+            else:
+                failed += 1
+                logger.info(f'{idx + 1}/{len(private_keys)}. Account {result.account_id} ({result.address}). '
+                            f'{result.amount} {token} withdrawal failed: {result.error}')
+
+        if failed:
+            logger.info(f'{failed} withdrawals failed')
+            sys.exit(1)
+
+        logger.info('All withdrawals are successfully completed')
+
     def run_bridger(self, args: argparse.Namespace) -> None:
         config = ConfigurationHelper()
         config.check_configuration()
@@ -96,26 +135,129 @@ class LayerZeroBridger:
         refuel_mode = RefuelMode(args.refuel_mode)
         bridges_limit = args.limit
 
-        private_keys = self.wh.load_private_keys(args.private_keys)
+        if args.processes <= 0:
+            logger.info("Number of processes must be a positive integer")
+            sys.exit(1)
+
+        private_keys = self._open_key_source(args)
+
+        if not len(private_keys):
+            logger.info("Zero private keys was loaded")
+            sys.exit(1)
+
+        if args.processes > 1:
+            private_keys.close()
+            runner = ProcessRunner(args.processes, args.private_keys, private_keys.selection,
+                                   bridger_mode, refuel_mode, bridges_limit)
+            runner.run()
+            return
+
+        resources = SharedResources(RateLimits.RPC_REQUESTS_PER_SECOND, RateLimits.BRIDGES_PER_MINUTE)
+        bridge_limiter = install_shared_resources(resources,
+                                                  SUPPORTED_NETWORKS_STARGATE + SUPPORTED_NETWORKS_BTCB)
+
+        runner = AccountRunner(bridger_mode, refuel_mode, bridges_limit, bridge_limiter,
+                               CheckpointStore.from_settings())
+        runner.run(private_keys.items())
+
+    def plan_refuel(self, args: argparse.Namespace) -> None:
+        if args.bridges <= 0:
+            logger.info("Number of bridges must be a positive integer")
+            sys.exit(1)
+
+        private_keys = self._open_key_source(args)
 
-        if not private_keys:
+        if not len(private_keys):
             logger.info("Zero private keys was loaded")
             sys.exit(1)
 
-        accounts = []
+        accounts = [(account_id, self.wh.resolve_address(private_key))
+                    for account_id, private_key in private_keys.items()]
+
+        planner = RefuelPlanner(BridgerMode(args.bridger_mode), args.bridges)
+        items = planner.plan(accounts)
+        planner.to_csv(items, args.output)
 
-        for account_id, private_key in enumerate(private_keys):
-            accounts.append(AccountThread(account_id, private_key, bridger_mode, refuel_mode, bridges_limit))
-            accounts[account_id].start()
+        logger.info(f"{len(items)} refuels planned for {len(accounts)} accounts. Schedule saved to {args.output}")
+
+    def run_coordinator(self, args: argparse.Namespace) -> None:
+        config = ConfigurationHelper()
+        config.check_configuration()
 
-        for account in accounts:
-            account.join()
+        address = self._parse_address(args.listen)
+        private_keys = self._open_key_source(args)
+
+        if not len(private_keys):
+            logger.info("Zero private keys was loaded")
+            sys.exit(1)
+
+        coordinator = Coordinator(address, self._get_cluster_authkey(), private_keys, BridgerMode(args.bridger_mode),
+                                  RefuelMode(args.refuel_mode), args.limit)
+        coordinator.run()
+
+    def run_worker(self, args: argparse.Namespace) -> None:
+        config = ConfigurationHelper()
+        config.check_configuration()
+
+        if args.accounts <= 0:
+            logger.info("Number of accounts must be a positive integer")
+            sys.exit(1)
+
+        worker = Worker(self._parse_address(args.coordinator), self._get_cluster_authkey(), args.accounts)
+        worker.run()
+
+    @staticmethod
+    def _parse_address(address: str) -> Tuple[str, int]:
+        host, sep, port = address.rpartition(':')
+        if not sep or not port.isdigit():
+            logger.info(f"Incorrect address: {address}. Expected format is host:port")
+            sys.exit(1)
+
+        return host, int(port)
+
+    @staticmethod
+    def _get_cluster_authkey() -> bytes:
+        if not ClusterSettings.AUTHKEY:
+            logger.info("CLUSTER_AUTHKEY must be set to use the coordinator/worker mode")
+            sys.exit(1)
+
+        # The key protects the private keys leased by the coordinator
+        if ClusterSettings.AUTHKEY in ClusterSettings.PLACEHOLDER_AUTHKEYS or \
+                len(ClusterSettings.AUTHKEY) < ClusterSettings.MIN_AUTHKEY_LENGTH:
+            logger.info(f"CLUSTER_AUTHKEY must be a random secret of at least {ClusterSettings.MIN_AUTHKEY_LENGTH} "
+                        f"characters")
+            sys.exit(1)
+
+        return ClusterSettings.AUTHKEY.encode()
+
+    @staticmethod
+    def _open_key_source(args: argparse.Namespace) -> KeyFileSource:
+        try:
+            selection = KeySelection.parse(args.key_range, args.shard)
+        except ValueError as ex:
+            logger.info(str(ex))
+            sys.exit(1)
+
+        return KeyFileSource(args.private_keys, selection)
+
+    @staticmethod
+    def _add_key_selection_arguments(parser: Any) -> None:
+        parser.add_argument("--range", type=str, dest="key_range",
+                            help="Range of the key file lines to be used in start:end format (end is exclusive)")
+        parser.add_argument("--shard", type=str, dest="shard",
+                            help="Use only i-th of n equal parts of the selected keys. Format: i/n (0 <= i < n)")
 
     def _create_generate_parser(self, subparsers: Any) -> None:
         generate_parser = subparsers.add_parser("generate", help="Generate new private keys")
 
         generate_parser.add_argument("num_keys", type=int, help="Number of private keys to generate")
         generate_parser.add_argument("filename", nargs="?", help="Path to the file to save the private keys")
+        generate_parser.add_argument("--processes", type=int, dest="processes",
+                                     help="Number of worker processes (default: number of CPU cores)")
+        generate_parser.add_argument("--chunk_size", type=int, default=10_000, dest="chunk_size",
+                                     help="Number of keys generated and written at once")
+        generate_parser.add_argument("--addresses", action="store_true", dest="addresses",
+                                     help="Save account addresses to the <filename>_addresses file as well")
 
         generate_parser.set_defaults(func=self.generate_private_keys)
 
@@ -136,12 +278,15 @@ class LayerZeroBridger:
                                      help="Minimum waiting time between withdraws in minutes")
         withdraw_parser.add_argument("--max_time", type=float, default=0, dest="max_time",
                                      help="Maximum waiting time between withdraws in minutes")
+        withdraw_parser.add_argument("--concurrency", type=int, dest="concurrency",
+                                     help="Keep up to N withdrawals in flight and wait for each of them to finish")
 
         withdraw_parser.add_argument("--keys", type=str, default=DEFAULT_PRIVATE_KEYS_FILE_PATH,
                                      dest="private_keys",
                                      help="Path to the file containing private keys of the account addresses")
         withdraw_parser.add_argument("--exchange", choices=["binance", "okex"], default="binance", dest='exchange',
                                      help="Exchange name (binance, okex)")
+        self._add_key_selection_arguments(withdraw_parser)
 
         withdraw_parser.set_defaults(func=self.withdraw_funds)
 
@@ -151,12 +296,54 @@ class LayerZeroBridger:
                                 help="Running mode (stargate, btcb)")
         run_parser.add_argument("--keys", type=str, default=DEFAULT_PRIVATE_KEYS_FILE_PATH, dest="private_keys",
                                 help="Path to the file containing private keys")
-        run_parser.add_argument("--refuel", choices=["manual", "binance", "okex"], default="manual", dest='refuel_mode',
-                                help="Refuel mode (manual, binance, okex)")
+        run_parser.add_argument("--refuel", choices=["manual", "binance", "okex", "auto"], default="manual",
+                                dest='refuel_mode', help="Refuel mode (manual, binance, okex, auto)")
         run_parser.add_argument("--limit", type=int, help="Maximum number of bridges to be executed")
+        run_parser.add_argument("--processes", type=int, default=1, dest="processes",
+                                help="Number of worker processes the accounts are sharded between")
+        self._add_key_selection_arguments(run_parser)
 
         run_parser.set_defaults(func=self.run_bridger)
 
+    def _create_plan_refuel_parser(self, subparsers: Any) -> None:
+        plan_parser = subparsers.add_parser("plan-refuel", help="Plan the gas refuels of the next bridges")
+        plan_parser.add_argument("bridger_mode", choices=["stargate", "btcb"],
+                                 help="Running mode (stargate, btcb)")
+        plan_parser.add_argument("--keys", type=str, default=DEFAULT_PRIVATE_KEYS_FILE_PATH, dest="private_keys",
+                                 help="Path to the file containing private keys")
+        plan_parser.add_argument("--bridges", type=int, default=1, dest="bridges",
+                                 help="Number of the next bridges of every account the gas is planned for")
+        plan_parser.add_argument("--output", type=str, default="refuel_plan.csv", dest="output",
+                                 help="Path to the CSV file to save the withdrawal schedule")
+        self._add_key_selection_arguments(plan_parser)
+
+        plan_parser.set_defaults(func=self.plan_refuel)
+
+    def _create_coordinate_parser(self, subparsers: Any) -> None:
+        coordinate_parser = subparsers.add_parser("coordinate", help="Run the coordinator that leases accounts to "
+                                                                     "the worker nodes")
+        coordinate_parser.add_argument("bridger_mode", choices=["stargate", "btcb"],
+                                       help="Running mode (stargate, btcb)")
+        coordinate_parser.add_argument("--listen", type=str, default="127.0.0.1:5000", dest="listen",
+                                       help="Address to accept the worker connections on (host:port)")
+        coordinate_parser.add_argument("--keys", type=str, default=DEFAULT_PRIVATE_KEYS_FILE_PATH,
+                                       dest="private_keys", help="Path to the file containing private keys")
+        coordinate_parser.add_argument("--refuel", choices=["manual", "binance", "okex", "auto"], default="manual",
+                                       dest='refuel_mode', help="Refuel mode (manual, binance, okex, auto)")
+        coordinate_parser.add_argument("--limit", type=int, help="Maximum number of bridges to be executed")
+        self._add_key_selection_arguments(coordinate_parser)
+
+        coordinate_parser.set_defaults(func=self.run_coordinator)
+
+    def _create_worker_parser(self, subparsers: Any) -> None:
+        worker_parser = subparsers.add_parser("worker", help="Run the worker node that leases accounts "
+                                                             "from the coordinator")
+        worker_parser.add_argument("coordinator", help="Coordinator address (host:port)")
+        worker_parser.add_argument("--accounts", type=int, default=100, dest="accounts",
+                                   help="Maximum number of accounts running on this node at once")
+
+        worker_parser.set_defaults(func=self.run_worker)
+
 
 if __name__ == "__main__":
     app = LayerZeroBridger()
@@ -0,0 +1,106 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Optional
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+MAX_UINT256 = 2 ** 256 - 1
+
+
+class ApprovalPolicy:
+    """ Amount approved to a spender before the bridge: exact - the bridged amount, buffer - the amount multiplied
+    by APPROVAL_BUFFER_MULTIPLIER (next bridges reuse it), unlimited - maximum uint256 """
+
+    EXACT = 'exact'
+    BUFFER = 'buffer'
+    UNLIMITED = 'unlimited'
+
+    POLICY = os.getenv('APPROVAL_POLICY', EXACT)
+    BUFFER_MULTIPLIER = float(os.getenv('APPROVAL_BUFFER_MULTIPLIER', 5))
+
+    @staticmethod
+    def get_approve_amount(amount: int) -> int:
+        if ApprovalPolicy.POLICY == ApprovalPolicy.UNLIMITED:
+            return MAX_UINT256
+        if ApprovalPolicy.POLICY == ApprovalPolicy.BUFFER:
+            return min(int(amount * ApprovalPolicy.BUFFER_MULTIPLIER), MAX_UINT256)
+        if ApprovalPolicy.POLICY == ApprovalPolicy.EXACT:
+            return amount
+
+        raise ValueError(f"Unknown approval policy: {ApprovalPolicy.POLICY}")
+
+
+class AllowanceCache:
+    """ SQLite cache of the known ERC-20 allowances. Cached values are lower bounds: they're decremented
+    by every spend and dropped when a transaction that relied on them fails """
+
+    PATH = os.getenv('ALLOWANCE_CACHE_PATH', 'allowances.db')  # Empty path disables the cache
+
+    _default: Optional['AllowanceCache'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+        with closing(self._connect()) as connection, connection:
+            # Allowances don't fit into SQLite integers, so they're stored as text
+            connection.execute("CREATE TABLE IF NOT EXISTS allowances (network TEXT, token TEXT, owner TEXT, "
+                               "spender TEXT, allowance TEXT, PRIMARY KEY (network, token, owner, spender))")
+
+    @staticmethod
+    def get_default() -> Optional['AllowanceCache']:
+        """ Method that returns the process-wide cache configured by ALLOWANCE_CACHE_PATH """
+
+        if not AllowanceCache.PATH:
+            return None
+
+        with AllowanceCache._default_lock:
+            if AllowanceCache._default is None:
+                AllowanceCache._default = AllowanceCache(AllowanceCache.PATH)
+
+            return AllowanceCache._default
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+
+        return connection
+
+    @staticmethod
+    def _key(network: str, token: str, owner: str, spender: str) -> tuple:
+        return network, token.lower(), owner.lower(), spender.lower()
+
+    def get(self, network: str, token: str, owner: str, spender: str) -> Optional[int]:
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT allowance FROM allowances WHERE network = ? AND token = ? AND "
+                                     "owner = ? AND spender = ?", self._key(network, token, owner, spender)).fetchone()
+
+        return int(row[0]) if row else None
+
+    def set(self, network: str, token: str, owner: str, spender: str, allowance: int) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.execute("INSERT OR REPLACE INTO allowances VALUES (?, ?, ?, ?, ?)",
+                               (*self._key(network, token, owner, spender), str(allowance)))
+
+    def spend(self, network: str, token: str, owner: str, spender: str, amount: int) -> None:
+        with self._lock:
+            allowance = self.get(network, token, owner, spender)
+            if allowance is None:
+                return
+
+            if allowance < amount:
+                self.invalidate(network, token, owner, spender)
+            else:
+                self.set(network, token, owner, spender, allowance - amount)
+
+    def invalidate(self, network: str, token: str, owner: str, spender: str) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM allowances WHERE network = ? AND token = ? AND owner = ? AND spender = ?",
+                               self._key(network, token, owner, spender))
@@ -0,0 +1,123 @@
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+
+from web3 import Web3
+
+from network.deposit_watcher import Deposit, DepositSubscription, DepositWatcher
+from network.network import EVMNetwork
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Arrival:
+    src_network: str
+    dst_network: str
+    token: str
+    started_at: float
+    future: Future  # Resolved with the Deposit when the funds land
+
+
+class ArrivalTracker:
+    """ Watches destination chains for the funds of cross-chain transfers. Both Stargate pools and OFT tokens
+    credit the account with an ERC-20 Transfer on delivery, so the transfers are matched by the deposit watcher.
+    Delivery latency is recorded per route and sets the arrival timeout of the route """
+
+    MAX_SAMPLES = 100  # Latency samples kept per route
+    MIN_SAMPLES = 5  # Routes with fewer delivered transfers use the default timeout
+    LATENCY_TIMEOUT_MULTIPLIER = 3  # Arrival timeout relative to the median latency of the route
+    MIN_TIMEOUT = 5 * 60  # seconds
+
+    _default: Optional['ArrivalTracker'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        self._arrivals: Dict[str, Arrival] = {}  # address -> pending arrival
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_default() -> 'ArrivalTracker':
+        with ArrivalTracker._default_lock:
+            if ArrivalTracker._default is None:
+                ArrivalTracker._default = ArrivalTracker()
+
+            return ArrivalTracker._default
+
+    def track(self, address: str, src_network: EVMNetwork, dst_network: EVMNetwork, token: str,
+              min_amount: int) -> Arrival:
+        """ Method that starts watching the destination chain. Must be called before the source transaction is sent,
+        so a fast delivery isn't missed. A previous arrival of the account is cancelled """
+
+        address = Web3.to_checksum_address(address)
+        token = Web3.to_checksum_address(token)
+        future: Future = Future()
+        arrival = Arrival(src_network.name, dst_network.name, token, time.time(), future)
+
+        def on_deposit(deposit: Deposit) -> None:
+            if deposit.token == token and deposit.amount >= min_amount and not future.done():
+                self._record_latency(arrival)
+                future.set_result(deposit)
+
+        subscription = DepositSubscription(address, on_deposit)
+        watcher = DepositWatcher.get(dst_network)
+        future.add_done_callback(lambda _: watcher.unsubscribe(subscription))
+
+        with self._lock:
+            previous = self._arrivals.get(address)
+            self._arrivals[address] = arrival
+        if previous:
+            previous.future.cancel()
+
+        watcher.subscribe(subscription, [token])
+
+        return arrival
+
+    def get(self, address: str) -> Optional[Arrival]:
+        with self._lock:
+            return self._arrivals.get(Web3.to_checksum_address(address))
+
+    def pop(self, address: str) -> Optional[Arrival]:
+        with self._lock:
+            return self._arrivals.pop(Web3.to_checksum_address(address), None)
+
+    def cancel(self, address: str) -> None:
+        arrival = self.pop(address)
+        if arrival:
+            arrival.future.cancel()
+
+    def _record_latency(self, arrival: Arrival) -> None:
+        latency = time.time() - arrival.started_at
+        route = (arrival.src_network, arrival.dst_network)
+
+        with self._lock:
+            samples = self._latencies.setdefault(route, deque(maxlen=self.MAX_SAMPLES))
+            samples.append(latency)
+            median = statistics.median(samples)
+            count = len(samples)
+
+        logger.info(f"{arrival.src_network} -> {arrival.dst_network} delivered in {int(latency)} seconds "
+                    f"(median {int(median)} seconds over {count} transfers)")
+
+    def get_median_latency(self, src_network: str, dst_network: str) -> Optional[float]:
+        """ Method that returns the median delivery time of the route or None if it has less than MIN_SAMPLES """
+
+        with self._lock:
+            samples = self._latencies.get((src_network, dst_network))
+            return statistics.median(samples) if samples and len(samples) >= self.MIN_SAMPLES else None
+
+    def get_timeout(self, arrival: Arrival, max_timeout: float) -> float:
+        """ Method that returns how long the arrival is awaited since the start of the transfer. Slow deliveries
+        of a fast route are rechecked earlier, the timeout never exceeds max_timeout """
+
+        median = self.get_median_latency(arrival.src_network, arrival.dst_network)
+        if median is None:
+            return max_timeout
+
+        return min(max_timeout, max(self.MIN_TIMEOUT, median * self.LATENCY_TIMEOUT_MULTIPLIER))
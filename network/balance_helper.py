@@ -1,18 +1,31 @@
+from typing import Optional
+
 from base.errors import StablecoinNotSupportedByChain
+from network.balance_ledger import BalanceLedger
 from network.network import EVMNetwork
 from utility import Stablecoin
 
 
 class BalanceHelper:
-    def __init__(self, network: EVMNetwork, address: str):
+    def __init__(self, network: EVMNetwork, address: str, ledger: Optional[BalanceLedger] = None):
         self.network = network
         self.address = address
+        self.ledger = ledger
 
     def get_native_token_balance(self) -> int:
+        if self.ledger:
+            return self.ledger.get_or_fetch(self.network.name, None,
+                                            lambda: self.network.get_balance(self.address))
+
         return self.network.get_balance(self.address)
 
     def get_stablecoin_balance(self, stablecoin: Stablecoin) -> int:
         if stablecoin.symbol not in self.network.supported_stablecoins:
             raise StablecoinNotSupportedByChain(f"{stablecoin.symbol} is not supported by {self.network.name}")
 
+        if self.ledger:
+            return self.ledger.get_or_fetch(self.network.name, stablecoin.contract_address,
+                                            lambda: self.network.get_token_balance(stablecoin.contract_address,
+                                                                                   self.address))
+
         return self.network.get_token_balance(stablecoin.contract_address, self.address)
@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+NATIVE_TOKEN = 'native'
+
+
+@dataclass
+class LedgerEntry:
+    balance: int
+    verified_at: float  # Time of the last on-chain read
+
+
+class BalanceLedger:
+    """ Local view of the account balances. It's updated optimistically by our own confirmed transactions and
+    observed deposits, and reconciled with on-chain reads when an entry is older than the reconcile interval
+    or was invalidated """
+
+    def __init__(self, reconcile_interval: float) -> None:
+        self.reconcile_interval = reconcile_interval
+        self._entries: Dict[Tuple[str, str], LedgerEntry] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(network_name: str, token: Optional[str]) -> Tuple[str, str]:
+        return network_name, token.lower() if token else NATIVE_TOKEN
+
+    def get(self, network_name: str, token: Optional[str]) -> Optional[int]:
+        """ Method that returns the known balance or None if it must be read from the chain """
+
+        with self._lock:
+            entry = self._entries.get(self._key(network_name, token))
+
+        if not entry or time.time() - entry.verified_at > self.reconcile_interval:
+            return None
+
+        return entry.balance
+
+    def get_or_fetch(self, network_name: str, token: Optional[str], fetch: Callable[[], int]) -> int:
+        balance = self.get(network_name, token)
+        if balance is None:
+            balance = fetch()
+            self.set(network_name, token, balance)
+
+        return balance
+
+    def set(self, network_name: str, token: Optional[str], balance: int) -> None:
+        """ Method that saves the balance read from the chain """
+
+        with self._lock:
+            self._entries[self._key(network_name, token)] = LedgerEntry(balance, time.time())
+
+    def credit(self, network_name: str, token: Optional[str], amount: int) -> None:
+        with self._lock:
+            entry = self._entries.get(self._key(network_name, token))
+            if entry:
+                entry.balance += amount
+
+    def debit(self, network_name: str, token: Optional[str], amount: int) -> None:
+        with self._lock:
+            entry = self._entries.get(self._key(network_name, token))
+            if not entry:
+                return
+
+            if entry.balance < amount:
+                # Mismatch with our own view. The next lookup will read the chain
+                del self._entries[self._key(network_name, token)]
+            else:
+                entry.balance -= amount
+
+    def invalidate(self, network_name: str, token: Optional[str]) -> None:
+        with self._lock:
+            self._entries.pop(self._key(network_name, token), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def apply_bridge(self, src_network: str, src_token: str, amount: int) -> None:
+        """ Method that applies a confirmed bridge to the source chain. The token balance is known exactly,
+        while the gas cost is read from the chain again. The destination is credited on arrival """
+
+        self.debit(src_network, src_token, amount)
+        self.invalidate(src_network, None)
+
+    def to_json(self) -> str:
+        with self._lock:
+            return json.dumps([[network_name, token, entry.balance, entry.verified_at]
+                               for (network_name, token), entry in self._entries.items()])
+
+    def load_json(self, data: str) -> None:
+        with self._lock:
+            for network_name, token, balance, verified_at in json.loads(data):
+                self._entries[(network_name, token)] = LedgerEntry(balance, verified_at)
@@ -0,0 +1,211 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from web3 import Web3
+
+from network.network import EVMNetwork
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_EVENT_TOPIC = Web3.keccak(text="Transfer(address,address,uint256)").hex()
+
+
+@dataclass
+class Deposit:
+    network: str
+    token: Optional[str]  # None - native token
+    amount: int
+
+
+class DepositSubscription:
+    """ Account waiting for incoming funds. The same subscription can be registered in several watchers.
+    The callback is called from the watcher thread """
+
+    def __init__(self, address: str, callback: Optional[Callable[[Deposit], None]] = None) -> None:
+        self.address = Web3.to_checksum_address(address)
+        self.deposits: List[Deposit] = []
+        self._callback = callback
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    def notify(self, deposit: Deposit) -> None:
+        with self._lock:
+            self.deposits.append(deposit)
+        self._event.set()
+
+        if self._callback:
+            self._callback(deposit)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """ Method that waits for the first deposit. Returns False on timeout """
+
+        return self._event.wait(timeout)
+
+
+@dataclass
+class _Watch:
+    subscription: DepositSubscription
+    tokens: Set[str] = field(default_factory=set)
+    native: bool = False
+    next_block: Optional[int] = None  # First block that isn't scanned for the transfers yet
+    native_balance: Optional[int] = None
+
+
+class DepositWatcher:
+    """ Per-network watcher that scans new blocks for ERC-20 Transfer events to the subscribed accounts and
+    tracks native balances of accounts waiting for a native token deposit. RPC calls are made per network,
+    not per account (native balances are read with one Multicall3 call), and only while somebody is subscribed.
+    Every watch starts from the block and the balance of the check that preceded the subscription """
+
+    POLL_INTERVAL = 5  # seconds
+    MAX_BLOCK_RANGE = 2000  # Maximum number of blocks in one eth_getLogs request
+    MAX_ADDRESSES_PER_REQUEST = 100  # Maximum number of recipients in one eth_getLogs topic filter
+
+    _watchers: Dict[str, 'DepositWatcher'] = {}
+    _watchers_lock = threading.Lock()
+
+    def __init__(self, network: EVMNetwork) -> None:
+        self.network = network
+        self._watches: List[_Watch] = []
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get(network: EVMNetwork) -> 'DepositWatcher':
+        with DepositWatcher._watchers_lock:
+            if network.name not in DepositWatcher._watchers:
+                DepositWatcher._watchers[network.name] = DepositWatcher(network)
+
+            return DepositWatcher._watchers[network.name]
+
+    def subscribe(self, subscription: DepositSubscription, tokens: Iterable[str] = (), native: bool = False,
+                  from_block: Optional[int] = None, native_balance: Optional[int] = None) -> None:
+        """ Method that starts watching the deposits. Transfers are scanned from from_block and the native balance
+        is compared with native_balance. Missing values are read now """
+
+        watch = _Watch(subscription, {Web3.to_checksum_address(token) for token in tokens}, native)
+        if watch.tokens:
+            watch.next_block = from_block if from_block is not None else self.network.get_cached_block_number()
+        if native:
+            watch.native_balance = native_balance if native_balance is not None \
+                else self.network.get_balance(subscription.address)
+
+        with self._lock:
+            self._watches.append(watch)
+
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll_loop, name=f"Watcher-{self.network.name}",
+                                                daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self, subscription: DepositSubscription) -> None:
+        with self._lock:
+            self._watches = [watch for watch in self._watches if watch.subscription is not subscription]
+
+    def _poll_loop(self) -> None:
+        while True:
+            with self._lock:
+                if not self._watches:
+                    self._thread = None
+                    return
+                watches = list(self._watches)
+
+            try:
+                self._poll(watches)
+            except Exception as ex:
+                logger.error(f"{self.network.name} deposit watcher error: {ex}")
+
+            time.sleep(self.POLL_INTERVAL)
+
+    def _poll(self, watches: List[_Watch]) -> None:
+        token_watches = [watch for watch in watches if watch.tokens]
+        if token_watches:
+            current_block = self.network.w3.eth.block_number
+            self._scan_transfers(token_watches, current_block)
+
+        native_watches = [watch for watch in watches if watch.native]
+        if native_watches:
+            self._check_native_balances(native_watches)
+
+    def _scan_transfers(self, watches: List[_Watch], to_block: int) -> None:
+        """ Method that scans the blocks after the watches up to to_block in MAX_BLOCK_RANGE chunks. Watches
+        move forward after every chunk, so a failed request resumes from the chunk it failed on """
+
+        watches = [watch for watch in watches if watch.next_block <= to_block]
+        if not watches:
+            return
+
+        from_block = min(watch.next_block for watch in watches)
+        while from_block <= to_block:
+            chunk_end = min(from_block + self.MAX_BLOCK_RANGE - 1, to_block)
+            chunk_watches = [watch for watch in watches if watch.next_block <= chunk_end]
+            if chunk_watches:
+                self._scan_chunk(chunk_watches, from_block, chunk_end)
+            from_block = chunk_end + 1
+
+    def _scan_chunk(self, watches: List[_Watch], from_block: int, to_block: int) -> None:
+        tokens = sorted(set().union(*(watch.tokens for watch in watches)))
+        by_recipient: Dict[str, List[_Watch]] = {}
+        for watch in watches:
+            recipient_topic = '0x' + '0' * 24 + watch.subscription.address[2:].lower()
+            by_recipient.setdefault(recipient_topic, []).append(watch)
+
+        recipients = list(by_recipient.keys())
+        for idx in range(0, len(recipients), self.MAX_ADDRESSES_PER_REQUEST):
+            logs = self.network.w3.eth.get_logs({
+                'fromBlock': from_block,
+                'toBlock': to_block,
+                'address': tokens,
+                'topics': [TRANSFER_EVENT_TOPIC, None, recipients[idx:idx + self.MAX_ADDRESSES_PER_REQUEST]]
+            })
+
+            for log in logs:
+                token = Web3.to_checksum_address(log['address'])
+                amount = int.from_bytes(bytes(log['data']), 'big')
+
+                for watch in by_recipient.get(Web3.to_hex(log['topics'][2]), []):
+                    # Blocks before the watch start were scanned for the other watches only
+                    if token in watch.tokens and log['blockNumber'] >= watch.next_block:
+                        logger.debug(f"{self.network.name}. Transfer of {amount} {token} "
+                                     f"to {watch.subscription.address}")
+                        watch.subscription.notify(Deposit(self.network.name, token, amount))
+
+        for watch in watches:
+            watch.next_block = to_block + 1
+
+    def _check_native_balances(self, watches: List[_Watch]) -> None:
+        balances = self.network.get_balances([watch.subscription.address for watch in watches])
+
+        for watch, balance in zip(watches, balances):
+            if balance > watch.native_balance:
+                watch.subscription.notify(Deposit(self.network.name, None, balance - watch.native_balance))
+            watch.native_balance = balance
+
+
+def wait_for_deposit(address: str, watched: Dict[EVMNetwork, Iterable[str]], timeout: float,
+                     native: bool = False, from_blocks: Optional[Dict[str, int]] = None,
+                     native_balances: Optional[Dict[str, int]] = None) -> List[Deposit]:
+    """ Function that waits until one of the networks receives a deposit of the listed tokens (or the native token)
+    to the address. Transfers are looked for since from_blocks and native balances are compared with
+    native_balances (both by network name), so a deposit made after the balance check isn't missed.
+    Returns the deposits or an empty list on timeout """
+
+    from_blocks = from_blocks or {}
+    native_balances = native_balances or {}
+    subscription = DepositSubscription(address)
+    watchers = [DepositWatcher.get(network) for network in watched]
+
+    try:
+        for watcher, tokens in zip(watchers, watched.values()):
+            watcher.subscribe(subscription, tokens, native, from_blocks.get(watcher.network.name),
+                              native_balances.get(watcher.network.name))
+
+        subscription.wait(timeout)
+    finally:
+        for watcher in watchers:
+            watcher.unsubscribe(subscription)
+
+    return subscription.deposits
@@ -1,19 +1,24 @@
 import logging
+import os
 import random
+import threading
 import time
+from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import requests
 from eth_typing import Hash32, HexStr
 from hexbytes import HexBytes
 from web3 import HTTPProvider, Web3
-from web3.exceptions import TransactionNotFound
-from web3.types import TxParams
+from web3.exceptions import ContractLogicError, TransactionNotFound
+from web3.types import RPCEndpoint, RPCResponse, TxParams
 
-from abi import ERC20_ABI
+from abi import ERC20_ABI, MULTICALL3_ABI
 from base.errors import NotSupported
-from utility import Stablecoin
+from network.approval import AllowanceCache, ApprovalPolicy
+from network.transaction_journal import TransactionJournal, JournalStatus
+from utility import MetadataSnapshot, Stablecoin
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +29,20 @@ class TransactionStatus(Enum):
     FAILED = 2
 
 
+def build_request_limiter_middleware(limiter: Any) -> Callable:
+    """ Web3 middleware that waits for the limiter before every RPC request. Limiter can be any object
+    with the acquire() method (local RateLimiter or remote limiter shared between processes) """
+
+    def request_limiter_middleware(make_request: Callable, w3: Web3) -> Callable:
+        def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            limiter.acquire()
+            return make_request(method, params)
+
+        return middleware
+
+    return request_limiter_middleware
+
+
 class Network:
 
     def __init__(self, name: str, native_token: str, rpc: str, layerzero_chain_id: int,
@@ -46,6 +65,10 @@ class Network:
         """ Method that checks ERC-20 token allowance """
         raise NotSupported(f"{self.name} get_token_allowance() is not implemented")
 
+    def get_chain_id(self) -> int:
+        """ Method that returns the chain id """
+        raise NotSupported(f"{self.name} get_chain_id() is not implemented")
+
     def get_current_gas(self) -> int:
         """ Method that checks network gas price """
         raise NotSupported(f"{self.name} get_current_gas() is not implemented")
@@ -55,7 +78,36 @@ class Network:
         raise NotSupported(f"{self.name} get_nonce() is not implemented")
 
 
+@dataclass
+class _SentTransaction:
+    tx: TxParams
+    private_key: Optional[str]  # None - the transaction isn't replaced anymore
+    purpose: str
+    sent_at: float
+
+
+@dataclass
+class _TrackedTransaction:
+    tx_hashes: List[HexBytes]  # The original transaction and its replacements
+    sent_at: float
+    status: Optional[TransactionStatus] = None
+    mined_hash: Optional[HexBytes] = None
+
+
 class EVMNetwork(Network):
+    REPLACEMENT_FEE_BUMP = 1.125  # Nodes accept a same-nonce replacement only with at least 10% higher fees
+
+    # Replacement of stuck transactions. Networks can override the values
+    STUCK_TX_TIMEOUT = int(os.getenv('STUCK_TX_TIMEOUT', 120))  # seconds without a receipt before the fees are raised
+    FEE_BUMP = 1 + float(os.getenv('FEE_BUMP_PERCENT', 15)) / 100
+    MAX_FEE_MULTIPLIER = float(os.getenv('MAX_FEE_MULTIPLIER', 3))  # Fee ceiling relative to the original fees
+    REPLACEMENT_WINDOW = 30 * 60  # seconds. Sent transactions that nobody waits for are forgotten after it
+
+    MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'  # Same address in all supported networks
+    MULTICALL_BATCH_SIZE = 500  # Maximum number of balance reads in one eth_call
+
+    SIMULATE_TRANSACTIONS = os.getenv('SIMULATE_TRANSACTIONS', '1') == '1'  # eth_call bridges before the broadcast
+    BLOCK_NUMBER_TTL = 1  # seconds. Simulation results are cached per block
 
     def __init__(self, name: str, native_token: str, rpc: str,
                  layerzero_chain_id: int, stargate_router_address: str,
@@ -63,12 +115,43 @@ class EVMNetwork(Network):
         super().__init__(name, native_token, rpc, layerzero_chain_id, stargate_router_address)
         self.w3 = Web3(HTTPProvider(rpc))
         self.supported_stablecoins = supported_stablecoins
+        self._sent_transactions: Dict[str, _SentTransaction] = {}  # tx hash -> transaction that can be replaced
+        self._block_number: Optional[Tuple[int, float]] = None  # (block number, fetch time)
+        self._simulations: Dict[tuple, Optional[str]] = {}  # Results of the _simulations_block block
+        self._simulations_block: Optional[int] = None
+        self._simulation_lock = threading.Lock()
+        self._chain_id: Optional[int] = None
+
+    def set_request_limiter(self, limiter: Any) -> None:
+        """ Method that limits the rate of RPC requests sent to the network provider """
+
+        if 'request_limiter' in self.w3.middleware_onion:
+            self.w3.middleware_onion.remove('request_limiter')
+        self.w3.middleware_onion.add(build_request_limiter_middleware(limiter), 'request_limiter')
 
     def get_balance(self, address: str) -> int:
         """ Method that checks native token balance """
 
         return self.w3.eth.get_balance(Web3.to_checksum_address(address))
 
+    def get_chain_id(self) -> int:
+        """ Method that returns the chain id. It's saved to the metadata snapshot, so build_transaction doesn't
+        request it in every run """
+
+        if self._chain_id is None:
+            snapshot = MetadataSnapshot.get_default()
+            key = f"chain_id.{self.name}"
+            entry = snapshot.get(key) if snapshot else None
+
+            if entry:
+                self._chain_id = entry[1]
+            else:
+                self._chain_id = self.w3.eth.chain_id
+                if snapshot:
+                    snapshot.put(key, self._chain_id)
+
+        return self._chain_id
+
     def get_current_gas(self) -> int:
         """ Method that checks network gas price """
 
@@ -106,32 +189,298 @@ class EVMNetwork(Network):
 
         return False
 
+    def is_transaction_mined(self, tx_hash: Union[Hash32, HexBytes, HexStr]) -> bool:
+        try:
+            return self.w3.eth.get_transaction_receipt(tx_hash) is not None
+        except TransactionNotFound:
+            return False
+
+    def sign_and_send_transaction(self, tx: TxParams, private_key: str, purpose: str) -> HexBytes:
+        """ Method that signs the transaction, writes it to the transaction journal and broadcasts it """
+
+        return self.send_transaction_bundle([(tx, purpose)], private_key)[0]
+
+    def send_transaction_bundle(self, txs: List[Tuple[TxParams, str]], private_key: str) -> List[HexBytes]:
+        """ Method that signs all (transaction, purpose) pairs up front, journals them and broadcasts them
+        back to back. Transactions must have consecutive nonces """
+
+        signed_txs = [(self.w3.eth.account.sign_transaction(tx, private_key), tx, purpose) for tx, purpose in txs]
+
+        journal = TransactionJournal.get_default()
+        if journal:
+            for signed_tx, tx, purpose in signed_txs:
+                journal.record(signed_tx.hash.hex(), tx['from'], self.name, tx['nonce'],
+                               signed_tx.rawTransaction.hex(), purpose)
+
+        tx_hashes = []
+        for idx, (signed_tx, tx, purpose) in enumerate(signed_txs):
+            try:
+                tx_hashes.append(self.w3.eth.send_raw_transaction(signed_tx.rawTransaction))
+            except ValueError:
+                # Rejected by the node. The rest of the bundle can't be mined
+                if journal:
+                    for rejected_tx, _, _ in signed_txs[idx:]:
+                        journal.resolve(rejected_tx.hash.hex(), JournalStatus.DROPPED)
+                raise
+
+            self._sent_transactions[signed_tx.hash.hex()] = _SentTransaction(tx, private_key, purpose, time.time())
+
+        self._evict_sent_transactions()
+
+        return tx_hashes
+
+    def _evict_sent_transactions(self) -> None:
+        """ Method that forgets the transactions sent earlier than REPLACEMENT_WINDOW, with their private keys """
+
+        expired = time.time() - self.REPLACEMENT_WINDOW
+        for tx_hash, sent in list(self._sent_transactions.items()):
+            if sent.sent_at < expired:
+                self._sent_transactions.pop(tx_hash, None)
+
+    def _bump_gas_params(self, tx: TxParams, multiplier: float) -> dict:
+        # Nodes accept a same-nonce replacement only if every fee is raised
+        return {key: max(int(tx[key] * multiplier), tx[key] + 1)
+                for key in ('gasPrice', 'maxFeePerGas', 'maxPriorityFeePerGas') if key in tx}
+
+    def _get_latest_transaction(self, tx: TxParams) -> TxParams:
+        """ Method that returns the last sent replacement of the transaction (or the transaction itself) """
+
+        same_nonce = [sent.tx for sent in list(self._sent_transactions.values())
+                      if sent.tx['from'] == tx['from'] and sent.tx['nonce'] == tx['nonce']]
+
+        return max(same_nonce + [tx], key=lambda item: item.get('maxFeePerGas', item.get('gasPrice', 0)))
+
+    def build_cancel_transaction(self, tx: TxParams) -> TxParams:
+        """ Method that builds an empty transfer to self that replaces the pending transaction (same nonce,
+        higher fees) """
+
+        tx = self._get_latest_transaction(tx)
+
+        return {
+            'from': tx['from'],
+            'to': tx['from'],
+            'value': 0,
+            'gas': 21000,
+            'chainId': tx['chainId'],
+            **self._bump_gas_params(tx, self.REPLACEMENT_FEE_BUMP),
+            'nonce': tx['nonce']
+        }
+
+    def cancel_transaction(self, tx: TxParams, tx_hash: HexBytes, private_key: str) -> bool:
+        """ Method that cancels the pending transaction with a same-nonce replacement.
+        Returns True if the replacement was mined """
+
+        try:
+            cancel_hash = self.sign_and_send_transaction(self.build_cancel_transaction(tx), private_key, 'cancel')
+        except ValueError as ex:
+            # Already mined
+            logger.info(f"Unable to cancel transaction {tx_hash.hex()}: {ex}")
+            return False
+
+        logger.info(f"Cancelling transaction {tx_hash.hex()}. Replacement hash: {cancel_hash.hex()}")
+
+        if not self.check_tx_result(self.wait_for_transaction(cancel_hash), "Cancel"):
+            return False
+
+        # The transaction and all its fee replacements are dropped
+        replaced = {tx_hash.hex()} | {sent_hash for sent_hash, sent in list(self._sent_transactions.items())
+                                      if sent.tx['from'] == tx['from'] and sent.tx['nonce'] == tx['nonce']}
+
+        journal = TransactionJournal.get_default()
+        for replaced_hash in replaced:
+            self._sent_transactions.pop(replaced_hash, None)
+            if journal:
+                journal.resolve(replaced_hash, JournalStatus.DROPPED)
+
+        return True
+
+    def _replace_stuck_transaction(self, tracked: '_TrackedTransaction') -> None:
+        """ Method that re-signs the stuck transaction with the same nonce and fees raised by FEE_BUMP.
+        Fees never exceed MAX_FEE_MULTIPLIER times the fees of the original transaction """
+
+        original = self._sent_transactions.get(HexBytes(tracked.tx_hashes[0]).hex())
+        latest = self._sent_transactions.get(HexBytes(tracked.tx_hashes[-1]).hex())
+        if not original or not latest or not latest.private_key:
+            return
+
+        gas_params = self._bump_gas_params(latest.tx, max(self.FEE_BUMP, self.REPLACEMENT_FEE_BUMP))
+        ceiling = self._bump_gas_params(original.tx, self.MAX_FEE_MULTIPLIER)
+        if any(value > ceiling[key] for key, value in gas_params.items()):
+            logger.info(f"Transaction {HexBytes(tracked.tx_hashes[0]).hex()} reached the fee ceiling")
+            return
+
+        try:
+            tx_hash = self.sign_and_send_transaction({**latest.tx, **gas_params}, latest.private_key, latest.purpose)
+        except ValueError as ex:
+            # Mined meanwhile or the replacement is underpriced
+            logger.info(f"Unable to replace transaction {HexBytes(tracked.tx_hashes[-1]).hex()}: {ex}")
+            return
+
+        logger.info(f"Transaction {HexBytes(tracked.tx_hashes[-1]).hex()} is stuck. "
+                    f"Replaced with higher fees: {tx_hash.hex()} ({gas_params})")
+        tracked.tx_hashes.append(tx_hash)
+
+    def get_cached_block_number(self) -> int:
+        """ Method that returns the block number fetched at most BLOCK_NUMBER_TTL seconds ago """
+
+        block_number = self._block_number
+        if not block_number or time.time() - block_number[1] > self.BLOCK_NUMBER_TTL:
+            block_number = (self.w3.eth.block_number, time.time())
+            self._block_number = block_number
+
+        return block_number[0]
+
+    def simulate_transaction(self, tx: TxParams, route: tuple) -> Optional[str]:
+        """ Method that executes the transaction with eth_call against the pending state. Returns the revert
+        reason or None if the transaction succeeds. Results are cached per route and block """
+
+        if not self.SIMULATE_TRANSACTIONS:
+            return None
+
+        call = {key: value for key, value in tx.items() if key not in ('nonce', 'chainId')}
+        block_number = self.get_cached_block_number()
+        key = (route, call['from'], call.get('data'), call.get('value'))
+
+        with self._simulation_lock:
+            if self._simulations_block != block_number:
+                self._simulations = {}
+                self._simulations_block = block_number
+            elif key in self._simulations:
+                return self._simulations[key]
+
+        try:
+            self.w3.eth.call(call, 'pending')
+            reason = None
+        except ContractLogicError as ex:
+            # Decoded Error(string) or Panic(uint256)
+            reason = str(ex)
+        except ValueError as ex:
+            # Reverts that web3 didn't decode. Other node errors aren't cached, the caller's retry policy handles them
+            if not self._is_execution_reverted(ex):
+                raise
+            reason = str(ex)
+
+        with self._simulation_lock:
+            if self._simulations_block == block_number:
+                self._simulations[key] = reason
+
+        return reason
+
+    @staticmethod
+    def _is_execution_reverted(ex: ValueError) -> bool:
+        """ Method that checks whether the node error of an eth_call is an execution revert """
+
+        error = ex.args[0] if ex.args else None
+        message = error.get('message', '') if isinstance(error, dict) else str(error)
+        has_revert_data = isinstance(error, dict) and bool(error.get('data'))
+        return 'revert' in message.lower() or (has_revert_data and error.get('code') == 3)
+
     def wait_for_transaction(self, tx_hash: Union[Hash32, HexBytes, HexStr], timeout: int = 300) -> TransactionStatus:
+        return self.wait_for_transactions([tx_hash], timeout)[0]
+
+    def wait_for_transactions(self, tx_hashes: List[Union[Hash32, HexBytes, HexStr]], timeout: int = 300,
+                              stop_on_failure: bool = False) -> List[TransactionStatus]:
+        """ Method that waits for the receipts of several transactions in one loop. Transactions sent by this
+        network object that stay unmined for STUCK_TX_TIMEOUT are replaced with higher fees, and all the
+        replacements are tracked together. With stop_on_failure it returns once any transaction fails,
+        the pending ones are NOT_FOUND """
+
+        tracked_txs = [_TrackedTransaction([tx_hash], time.time()) for tx_hash in tx_hashes]
+        try:
+            self._wait_for_receipts(tracked_txs, timeout, stop_on_failure)
+        finally:
+            self._release_sent_transactions(tracked_txs)
+
+        journal = TransactionJournal.get_default()
+        for tracked in tracked_txs:
+            for tx_hash in tracked.tx_hashes:
+                tx_hash = HexBytes(tx_hash).hex()
+                if tracked.status == TransactionStatus.NOT_FOUND:
+                    continue
+
+                if not journal:
+                    continue
+
+                if tx_hash == HexBytes(tracked.mined_hash).hex():
+                    journal.resolve(tx_hash, JournalStatus.CONFIRMED
+                                    if tracked.status == TransactionStatus.SUCCESS else JournalStatus.FAILED)
+                else:
+                    journal.resolve(tx_hash, JournalStatus.DROPPED)
+
+        return [tracked.status for tracked in tracked_txs]
+
+    def _release_sent_transactions(self, tracked_txs: List['_TrackedTransaction']) -> None:
+        """ Method that drops the private keys of the transactions that aren't waited for anymore, whatever
+        the outcome. Pending ones keep the fees, so a cancellation outbids the last replacement """
+
+        for tracked in tracked_txs:
+            for tx_hash in tracked.tx_hashes:
+                tx_hash = HexBytes(tx_hash).hex()
+                sent = self._sent_transactions.get(tx_hash)
+                if not sent:
+                    continue
+
+                if tracked.status in (TransactionStatus.SUCCESS, TransactionStatus.FAILED):
+                    self._sent_transactions.pop(tx_hash, None)
+                else:
+                    self._sent_transactions[tx_hash] = _SentTransaction(sent.tx, None, sent.purpose, sent.sent_at)
+
+    def _get_transaction_status(self, tx_hash: Union[Hash32, HexBytes, HexStr]) -> Optional[TransactionStatus]:
+        try:
+            tx_receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            return None
+        except requests.exceptions.HTTPError:
+            time.sleep(10)
+            return None
+
+        if tx_receipt is None:
+            return None
+
+        if tx_receipt["status"]:
+            logger.info("Transaction mined successfully! Status: Success")
+            return TransactionStatus.SUCCESS
+        else:
+            logger.info("Transaction mined successfully! Status: Failed")
+            return TransactionStatus.FAILED
+
+    def _wait_for_receipts(self, tracked_txs: List['_TrackedTransaction'], timeout: int,
+                           stop_on_failure: bool) -> None:
         start_time = time.time()
 
-        logger.info(f'Waiting for transaction {tx_hash.hex()} to be mined')
+        for tracked in tracked_txs:
+            logger.info(f'Waiting for transaction {HexBytes(tracked.tx_hashes[0]).hex()} to be mined')
+
         while True:
-            try:
-                tx_receipt = self.w3.eth.get_transaction_receipt(tx_hash)
-            except TransactionNotFound:
-                pass
-            except requests.exceptions.HTTPError:
-                time.sleep(10)
-            else:
-                if tx_receipt is not None:
-                    if tx_receipt["status"]:
-                        logger.info("Transaction mined successfully! Status: Success")
-                        return TransactionStatus.SUCCESS
-                    else:
-                        logger.info("Transaction mined successfully! Status: Failed")
-                        return TransactionStatus.FAILED
+            for tracked in tracked_txs:
+                if tracked.status is not None:
+                    continue
+
+                for tx_hash in tracked.tx_hashes:
+                    tracked.status = self._get_transaction_status(tx_hash)
+                    if tracked.status is not None:
+                        tracked.mined_hash = tx_hash
+                        break
+
+            statuses = [tracked.status for tracked in tracked_txs]
+            if all(statuses) or (stop_on_failure and TransactionStatus.FAILED in statuses):
+                break
 
             if time.time() - start_time >= timeout:
                 logger.info("Timeout reached. Transaction not mined within the specified time")
-                return TransactionStatus.NOT_FOUND
+                break
+
+            for tracked in tracked_txs:
+                if tracked.status is None and time.time() - tracked.sent_at >= self.STUCK_TX_TIMEOUT:
+                    self._replace_stuck_transaction(tracked)
+                    tracked.sent_at = time.time()
 
             time.sleep(10)  # Wait for 10 seconds before checking again
 
+        for tracked in tracked_txs:
+            if tracked.status is None:
+                tracked.status = TransactionStatus.NOT_FOUND
+
     # MARK: ERC-20 Token functions
 
     def get_token_balance(self, contract_address: str, address: str) -> int:
@@ -140,6 +489,33 @@ class EVMNetwork(Network):
         contract = self.w3.eth.contract(address=Web3.to_checksum_address(contract_address), abi=ERC20_ABI)
         return contract.functions.balanceOf(Web3.to_checksum_address(address)).call()
 
+    def get_balances(self, addresses: List[str], contract_address: Optional[str] = None) -> List[int]:
+        """ Method that reads native token (or ERC-20 token) balances of many accounts with Multicall3,
+        one eth_call per MULTICALL_BATCH_SIZE accounts. Failed reads are returned as zero balances """
+
+        multicall = self.w3.eth.contract(address=self.MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+        if contract_address:
+            target = self.w3.eth.contract(address=Web3.to_checksum_address(contract_address), abi=ERC20_ABI)
+        else:
+            target = multicall
+
+        balances = []
+        for idx in range(0, len(addresses), self.MULTICALL_BATCH_SIZE):
+            calls = []
+            for address in addresses[idx:idx + self.MULTICALL_BATCH_SIZE]:
+                address = Web3.to_checksum_address(address)
+                if contract_address:
+                    call_data = target.encodeABI(fn_name='balanceOf', args=[address])
+                else:
+                    call_data = target.encodeABI(fn_name='getEthBalance', args=[address])
+                calls.append((target.address, True, call_data))
+
+            results = multicall.functions.aggregate3(calls).call()
+            balances.extend(int.from_bytes(data, 'big') if success and len(data) == 32 else 0
+                            for success, data in results)
+
+        return balances
+
     def get_token_allowance(self, contract_address: str, owner: str, spender: str) -> int:
         """ Method that checks ERC-20 token allowance """
 
@@ -147,10 +523,41 @@ class EVMNetwork(Network):
         return contract.functions.allowance(Web3.to_checksum_address(owner),
                                             Web3.to_checksum_address(spender)).call()
 
+    def is_approval_required(self, contract_address: str, owner: str, spender: str, amount: int) -> bool:
+        """ Method that checks if the allowance is lower than the amount. The allowance RPC call is skipped
+        when the cached allowance is enough """
+
+        cache = AllowanceCache.get_default()
+        if cache:
+            cached_allowance = cache.get(self.name, contract_address, owner, spender)
+            if cached_allowance is not None and cached_allowance >= amount:
+                return False
+
+        allowance = self.get_token_allowance(contract_address, owner, spender)
+        if cache:
+            cache.set(self.name, contract_address, owner, spender, allowance)
+
+        return allowance < amount
+
+    def record_allowance_spend(self, contract_address: str, owner: str, spender: str, amount: int,
+                               succeed: bool) -> None:
+        """ Method that updates the cached allowance after a transaction that spends the tokens """
+
+        cache = AllowanceCache.get_default()
+        if not cache:
+            return
+
+        if succeed:
+            cache.spend(self.name, contract_address, owner, spender, amount)
+        else:
+            # The allowance could be the reason of the failure
+            cache.invalidate(self.name, contract_address, owner, spender)
+
     def get_approve_gas_limit(self) -> int:
         raise NotSupported(f"{self.name} _get_approve_gas_limit() is not implemented")
 
-    def _build_approve_transaction(self, address: str, contract_address: str, spender: str, amount: int) -> TxParams:
+    def build_approve_transaction(self, address: str, contract_address: str, spender: str, amount: int,
+                                  nonce: Optional[int] = None) -> TxParams:
         contract = self.w3.eth.contract(address=Web3.to_checksum_address(contract_address), abi=ERC20_ABI)
 
         randomized_gas_limit = random.randint(int(self.get_approve_gas_limit() * 0.95), self.get_approve_gas_limit())
@@ -161,19 +568,43 @@ class EVMNetwork(Network):
                 'from': address,
                 'gas': randomized_gas_limit,
                 **gas_params,
-                'nonce': self.get_nonce(address)
+                'chainId': self.get_chain_id(),
+                'nonce': nonce if nonce is not None else self.get_nonce(address)
             }
         )
 
         return tx
 
+    def send_approval_bundle(self, private_key: str, contract_address: str, spender: str, amount: int,
+                             build_tx: Callable[[int], TxParams], purpose: str) -> TransactionStatus:
+        """ Method that signs the approve and the transaction built by build_tx(nonce) with consecutive nonces,
+        sends them back to back and waits for both receipts. If the approve fails, the transaction is cancelled
+        with a same-nonce replacement. Returns the transaction status """
+
+        address = self.w3.eth.account.from_key(private_key).address
+        approve_amount = ApprovalPolicy.get_approve_amount(amount)
+        nonce = self.get_nonce(address)
+        approve_tx = self.build_approve_transaction(address, contract_address, spender, approve_amount, nonce)
+        tx = build_tx(nonce + 1)
+
+        approve_hash, tx_hash = self.send_transaction_bundle([(approve_tx, 'approve'), (tx, purpose)], private_key)
+        logger.info(f'Approve and {purpose} transactions signed and sent. '
+                    f'Hashes: {approve_hash.hex()}, {tx_hash.hex()}')
+
+        approve_status, status = self.wait_for_transactions([approve_hash, tx_hash], stop_on_failure=True)
+        if self.check_tx_result(approve_status, "Approve"):
+            cache = AllowanceCache.get_default()
+            if cache:
+                cache.set(self.name, contract_address, address, spender, approve_amount)
+        elif status == TransactionStatus.NOT_FOUND:
+            self.cancel_transaction(tx, tx_hash, private_key)
+
+        return status
+
     def approve_token_usage(self, private_key: str, contract_address: str, spender: str, amount: int) -> HexBytes:
         """ Method that approves token usage by spender address and returns transaction hash """
 
         account = self.w3.eth.account.from_key(private_key)
-        tx = self._build_approve_transaction(account.address, contract_address, spender, amount)
-
-        signed_tx = self.w3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.rawTransaction)
+        tx = self.build_approve_transaction(account.address, contract_address, spender, amount)
 
-        return tx_hash
+        return self.sign_and_send_transaction(tx, private_key, 'approve')
@@ -48,6 +48,6 @@ class Optimism(EVMNetwork):
         addr = "0x0000000000000000000000000000000000000000"
         amount = 10
 
-        approve_tx = self._build_approve_transaction(addr, addr, addr, amount)
+        approve_tx = self.build_approve_transaction(addr, addr, addr, amount)
 
         return self.get_l1_fee(approve_tx)
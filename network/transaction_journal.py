@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+from dotenv import load_dotenv
+from hexbytes import HexBytes
+
+if TYPE_CHECKING:
+    from network.network import EVMNetwork
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+
+class JournalStatus:
+    PENDING = 'pending'
+    CONFIRMED = 'confirmed'
+    FAILED = 'failed'
+    DROPPED = 'dropped'  # Nonce was used by another transaction
+
+
+@dataclass
+class JournalEntry:
+    tx_hash: str
+    account: str
+    network: str
+    nonce: int
+    raw_transaction: str
+    purpose: str  # approve, swap, bridge
+    status: str = JournalStatus.PENDING
+    created_at: float = 0
+
+
+class TransactionJournal:
+    """ Append-only log of signed transactions. Entries are written before the broadcast and resolved before
+    the next state is checkpointed. Both are fsynced in batches: every caller waits only for the fsync
+    that covers its own entry. Resolved records are dropped by rewriting the journal on open and every
+    COMPACT_RECORDS records """
+
+    PATH = os.getenv('TRANSACTION_JOURNAL_PATH', 'transactions.journal')  # Empty path disables the journal
+    COMPACT_RECORDS = 10000  # Records that aren't pending anymore before the journal is compacted
+    RECONCILE_TIMEOUT = 300  # seconds. Shared by all pending transactions of an account
+
+    _default: Optional['TransactionJournal'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._pending: Dict[str, Dict[str, JournalEntry]] = {}  # account -> tx_hash -> entry
+        self._pending_by_hash: Dict[str, JournalEntry] = {}
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._records = 0  # Records in the journal file
+
+        self._replay()
+        if self._records > len(self._pending_by_hash):
+            self._compact()
+
+        self._fd = self._open()
+        self._writer = threading.Thread(target=self._write_loop, name="TxJournal", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def get_default() -> Optional['TransactionJournal']:
+        """ Method that returns the process-wide journal configured by TRANSACTION_JOURNAL_PATH """
+
+        if not TransactionJournal.PATH:
+            return None
+
+        with TransactionJournal._default_lock:
+            if TransactionJournal._default is None:
+                TransactionJournal._default = TransactionJournal(TransactionJournal.PATH)
+
+            return TransactionJournal._default
+
+    def _replay(self) -> None:
+        """ Method that restores pending entries. The last record of a transaction hash wins """
+
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r') as file:
+            for line in file:
+                self._records += 1
+                try:
+                    entry = JournalEntry(**json.loads(line))
+                except (ValueError, TypeError):
+                    # Torn write of the last record
+                    continue
+                self._apply(entry)
+
+        pending = sum(len(entries) for entries in self._pending.values())
+        if pending:
+            logger.info(f"Transaction journal contains {pending} pending transactions")
+
+    def _apply(self, entry: JournalEntry) -> None:
+        account_entries = self._pending.setdefault(entry.account, {})
+
+        if entry.status == JournalStatus.PENDING:
+            account_entries[entry.tx_hash] = entry
+            self._pending_by_hash[entry.tx_hash] = entry
+        else:
+            account_entries.pop(entry.tx_hash, None)
+            self._pending_by_hash.pop(entry.tx_hash, None)
+            if not account_entries:
+                del self._pending[entry.account]
+
+    def _open(self) -> int:
+        return os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def _compact(self) -> None:
+        """ Method that atomically rewrites the journal with the pending entries only. Entries applied
+        after the snapshot are still queued, so they're appended to the new file """
+
+        with self._lock:
+            entries = list(self._pending_by_hash.values())
+
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.write(fd, "".join(json.dumps(asdict(entry)) + "\n" for entry in entries).encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, self.path)
+
+        # The rename is durable only after the directory is fsynced
+        dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+        self._records = len(entries)
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            data = "".join(line for line, _ in batch).encode()
+            try:
+                os.write(self._fd, data)
+                os.fsync(self._fd)
+            except OSError as ex:
+                logger.error(f"Unable to write the transaction journal: {ex}")
+
+            self._records += len(batch)
+            with self._lock:
+                pending = len(self._pending_by_hash)
+            if self._records - pending >= self.COMPACT_RECORDS:
+                os.close(self._fd)
+                try:
+                    self._compact()
+                except OSError as ex:
+                    logger.error(f"Unable to compact the transaction journal: {ex}")
+                self._fd = self._open()
+
+            for _, written in batch:
+                if written:
+                    written.set()
+
+    def _append(self, entry: JournalEntry, durable: bool) -> None:
+        with self._lock:
+            self._apply(entry)
+
+        written = threading.Event() if durable else None
+        self._queue.put((json.dumps(asdict(entry)) + "\n", written))
+
+        if written:
+            written.wait()
+
+    def record(self, tx_hash: str, account: str, network: str, nonce: int, raw_transaction: str,
+               purpose: str) -> None:
+        """ Method that durably records a signed transaction. Must be called before the broadcast """
+
+        entry = JournalEntry(tx_hash, account, network, nonce, raw_transaction, purpose,
+                             JournalStatus.PENDING, time.time())
+        self._append(entry, durable=True)
+
+    def resolve(self, tx_hash: str, status: str) -> None:
+        """ Method that durably records the final status of the transaction. It returns after the fsync, so
+        a checkpoint saved later never refers to a transaction that is pending in the journal """
+
+        with self._lock:
+            entry = self._pending_by_hash.get(tx_hash)
+        if not entry:
+            return
+
+        resolved = JournalEntry(**{**asdict(entry), 'status': status, 'created_at': time.time()})
+        self._append(resolved, durable=True)
+
+    def get_pending(self, account: str) -> List[JournalEntry]:
+        with self._lock:
+            entries = self._pending.get(account, {})
+            return sorted(entries.values(), key=lambda entry: (entry.network, entry.nonce))
+
+    def reconcile(self, account: str, networks: Dict[str, 'EVMNetwork']) -> List[JournalEntry]:
+        """ Method that resolves pending transactions of the account left by the previous run. Transactions that
+        are still unknown to the network are broadcast again (the same raw bytes, so it can't be executed twice).
+        The transactions of a network are awaited together, and all networks share RECONCILE_TIMEOUT.
+        Returns the confirmed entries """
+
+        deadline = time.time() + self.RECONCILE_TIMEOUT
+        broadcast: Dict[str, List[JournalEntry]] = {}  # network -> entries to wait for
+
+        for entry in self.get_pending(account):
+            network = networks.get(entry.network)
+            if not network:
+                continue
+
+            logger.info(f"Reconciling {entry.purpose} transaction {entry.tx_hash} ({entry.network})")
+
+            if network.get_nonce(account) > entry.nonce and not network.is_transaction_mined(entry.tx_hash):
+                logger.info(f"Nonce {entry.nonce} was used by another transaction. {entry.tx_hash} is dropped")
+                self.resolve(entry.tx_hash, JournalStatus.DROPPED)
+                continue
+
+            try:
+                network.w3.eth.send_raw_transaction(HexBytes(entry.raw_transaction))
+            except ValueError:
+                # Already known or already mined
+                pass
+
+            broadcast.setdefault(entry.network, []).append(entry)
+
+        confirmed = []
+
+        for network_name, entries in broadcast.items():
+            network = networks[network_name]
+            timeout = max(0, int(deadline - time.time()))
+
+            # wait_for_transactions() resolves the journal entries
+            results = network.wait_for_transactions([HexBytes(entry.tx_hash) for entry in entries], timeout)
+            for entry, result in zip(entries, results):
+                if network.check_tx_result(result, f"Journaled {entry.purpose}"):
+                    confirmed.append(entry)
+
+        return confirmed
@@ -1,13 +1,15 @@
 import logging
 import random
 import time
+from dataclasses import dataclass
+from typing import Optional
 
 from hexbytes import HexBytes
 from web3 import Web3
 from web3.types import TxParams
 
 from abi import STARGATE_ROUTER_ABI
-from network.network import EVMNetwork
+from network.network import EVMNetwork, TransactionStatus
 from network.optimism.optimism import Optimism
 from utility import Stablecoin
 
@@ -71,8 +73,10 @@ class StargateUtils:
         return gas_price
 
     @staticmethod
-    def is_enough_native_balance_for_swap_fee(src_network: EVMNetwork, dst_network: EVMNetwork, address: str) -> bool:
-        account_balance = src_network.get_balance(address)
+    def is_enough_native_balance_for_swap_fee(src_network: EVMNetwork, dst_network: EVMNetwork, address: str,
+                                              account_balance: Optional[int] = None) -> bool:
+        if account_balance is None:
+            account_balance = src_network.get_balance(address)
         gas_price = StargateUtils.estimate_swap_gas_price(src_network, dst_network, address)
         layerzero_fee = StargateUtils.estimate_layerzero_swap_fee(src_network, dst_network, address)
 
@@ -83,13 +87,14 @@ class StargateUtils:
     @staticmethod
     def build_swap_transaction(address: str, src_network: EVMNetwork, dst_network: EVMNetwork,
                                src_stablecoin: Stablecoin, dst_stablecoin: Stablecoin,
-                               amount: int, slippage: float) -> TxParams:
+                               amount: int, slippage: float, nonce: Optional[int] = None) -> TxParams:
         contract = src_network.w3.eth.contract(
             address=Web3.to_checksum_address(src_network.stargate_router_address),
             abi=STARGATE_ROUTER_ABI)
 
         layerzero_fee = StargateUtils.estimate_layerzero_swap_fee(src_network, dst_network, address)
-        nonce = src_network.get_nonce(address)
+        if nonce is None:
+            nonce = src_network.get_nonce(address)
         gas_params = src_network.get_transaction_gas_params()
         amount_with_slippage = amount - int(amount * slippage)
 
@@ -113,6 +118,7 @@ class StargateUtils:
                 'value': layerzero_fee,
                 'gas': StargateConstants.get_randomized_swap_gas_limit(src_network.name),
                 **gas_params,
+                'chainId': src_network.get_chain_id(),
                 'nonce': nonce
             }
         )
@@ -120,6 +126,13 @@ class StargateUtils:
         return tx
 
 
+@dataclass
+class PreparedSwap:
+    amount: int
+    tx: TxParams  # Built swap transaction (unsigned)
+    prepared_at: float
+
+
 class StargateBridgeHelper:
 
     def __init__(self, account: LocalAccount, src_network: EVMNetwork, dst_network: EVMNetwork,
@@ -132,30 +145,84 @@ class StargateBridgeHelper:
         self.amount = amount
         self.slippage = slippage
 
-    def make_bridge(self) -> bool:
-        """ Method that performs bridge from src_network to dst_network """
+    def prepare(self) -> Optional[PreparedSwap]:
+        """ Method that performs the bridge checks and builds the swap transaction in advance.
+        Returns None if the bridge isn't possible or an approval is required first """
+
+        if not self._is_bridge_possible():
+            return None
+
+        if self._is_approval_required():
+            return None
+
+        tx = StargateUtils.build_swap_transaction(self.account.address, self.src_network, self.dst_network,
+                                                  self.src_stablecoin, self.dst_stablecoin, self.amount, self.slippage)
+
+        return PreparedSwap(self.amount, tx, time.time())
+
+    def make_bridge(self, prepared: Optional[PreparedSwap] = None) -> bool:
+        """ Method that performs bridge from src_network to dst_network. The prepared swap transaction
+        is sent at once, without the checks """
+
+        if prepared:
+            if not self._simulate_swap(prepared.tx):
+                return False
+
+            try:
+                tx_hash = self._send_swap_transaction(prepared.tx)
+            except ValueError as ex:
+                # Nonce or fees became outdated
+                logger.warning(f"Prepared swap transaction was rejected: {ex}. Building a new one")
+            else:
+                return self._wait_for_swap(tx_hash)
 
         if not self._is_bridge_possible():
             return False
 
-        if not self._approve_stablecoin_usage(self.amount):
+        if self._is_approval_required():
+            # The swap can't be simulated before the approve is mined
+            return self._make_bridge_with_approval()
+
+        tx = StargateUtils.build_swap_transaction(self.account.address, self.src_network, self.dst_network,
+                                                  self.src_stablecoin, self.dst_stablecoin, self.amount, self.slippage)
+        if not self._simulate_swap(tx):
             return False
 
-        # Wait for a blockchain sync to fix 'nonce too low'
-        time.sleep(random.randint(10, 60))
+        return self._wait_for_swap(self._send_swap_transaction(tx))
+
+    def _simulate_swap(self, tx: TxParams) -> bool:
+        """ Method that simulates the swap and returns False if it would revert """
+
+        route = ('stargate', self.src_network.name, self.dst_network.name, self.src_stablecoin.symbol,
+                 self.dst_stablecoin.symbol)
+        revert_reason = self.src_network.simulate_transaction(tx, route)
+        if revert_reason is None:
+            return True
 
-        tx_hash = self._send_swap_transaction()
+        # The cached allowance could be stale and make the swap revert. The next attempt reads it on-chain
+        self.src_network.record_allowance_spend(self.src_stablecoin.contract_address, self.account.address,
+                                                self.src_network.stargate_router_address, self.amount, False)
+
+        logger.error(f"Stargate swap simulation failed: {revert_reason}. The swap is skipped")
+        return False
+
+    def _wait_for_swap(self, tx_hash: HexBytes) -> bool:
         result = self.src_network.wait_for_transaction(tx_hash)
 
-        return self.src_network.check_tx_result(result, "Stargate swap")
+        return self._check_swap_result(result)
+
+    def _check_swap_result(self, result: TransactionStatus) -> bool:
+        succeed = self.src_network.check_tx_result(result, "Stargate swap")
+        if result != TransactionStatus.NOT_FOUND:
+            self.src_network.record_allowance_spend(self.src_stablecoin.contract_address, self.account.address,
+                                                    self.src_network.stargate_router_address, self.amount, succeed)
 
-    def _send_swap_transaction(self) -> HexBytes:
+        return succeed
+
+    def _send_swap_transaction(self, tx: TxParams) -> HexBytes:
         """ Utility method that signs and sends tx - Swap src_pool_id token from src_network chain to dst_chain_id """
 
-        tx = StargateUtils.build_swap_transaction(self.account.address, self.src_network, self.dst_network,
-                                                  self.src_stablecoin, self.dst_stablecoin, self.amount, self.slippage)
-        signed_tx = self.src_network.w3.eth.account.sign_transaction(tx, self.account.key)
-        tx_hash = self.src_network.w3.eth.send_raw_transaction(signed_tx.rawTransaction)
+        tx_hash = self.src_network.sign_and_send_transaction(tx, self.account.key, 'swap')
 
         logger.info(f'Stargate swap transaction signed and sent. Hash: {tx_hash.hex()}')
 
@@ -175,16 +242,22 @@ class StargateBridgeHelper:
 
         return True
 
-    def _approve_stablecoin_usage(self, amount: int) -> bool:
-        allowance = self.src_network.get_token_allowance(self.src_stablecoin.contract_address, self.account.address,
-                                                         self.src_network.stargate_router_address)
-        if allowance >= amount:
-            return True
+    def _is_approval_required(self) -> bool:
+        return self.src_network.is_approval_required(self.src_stablecoin.contract_address, self.account.address,
+                                                     self.src_network.stargate_router_address, self.amount)
+
+    def _make_bridge_with_approval(self) -> bool:
+        """ Method that sends the approve and the swap transactions together """
 
         logger.debug(f'Approving {self.src_stablecoin.symbol} usage to perform Stargate bridge')
 
-        tx_hash = self.src_network.approve_token_usage(self.account.key, self.src_stablecoin.contract_address,
-                                                       self.src_network.stargate_router_address, amount)
-        result = self.src_network.wait_for_transaction(tx_hash)
+        result = self.src_network.send_approval_bundle(
+            self.account.key, self.src_stablecoin.contract_address, self.src_network.stargate_router_address,
+            self.amount,
+            lambda nonce: StargateUtils.build_swap_transaction(self.account.address, self.src_network,
+                                                               self.dst_network, self.src_stablecoin,
+                                                               self.dst_stablecoin, self.amount, self.slippage,
+                                                               nonce),
+            'swap')
 
-        return self.src_network.check_tx_result(result, f"Approve {self.src_stablecoin.symbol} usage")
+        return self._check_swap_result(result)
@@ -0,0 +1,45 @@
+import threading
+
+import logic.account_runner as account_runner
+from config import BridgerMode, RefuelMode, RunnerSettings
+from logic.account_runner import AccountRunner
+
+MAX_ACTIVE_ACCOUNTS = 2
+
+
+class FakeAccountThread(threading.Thread):
+    """ Account that runs for a moment. Counts the started and finished accounts """
+
+    started = 0
+    finished = 0
+    lock = threading.Lock()
+
+    def __init__(self, account_id, private_key, bridger_mode, refuel_mode, bridges_limit, bridge_limiter,
+                 checkpoint_store) -> None:
+        super().__init__(daemon=True)
+        with FakeAccountThread.lock:
+            FakeAccountThread.started += 1
+
+    def run(self) -> None:
+        threading.Event().wait(0.2)
+        with FakeAccountThread.lock:
+            FakeAccountThread.finished += 1
+
+
+def test_accounts_are_started_lazily_with_a_bounded_active_set(monkeypatch):
+    monkeypatch.setattr(account_runner, 'AccountThread', FakeAccountThread)
+    monkeypatch.setattr(RunnerSettings, 'SLOT_POLL_INTERVAL', 0.05)
+    active_on_read = []
+
+    def private_keys():
+        for account_id in range(5):
+            # The next key is read only when the active set has a free slot
+            with FakeAccountThread.lock:
+                active_on_read.append(FakeAccountThread.started - FakeAccountThread.finished)
+            yield account_id, '1' * 64
+
+    runner = AccountRunner(BridgerMode.STARGATE, RefuelMode.MANUAL, 3, max_active_accounts=MAX_ACTIVE_ACCOUNTS)
+    runner.run(private_keys())
+
+    assert FakeAccountThread.finished == 5
+    assert max(active_on_read) < MAX_ACTIVE_ACCOUNTS
@@ -0,0 +1,117 @@
+import pytest
+import requests
+
+import logic.account_thread as account_thread
+from config import BridgerMode, RefuelMode
+from logic.account_thread import AccountThread
+from logic.state import State, RPC_RETRY_POLICY
+from network.arrival_tracker import ArrivalTracker
+from network.transaction_journal import TransactionJournal
+
+PRIVATE_KEY = '0x' + '1' * 64
+
+
+class BalanceCheckState(State):
+    """ Reset state of the tests. It ends the state loop """
+
+    def handle(self, thread) -> None:
+        thread.stop()
+
+
+class FailingBridgeState(State):
+    retry_policy = RPC_RETRY_POLICY
+    sends_bridge = True
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def handle(self, thread) -> None:
+        self.calls += 1
+        if self.calls > 1:
+            thread.stop()
+            return
+        raise requests.exceptions.ConnectionError("Connection reset")
+
+
+class FailingArrivalState(State):
+    waits_for_arrival = True
+
+    def handle(self, thread) -> None:
+        raise requests.exceptions.ConnectionError("Connection reset")
+
+
+class FakeJournal:
+    def __init__(self, pending: list) -> None:
+        self.pending = pending
+
+    def get_pending(self, account: str) -> list:
+        return list(self.pending)
+
+
+@pytest.fixture
+def thread(monkeypatch):
+    monkeypatch.setattr(account_thread.time, 'sleep', lambda _: None)
+    monkeypatch.setattr(AccountThread, 'sleep', lambda self, _: not self.is_stopped())
+    return AccountThread(1, PRIVATE_KEY, BridgerMode.STARGATE, RefuelMode.MANUAL, 3)
+
+
+def run(thread: AccountThread, state: State) -> None:
+    thread.set_state(state)
+    thread._run_state_loop(BalanceCheckState)
+
+
+def test_bridge_state_is_not_retried_without_journal(thread, monkeypatch):
+    monkeypatch.setattr(TransactionJournal, 'get_default', staticmethod(lambda: None))
+    state = FailingBridgeState()
+
+    run(thread, state)
+
+    assert state.calls == 1
+    assert isinstance(thread.state, BalanceCheckState)
+
+
+def test_bridge_state_is_retried_when_nothing_was_sent(thread, monkeypatch):
+    monkeypatch.setattr(TransactionJournal, 'get_default', staticmethod(lambda: FakeJournal([])))
+    state = FailingBridgeState()
+
+    run(thread, state)
+
+    assert state.calls == 2
+
+
+def test_sent_bridge_is_awaited_instead_of_retried(thread, monkeypatch):
+    journal = FakeJournal(['bridge'])
+    monkeypatch.setattr(TransactionJournal, 'get_default', staticmethod(lambda: journal))
+
+    def reconcile() -> bool:
+        journal.pending = []
+        return True
+
+    monkeypatch.setattr(thread, '_reconcile_transactions', reconcile)
+    state = FailingBridgeState()
+
+    run(thread, state)
+
+    assert state.calls == 1
+    assert isinstance(thread.state, BalanceCheckState)
+
+
+def test_unknown_sent_bridge_resets_the_account(thread, monkeypatch):
+    monkeypatch.setattr(TransactionJournal, 'get_default', staticmethod(lambda: FakeJournal(['bridge'])))
+    monkeypatch.setattr(thread, '_reconcile_transactions', lambda: False)
+    state = FailingBridgeState()
+
+    run(thread, state)
+
+    assert state.calls == 1
+    assert isinstance(thread.state, BalanceCheckState)
+
+
+def test_reset_cancels_the_tracked_arrival(thread, monkeypatch):
+    cancelled = []
+    monkeypatch.setattr(ArrivalTracker, 'cancel', lambda self, address: cancelled.append(address))
+
+    run(thread, FailingArrivalState())
+
+    assert cancelled == [thread.account.address]
+    assert isinstance(thread.state, BalanceCheckState)
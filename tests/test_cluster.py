@@ -0,0 +1,155 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import cluster.worker
+from cluster import Coordinator, AccountRoster, Worker
+from config import BridgerMode, RefuelMode, ClusterSettings, CheckpointSettings
+from utility import KeyFileSource
+
+BRIDGES_LIMIT = 3
+LEASE_TIMEOUT = 1  # seconds
+
+
+class FakeAccountThread(threading.Thread):
+    """ Account that bridges nothing. The test sets its progress and finishes it """
+
+    instances = []
+
+    def __init__(self, account_id, private_key, bridger_mode, refuel_mode, bridges_limit, bridge_limiter,
+                 remaining_bridges, checkpoint_store) -> None:
+        super().__init__(daemon=True)
+        self.account_id = account_id
+        self.remaining_bridges = remaining_bridges
+        self.worker_thread = threading.current_thread()
+        self._done = threading.Event()
+        FakeAccountThread.instances.append(self)
+
+    def run(self) -> None:
+        self._done.wait()
+
+    def stop(self) -> None:
+        self._done.set()
+
+    def is_stopped(self) -> bool:
+        return self._done.is_set()
+
+    def finish(self, remaining_bridges) -> None:
+        self.remaining_bridges = remaining_bridges
+        self._done.set()
+
+
+def wait_until(condition, timeout: float = 10) -> None:
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("Condition wasn't met in time")
+        time.sleep(0.05)
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def key_file(tmp_path):
+    path = tmp_path / 'private_keys.txt'
+    path.write_text(f"{'1' * 64}\n{'2' * 64}\n")
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def fast_cluster(monkeypatch):
+    FakeAccountThread.instances = []
+    monkeypatch.setattr(cluster.worker, 'AccountThread', FakeAccountThread)
+    monkeypatch.setattr(ClusterSettings, 'HEARTBEAT_INTERVAL', 0.1)
+    monkeypatch.setattr(ClusterSettings, 'LEASE_POLL_INTERVAL', 0.1)
+    monkeypatch.setattr(CheckpointSettings, 'DB_PATH', '')
+    monkeypatch.setattr(Coordinator, 'STATS_INTERVAL', 0.1)
+
+
+def start_thread(target, name: str) -> threading.Thread:
+    thread = threading.Thread(target=target, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_coordinator_reassigns_expired_lease_with_last_progress(key_file):
+    address = ('127.0.0.1', get_free_port())
+    authkey = b'test'
+
+    with KeyFileSource(key_file) as private_keys:
+        coordinator = Coordinator(address, authkey, private_keys, BridgerMode.STARGATE, RefuelMode.MANUAL,
+                                  BRIDGES_LIMIT)
+        coordinator.roster = AccountRoster(private_keys, BRIDGES_LIMIT, LEASE_TIMEOUT)
+        coordinator_thread = start_thread(coordinator.run, "Coordinator")
+        time.sleep(0.2)
+
+        first_worker, second_worker = Worker(address, authkey, 1), Worker(address, authkey, 1)
+        start_thread(first_worker.run, "FirstWorker")
+        second_worker_thread = start_thread(second_worker.run, "SecondWorker")
+
+        # Lease handout: one account per worker
+        wait_until(lambda: len(FakeAccountThread.instances) == 2)
+        first_account, second_account = sorted(FakeAccountThread.instances,
+                                               key=lambda account: account.worker_thread.name)
+        assert first_account.worker_thread.name == "FirstWorker"
+        assert {first_account.account_id, second_account.account_id} == {0, 1}
+        assert first_account.remaining_bridges == second_account.remaining_bridges == BRIDGES_LIMIT
+        assert coordinator.roster.get_stats()['leased'] == 2
+
+        # Heartbeats report the progress and keep the lease past its timeout
+        first_account.remaining_bridges = 1
+        time.sleep(LEASE_TIMEOUT * 2)
+        assert len(FakeAccountThread.instances) == 2
+        assert coordinator.roster.get_stats()['leased'] == 2
+
+        # The first worker stops sending heartbeats, its lease expires
+        first_worker._finished.set()
+        second_account.finish(0)
+
+        wait_until(lambda: len(FakeAccountThread.instances) == 3)
+        reassigned = FakeAccountThread.instances[2]
+        assert reassigned.worker_thread.name == "SecondWorker"
+        assert reassigned.account_id == first_account.account_id
+        assert reassigned.remaining_bridges == 1
+
+        reassigned.finish(0)
+        second_worker_thread.join(10)
+        coordinator_thread.join(10)
+        first_account.stop()
+
+        assert not second_worker_thread.is_alive()
+        assert not coordinator_thread.is_alive()
+        assert coordinator.roster.get_stats()['completed'] == 2
+
+
+class UnreachableRoster:
+    def heartbeat(self, worker_id, progress):
+        raise EOFError("Coordinator closed the connection")
+
+
+def test_worker_stops_accounts_when_heartbeats_fail(monkeypatch):
+    monkeypatch.setattr(ClusterSettings, 'LEASE_TIMEOUT', 0.5)
+    worker = Worker(('127.0.0.1', get_free_port()), b'test', 1)
+    account = FakeAccountThread(0, '1' * 64, None, None, BRIDGES_LIMIT, None, BRIDGES_LIMIT, None)
+    account.start()
+    worker._accounts[0] = account
+
+    heartbeat_thread = start_thread(lambda: worker._heartbeat_loop(UnreachableRoster()), "Heartbeat")
+
+    # Missed heartbeats shorter than the lease timeout don't stop the accounts
+    time.sleep(0.3)
+    assert account.is_alive()
+
+    account.join(5)
+    assert not account.is_alive()
+    # Leases are handed out again only long after the worker stops its accounts
+    assert ClusterSettings.RELEASE_TIMEOUT > ClusterSettings.LEASE_TIMEOUT * 5
+
+    worker._finished.set()
+    heartbeat_thread.join(5)
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+from network.deposit_watcher import DepositSubscription, DepositWatcher, TRANSFER_EVENT_TOPIC, _Watch
+
+ADDRESS = '0x' + '1' * 40
+TOKEN = Web3.to_checksum_address('0x' + '2' * 40)
+
+
+class FakeNetwork:
+    """ Network with one transfer to ADDRESS in block 2500. Records the eth_getLogs block ranges """
+
+    name = 'Arbitrum'
+
+    def __init__(self) -> None:
+        self.ranges = []
+        self.w3 = SimpleNamespace(eth=self)
+
+    def get_logs(self, params: dict) -> list:
+        self.ranges.append((params['fromBlock'], params['toBlock']))
+        if not params['fromBlock'] <= 2500 <= params['toBlock']:
+            return []
+
+        recipient = HexBytes('0x' + '0' * 24 + ADDRESS[2:])
+        return [{'address': TOKEN, 'data': (100).to_bytes(32, 'big'), 'blockNumber': 2500,
+                 'topics': [HexBytes(TRANSFER_EVENT_TOPIC), HexBytes(bytes(32)), recipient]}]
+
+
+def test_range_behind_the_head_is_scanned_in_chunks(monkeypatch):
+    monkeypatch.setattr(DepositWatcher, 'MAX_BLOCK_RANGE', 1000)
+    network = FakeNetwork()
+    subscription = DepositSubscription(ADDRESS)
+    watch = _Watch(subscription, {TOKEN}, next_block=100)
+    late_watch = _Watch(DepositSubscription('0x' + '3' * 40), {TOKEN}, next_block=2000)
+
+    DepositWatcher(network)._scan_transfers([watch, late_watch], 3000)
+
+    assert network.ranges == [(100, 1099), (1100, 2099), (2100, 3000)]
+    assert [deposit.amount for deposit in subscription.deposits] == [100]
+    assert watch.next_block == late_watch.next_block == 3001
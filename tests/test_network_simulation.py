@@ -0,0 +1,77 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from web3.exceptions import ContractLogicError
+
+from network.network import EVMNetwork
+
+ROUTE = ('stargate', 'Arbitrum', 'Optimism')
+TX = {'from': '0x' + '1' * 40, 'to': '0x' + '2' * 40, 'data': '0x1234', 'value': 0, 'nonce': 1, 'chainId': 42161}
+
+
+class FakeEth:
+    """ eth module of web3 that raises the queued errors in eth_call and counts the calls """
+
+    def __init__(self, *errors) -> None:
+        self.errors = list(errors)
+        self.calls = 0
+
+    def call(self, tx, block_identifier):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return b''
+
+
+def create_network(eth: FakeEth) -> EVMNetwork:
+    network = EVMNetwork('Arbitrum', 'ETH', 'http://127.0.0.1:1', 110, '0x' + '3' * 40, {})
+    network.w3 = SimpleNamespace(eth=eth)
+    network._block_number = (100, time.time() + 3600)
+    return network
+
+
+def test_successful_simulation_is_cached_for_the_block():
+    eth = FakeEth()
+    network = create_network(eth)
+
+    assert network.simulate_transaction(TX, ROUTE) is None
+    assert network.simulate_transaction(TX, ROUTE) is None
+    assert eth.calls == 1
+
+
+def test_revert_is_cached_for_the_block():
+    eth = FakeEth(ContractLogicError("execution reverted: Stargate: slippage too high"))
+    network = create_network(eth)
+
+    assert 'slippage too high' in network.simulate_transaction(TX, ROUTE)
+    assert 'slippage too high' in network.simulate_transaction(TX, ROUTE)
+    assert eth.calls == 1
+
+
+def test_undecoded_revert_is_a_revert():
+    eth = FakeEth(ValueError({'code': 3, 'message': 'execution reverted', 'data': '0x08c379a0'}))
+    network = create_network(eth)
+
+    assert 'execution reverted' in network.simulate_transaction(TX, ROUTE)
+
+
+def test_node_error_is_raised_and_not_cached():
+    eth = FakeEth(ValueError({'code': -32000, 'message': 'header not found'}))
+    network = create_network(eth)
+
+    with pytest.raises(ValueError, match='header not found'):
+        network.simulate_transaction(TX, ROUTE)
+
+    assert network.simulate_transaction(TX, ROUTE) is None
+    assert eth.calls == 2
+
+
+def test_cached_results_expire_with_the_block():
+    eth = FakeEth(ContractLogicError("execution reverted"))
+    network = create_network(eth)
+
+    assert network.simulate_transaction(TX, ROUTE) is not None
+    network._block_number = (101, time.time() + 3600)
+    assert network.simulate_transaction(TX, ROUTE) is None
+    assert eth.calls == 2
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+import websockets
+
+from config import ExchangeSettings
+from exchange.exchange import WithdrawStatus
+from exchange.okex.okex import Okex
+from exchange.okex.constants import OkexConstants
+from exchange.okex.withdrawal_stream import OkexWithdrawalStream
+from utility.metadata_snapshot import MetadataSnapshot
+
+
+class OkexStandIn:
+    """ Local websockets server that answers the login and subscribe requests like the OKX business channel
+    and pushes the withdrawal updates queued by the test """
+
+    def __init__(self) -> None:
+        self.requests = []
+        self.connections = 0
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._pushes = None
+        self._ready = threading.Event()
+
+    def start(self) -> None:
+        threading.Thread(target=self._loop.run_until_complete, args=(self._serve(),), daemon=True).start()
+        assert self._ready.wait(5)
+
+    async def _serve(self) -> None:
+        self._pushes = asyncio.Queue()
+        async with websockets.serve(self._handle, '127.0.0.1', 0) as server:
+            self.port = next(iter(server.sockets)).getsockname()[1]
+            self._ready.set()
+            await asyncio.Future()
+
+    async def _handle(self, ws, path=None) -> None:
+        self.connections += 1
+
+        for _ in range(2):
+            request = json.loads(await ws.recv())
+            self.requests.append(request)
+            await ws.send(json.dumps({'event': request['op'], 'code': '0'}))
+
+        while True:
+            message = await self._pushes.get()
+            if message is None:
+                await ws.close()
+                return
+            await ws.send(message)
+
+    def push(self, withdraw_id: str, state: str) -> None:
+        message = json.dumps({'arg': {'channel': OkexWithdrawalStream.CHANNEL},
+                              'data': [{'wdId': withdraw_id, 'state': state}]})
+        self._loop.call_soon_threadsafe(self._pushes.put_nowait, message)
+
+    def disconnect(self) -> None:
+        self._loop.call_soon_threadsafe(self._pushes.put_nowait, None)
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    server = OkexStandIn()
+    server.start()
+
+    url = f"ws://127.0.0.1:{server.port}"
+    monkeypatch.setenv('OKEX_WS_URL', url)
+    monkeypatch.setattr(OkexConstants, 'WS_BUSINESS_URL', url)
+    monkeypatch.setattr(ExchangeSettings, 'WITHDRAWAL_STREAM', True)
+    # Only the pushes may finish the withdrawals
+    monkeypatch.setattr(ExchangeSettings, 'WITHDRAW_POLL_INTERVAL', 3600)
+    monkeypatch.setattr(MetadataSnapshot, 'PATH', '')
+
+    return server
+
+
+def test_withdrawal_updates_are_pushed_to_the_tracker(stand_in):
+    okex = Okex('api-key', 'secret-key', 'password')
+    okex._start_withdrawal_stream()
+    stream = okex._withdrawal_stream
+    assert stream.connected.wait(5)
+
+    # Login and subscription
+    login, subscribe = stand_in.requests
+    assert login['op'] == 'login'
+    assert login['args'][0]['apiKey'] == 'api-key'
+    assert login['args'][0]['passphrase'] == 'password'
+    assert subscribe == {'op': 'subscribe', 'args': [{'channel': 'withdrawal-info'}]}
+
+    # Push received before wait() is buffered
+    stand_in.push('1', '2')
+    deadline = time.time() + 5
+    while '1' not in okex._withdraw_tracker._early_pushes and time.time() < deadline:
+        time.sleep(0.05)
+    assert okex._withdraw_tracker.wait('1', 5) == WithdrawStatus.FINISHED
+
+    # Push wakes the waiter
+    threading.Timer(0.5, stand_in.push, args=('2', '-2')).start()
+    start_time = time.time()
+    assert okex._withdraw_tracker.wait('2', 5) == WithdrawStatus.CANCELED
+    assert time.time() - start_time < 3
+
+    # Reconnect after the server closes the connection
+    stand_in.disconnect()
+    deadline = time.time() + 10
+    while stand_in.connections < 2 and time.time() < deadline:
+        time.sleep(0.05)
+    assert stream.connected.wait(5)
+    assert [request['op'] for request in stand_in.requests] == ['login', 'subscribe', 'login', 'subscribe']
+
+    stand_in.push('3', '2')
+    assert okex._withdraw_tracker.wait('3', 5) == WithdrawStatus.FINISHED
@@ -0,0 +1,25 @@
+import numpy as np
+
+from config import BridgerMode
+from logic.refuel_planner import RefuelPlanner
+
+
+def create_planner(networks: list) -> RefuelPlanner:
+    planner = RefuelPlanner(BridgerMode.STARGATE, 3)
+    planner.networks = networks
+    return planner
+
+
+def test_single_network_has_no_refuels():
+    planner = create_planner(['Arbitrum'])
+
+    assert planner.plan([(0, '0x' + '1' * 40)]) == []
+    assert not planner.get_expected_bridges(np.array([[100.0]])).any()
+
+
+def test_bridges_alternate_between_the_networks():
+    planner = create_planner(['Arbitrum', 'Optimism'])
+
+    expected = planner.get_expected_bridges(np.array([[100.0, 0], [0, 0]]))
+
+    assert expected.tolist() == [[2, 1], [0, 0]]
@@ -0,0 +1,78 @@
+import pytest
+from ccxt.base.errors import RequestTimeout
+
+from base.errors import ExchangeError
+from exchange.exchange import RefuelQuote
+from exchange.factory import ExchangeFactory
+from exchange.refuel_router import RefuelRouter
+
+
+class FakeExchange:
+    def __init__(self, name: str, latency: float, reserve_error: Exception = None,
+                 withdraw_error: Exception = None) -> None:
+        self.name = name
+        self.latency = latency
+        self.reserve_error = reserve_error
+        self.withdraw_error = withdraw_error
+        self.withdrawals = []
+
+    def is_withdraw_supported(self, symbol: str, network: str) -> bool:
+        return True
+
+    def get_refuel_quote(self, symbol: str, network: str) -> RefuelQuote:
+        return RefuelQuote(self.name, 0.001, 0.01, 100, self.latency)
+
+    def reserve_refuel(self, symbol: str, amount: float, network: str) -> float:
+        if self.reserve_error:
+            raise self.reserve_error
+        return amount
+
+    def withdraw_reserved(self, symbol: str, amount: float, network: str, address: str) -> None:
+        self.withdrawals.append((symbol, amount, network, address))
+        if self.withdraw_error:
+            raise self.withdraw_error
+
+
+@pytest.fixture
+def exchanges(monkeypatch):
+    exchanges = {}
+    monkeypatch.setattr(ExchangeFactory, 'create', staticmethod(lambda name: exchanges[name]))
+    return exchanges
+
+
+def test_refuel_is_routed_to_the_fastest_exchange(exchanges):
+    exchanges['okex'] = FakeExchange('okex', 300)
+    exchanges['binance'] = FakeExchange('binance', 60)
+
+    RefuelRouter(['okex', 'binance']).buy_token_and_withdraw('ETH', 0.01, 'Arbitrum', '0xaddress')
+
+    assert exchanges['binance'].withdrawals == [('ETH', 0.01, 'Arbitrum', '0xaddress')]
+    assert not exchanges['okex'].withdrawals
+
+
+def test_next_exchange_is_used_if_nothing_was_withdrawn(exchanges):
+    exchanges['binance'] = FakeExchange('binance', 60, reserve_error=ExchangeError("Market is closed"))
+    exchanges['okex'] = FakeExchange('okex', 300)
+
+    RefuelRouter(['okex', 'binance']).buy_token_and_withdraw('ETH', 0.01, 'Arbitrum', '0xaddress')
+
+    assert not exchanges['binance'].withdrawals
+    assert len(exchanges['okex'].withdrawals) == 1
+
+
+def test_failed_withdrawal_request_is_not_sent_to_another_exchange(exchanges):
+    exchanges['binance'] = FakeExchange('binance', 60, withdraw_error=RequestTimeout("Read timed out"))
+    exchanges['okex'] = FakeExchange('okex', 300)
+
+    with pytest.raises(RequestTimeout):
+        RefuelRouter(['okex', 'binance']).buy_token_and_withdraw('ETH', 0.01, 'Arbitrum', '0xaddress')
+
+    assert len(exchanges['binance'].withdrawals) == 1
+    assert not exchanges['okex'].withdrawals
+
+
+def test_last_error_is_raised_if_all_exchanges_fail(exchanges):
+    exchanges['binance'] = FakeExchange('binance', 60, reserve_error=ExchangeError("Not enough balance"))
+
+    with pytest.raises(ExchangeError, match="Not enough balance"):
+        RefuelRouter(['binance']).buy_token_and_withdraw('ETH', 0.01, 'Arbitrum', '0xaddress')
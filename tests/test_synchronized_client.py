@@ -0,0 +1,42 @@
+from exchange.binance.constants import BinanceConstants
+from exchange.exchange import RequestWeightLimiter, SynchronizedClient
+
+
+class FakeClient:
+    """ ccxt client whose API methods load the markets implicitly, like ccxt does """
+
+    def __init__(self) -> None:
+        self.markets = None
+        self.last_response_headers = {}
+        self.loads = 0
+
+    def load_markets(self, reload=False):
+        if reload or not self.markets:
+            self.loads += 1
+            self.markets = {'ETH/USDT': {}}
+        return self.markets
+
+    def fetch_ticker(self, symbol: str) -> dict:
+        self.load_markets()
+        return {'last': 1800}
+
+
+class RecordingLimiter(RequestWeightLimiter):
+    def __init__(self) -> None:
+        super().__init__(BinanceConstants.REQUEST_LIMITS, BinanceConstants.REQUEST_WEIGHTS)
+        self.acquired = []
+
+    def acquire(self, method: str) -> None:
+        self.acquired.append(method)
+        super().acquire(method)
+
+
+def test_implicit_market_load_is_weighted():
+    client, limiter = FakeClient(), RecordingLimiter()
+    synchronized = SynchronizedClient(client, limiter)
+
+    synchronized.fetch_ticker('ETH/USDT')
+    synchronized.fetch_ticker('ETH/USDT')
+
+    assert limiter.acquired == ['load_markets', 'fetch_ticker', 'fetch_ticker']
+    assert client.loads == 1
@@ -0,0 +1,114 @@
+import time
+
+from hexbytes import HexBytes
+
+from network.network import TransactionStatus
+from network.transaction_journal import TransactionJournal, JournalStatus
+
+ACCOUNT = '0x' + '1' * 40
+
+
+def record(journal: TransactionJournal, tx_hash: str, network: str = 'Arbitrum', nonce: int = 0) -> None:
+    journal.record(tx_hash, ACCOUNT, network, nonce, '0x00', 'swap')
+
+
+def read_records(path) -> int:
+    with open(path) as file:
+        return len(file.readlines())
+
+
+class FakeNetwork:
+    """ Network that mines the listed transactions. Records the waits for the receipts """
+
+    def __init__(self, mined: set, nonce: int = 0) -> None:
+        self.mined = mined
+        self.nonce = nonce
+        self.waits = []
+        self.w3 = self
+
+    @property
+    def eth(self):
+        return self
+
+    def send_raw_transaction(self, raw_transaction) -> None:
+        pass
+
+    def get_nonce(self, address: str) -> int:
+        return self.nonce
+
+    def is_transaction_mined(self, tx_hash: str) -> bool:
+        return tx_hash in self.mined
+
+    def wait_for_transactions(self, tx_hashes: list, timeout: int = 300) -> list:
+        self.waits.append((len(tx_hashes), timeout))
+        return [TransactionStatus.SUCCESS if HexBytes(tx_hash).hex() in self.mined else TransactionStatus.NOT_FOUND
+                for tx_hash in tx_hashes]
+
+    def check_tx_result(self, result: TransactionStatus, name: str) -> bool:
+        return result == TransactionStatus.SUCCESS
+
+
+def test_pending_entries_are_replayed_and_resolved_ones_compacted(tmp_path):
+    path = tmp_path / 'transactions.journal'
+    journal = TransactionJournal(str(path))
+    record(journal, 'aa')
+    record(journal, 'bb', nonce=1)
+    journal.resolve('aa', JournalStatus.CONFIRMED)
+    assert read_records(path) == 3
+
+    reopened = TransactionJournal(str(path))
+
+    assert [entry.tx_hash for entry in reopened.get_pending(ACCOUNT)] == ['bb']
+    assert read_records(path) == 1
+
+
+def test_journal_is_compacted_at_the_record_threshold(tmp_path, monkeypatch):
+    monkeypatch.setattr(TransactionJournal, 'COMPACT_RECORDS', 4)
+    path = tmp_path / 'transactions.journal'
+    journal = TransactionJournal(str(path))
+
+    record(journal, 'aa')
+    for nonce, tx_hash in enumerate(['bb', 'cc'], 1):
+        record(journal, tx_hash, nonce=nonce)
+        journal.resolve(tx_hash, JournalStatus.CONFIRMED)
+
+    assert read_records(path) == 1
+
+    # New records are appended to the compacted journal
+    record(journal, 'dd', nonce=3)
+    assert [entry.tx_hash for entry in TransactionJournal(str(path)).get_pending(ACCOUNT)] == ['aa', 'dd']
+
+
+def test_reconcile_waits_for_the_pending_transactions_together(tmp_path, monkeypatch):
+    monkeypatch.setattr(TransactionJournal, 'RECONCILE_TIMEOUT', 100)
+    journal = TransactionJournal(str(tmp_path / 'transactions.journal'))
+    for nonce, tx_hash in enumerate(['0xaa', '0xbb', '0xcc']):
+        record(journal, tx_hash, nonce=nonce)
+    record(journal, '0xdd', network='Optimism')
+
+    arbitrum = FakeNetwork({'aa', 'bb'})
+    optimism = FakeNetwork(set())
+
+    def slow_wait(tx_hashes, timeout=300):
+        time.sleep(1)
+        return FakeNetwork.wait_for_transactions(arbitrum, tx_hashes, timeout)
+
+    monkeypatch.setattr(arbitrum, 'wait_for_transactions', slow_wait)
+    confirmed = journal.reconcile(ACCOUNT, {'Arbitrum': arbitrum, 'Optimism': optimism})
+
+    assert [entry.tx_hash for entry in confirmed] == ['0xaa', '0xbb']
+    assert len(arbitrum.waits) == len(optimism.waits) == 1
+    (arbitrum_count, arbitrum_timeout), (optimism_count, optimism_timeout) = arbitrum.waits[0], optimism.waits[0]
+    assert (arbitrum_count, optimism_count) == (3, 1)
+    # The networks share the deadline
+    assert optimism_timeout < arbitrum_timeout <= 100
+
+
+def test_reconcile_drops_transactions_with_a_used_nonce(tmp_path):
+    journal = TransactionJournal(str(tmp_path / 'transactions.journal'))
+    record(journal, '0xaa', nonce=0)
+    network = FakeNetwork(set(), nonce=1)
+
+    assert journal.reconcile(ACCOUNT, {'Arbitrum': network}) == []
+    assert not network.waits
+    assert journal.get_pending(ACCOUNT) == []
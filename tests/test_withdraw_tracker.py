@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from base.errors import WithdrawNotFound
+from exchange.exchange import WithdrawStatus, WithdrawTracker
+
+POLL_INTERVAL = 0.05
+
+
+class FakeHistory:
+    """ Withdrawal history of an exchange. Returns the listed withdrawals and counts the requests """
+
+    def __init__(self, withdrawals=None) -> None:
+        self.withdrawals = withdrawals or []
+        self.requests = 0
+
+    def __call__(self, since: int) -> list:
+        self.requests += 1
+        return list(self.withdrawals)
+
+
+@pytest.fixture(autouse=True)
+def short_grace(monkeypatch):
+    monkeypatch.setattr(WithdrawTracker, 'NOT_FOUND_GRACE', 0.3)
+
+
+def test_withdrawal_status_is_read_from_the_history():
+    tracker = WithdrawTracker('test', FakeHistory([{'id': 1, 'status': 'ok'}]), POLL_INTERVAL)
+
+    assert tracker.wait('1', 5) == WithdrawStatus.FINISHED
+
+
+def test_pending_withdrawal_times_out_with_the_last_status():
+    tracker = WithdrawTracker('test', FakeHistory([{'id': 1, 'status': 'pending'}]), POLL_INTERVAL)
+
+    assert tracker.wait('1', 0.5) == WithdrawStatus.PENDING
+
+
+def test_lagging_history_isnt_reported_as_not_found():
+    history = FakeHistory()
+    tracker = WithdrawTracker('test', history, POLL_INTERVAL)
+
+    # The withdrawal appears in the history after two polls without it
+    def appear() -> None:
+        while history.requests < 2:
+            time.sleep(0.01)
+        history.withdrawals = [{'id': 1, 'status': 'ok'}]
+
+    threading.Thread(target=appear, daemon=True).start()
+
+    assert tracker.wait('1', 5) == WithdrawStatus.FINISHED
+
+
+def test_withdrawal_missing_after_the_grace_period_is_not_found():
+    history = FakeHistory([{'id': 2, 'status': 'ok'}])
+    tracker = WithdrawTracker('test', history, POLL_INTERVAL)
+
+    with pytest.raises(WithdrawNotFound):
+        tracker.wait('1', 5)
+
+    assert history.requests >= WithdrawTracker.NOT_FOUND_MISSES
+
+
+def test_pushed_withdrawal_isnt_reported_as_not_found():
+    tracker = WithdrawTracker('test', FakeHistory(), POLL_INTERVAL)
+    tracker.push('1', WithdrawStatus.PENDING)
+
+    assert tracker.wait('1', 0.6) == WithdrawStatus.PENDING
+
+
+def test_push_before_wait_finishes_the_withdrawal():
+    history = FakeHistory()
+    tracker = WithdrawTracker('test', history, 3600)
+    tracker.push('1', WithdrawStatus.CANCELED)
+
+    assert tracker.wait('1', 5) == WithdrawStatus.CANCELED
+    assert history.requests == 0
@@ -1,2 +1,5 @@
 from utility.stablecoin import Stablecoin
 from utility.wallet import WalletHelper
+from utility.key_generator import KeyGenerator
+from utility.key_source import KeyFileSource, KeySelection
+from utility.metadata_snapshot import MetadataSnapshot
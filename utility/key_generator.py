@@ -0,0 +1,113 @@
+import logging
+import multiprocessing
+import os
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from eth_account import Account
+
+logger = logging.getLogger(__name__)
+
+# Order of the secp256k1 curve. Valid private keys are in the [1, n - 1] range
+SECP256K1_ORDER = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+
+def _generate_chunk(params: Tuple[int, bool]) -> Tuple[str, str]:
+    """ Worker function that generates a chunk of keys and returns it as ready-to-write text blocks """
+
+    size, with_addresses = params
+    keys = []
+    addresses = []
+
+    while len(keys) < size:
+        key = secrets.token_bytes(32)
+        if not 0 < int.from_bytes(key, 'big') < SECP256K1_ORDER:
+            continue
+
+        keys.append(key.hex())
+        if with_addresses:
+            addresses.append(Account.from_key(key).address)
+
+    keys_block = "\n".join(keys) + "\n"
+    addresses_block = "\n".join(addresses) + "\n" if with_addresses else ""
+
+    return keys_block, addresses_block
+
+
+@dataclass
+class GenerationReport:
+    num_keys: int
+    elapsed: float
+
+    @property
+    def keys_per_second(self) -> float:
+        return self.num_keys / self.elapsed if self.elapsed else float(self.num_keys)
+
+
+class KeyGenerator:
+    """ Multiprocess private key generator that streams keys to the file in chunks """
+
+    WRITE_BUFFER_SIZE = 1 << 20  # 1 MiB
+
+    def __init__(self, processes: Optional[int] = None, chunk_size: int = 10_000,
+                 with_addresses: bool = False) -> None:
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.with_addresses = with_addresses
+
+    @staticmethod
+    def get_addresses_filename(filename: str) -> str:
+        root, ext = os.path.splitext(filename)
+        return f"{root}_addresses{ext or '.txt'}"
+
+    def _split_into_chunks(self, num_keys: int):
+        full_chunks, remainder = divmod(num_keys, self.chunk_size)
+
+        for _ in range(full_chunks):
+            yield self.chunk_size, self.with_addresses
+        if remainder:
+            yield remainder, self.with_addresses
+
+    def generate_to_file(self, num_keys: int, filename: str) -> GenerationReport:
+        """ Method that generates num_keys private keys and appends them to the file (and addresses to
+        the sibling file if enabled). Only a few chunks are kept in memory at any time """
+
+        addresses_filename = self.get_addresses_filename(filename) if self.with_addresses else None
+        logger.info(f"Generating {num_keys} keys with {self.processes} processes. Output: {filename}")
+
+        start_time = time.time()
+        generated = 0
+        last_report_time = start_time
+
+        addresses_file = open(addresses_filename, 'a', buffering=self.WRITE_BUFFER_SIZE) if addresses_filename \
+            else None
+        try:
+            with open(filename, 'a', buffering=self.WRITE_BUFFER_SIZE) as keys_file, \
+                    multiprocessing.Pool(self.processes) as pool:
+                chunks = self._split_into_chunks(num_keys)
+
+                for keys_block, addresses_block in pool.imap_unordered(_generate_chunk, chunks):
+                    keys_file.write(keys_block)
+                    if addresses_file:
+                        addresses_file.write(addresses_block)
+
+                    generated += keys_block.count("\n")
+
+                    now = time.time()
+                    if now - last_report_time >= 1:
+                        logger.info(f"Generated {generated}/{num_keys} keys. "
+                                    f"Throughput: {int(generated / (now - start_time))} keys/s")
+                        last_report_time = now
+        finally:
+            if addresses_file:
+                addresses_file.close()
+
+        report = GenerationReport(generated, time.time() - start_time)
+        logger.info(f"{report.num_keys} keys generated in {round(report.elapsed, 2)} seconds. "
+                    f"Throughput: {int(report.keys_per_second)} keys/s")
+        if addresses_filename:
+            logger.info(f"Addresses saved to {addresses_filename}")
+
+        return report
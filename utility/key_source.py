@@ -0,0 +1,143 @@
+import mmap
+import os
+from array import array
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+
+@dataclass
+class KeySelection:
+    """ Subset of key file lines. Range is applied first, then the shard is taken from the range """
+
+    start: int = 0
+    end: Optional[int] = None
+    shard_index: int = 0
+    shard_count: int = 1
+
+    @staticmethod
+    def parse(key_range: Optional[str] = None, shard: Optional[str] = None) -> 'KeySelection':
+        """ Method that builds selection from CLI values like '--range 100:200' and '--shard 0/4' """
+
+        selection = KeySelection()
+
+        if key_range:
+            start, sep, end = key_range.partition(':')
+            if not sep:
+                raise ValueError(f"Incorrect range: {key_range}. Expected format is start:end")
+            selection.start = int(start) if start else 0
+            selection.end = int(end) if end else None
+
+        if shard:
+            index, sep, count = shard.partition('/')
+            if not sep:
+                raise ValueError(f"Incorrect shard: {shard}. Expected format is i/n")
+            selection.shard_index = int(index)
+            selection.shard_count = int(count)
+
+        selection.validate()
+
+        return selection
+
+    def split(self, index: int, count: int) -> 'KeySelection':
+        """ Method that returns index-th of count equal parts of the selection """
+
+        return KeySelection(self.start, self.end,
+                            self.shard_index + index * self.shard_count, self.shard_count * count)
+
+    def validate(self) -> None:
+        if self.start < 0 or (self.end is not None and self.end < self.start):
+            raise ValueError(f"Incorrect range: {self.start}:{self.end}")
+        if self.shard_count <= 0 or not 0 <= self.shard_index < self.shard_count:
+            raise ValueError(f"Incorrect shard: {self.shard_index}/{self.shard_count}")
+
+
+class KeyFileSource:
+    """ Lazy private key source over a memory-mapped key file. Only line offsets are kept in memory,
+    the keys themselves are decoded when they are requested """
+
+    def __init__(self, file_path: str, selection: Optional[KeySelection] = None) -> None:
+        self.file_path = file_path
+        self.selection = selection or KeySelection()
+
+        self._file = open(file_path, 'rb')
+        if os.fstat(self._file.fileno()).st_size:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._mm = None
+
+        self._offsets = array('Q')  # Start offsets of non-empty lines
+        self._index_lines()
+
+        self._start = min(self.selection.start, len(self._offsets))
+        self._end = len(self._offsets) if self.selection.end is None \
+            else min(self.selection.end, len(self._offsets))
+
+    def __enter__(self) -> 'KeyFileSource':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._mm:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def _index_lines(self) -> None:
+        if not self._mm:
+            return
+
+        mm = self._mm
+        size = len(mm)
+        pos = 0
+
+        while pos < size:
+            end = mm.find(b'\n', pos)
+            if end == -1:
+                end = size
+
+            if mm[pos:end].strip():
+                self._offsets.append(pos)
+            pos = end + 1
+
+    def __len__(self) -> int:
+        total = max(self._end - self._start, 0)
+        index, count = self.selection.shard_index, self.selection.shard_count
+
+        return (total - index + count - 1) // count if total > index else 0
+
+    def _line_index(self, position: int) -> int:
+        """ Maps position inside the selection to the line number inside the file """
+
+        return self._start + self.selection.shard_index + position * self.selection.shard_count
+
+    def get_account_id(self, position: int) -> int:
+        """ Account id is the key position in the whole file, so it stays the same no matter how the file is split """
+
+        return self._line_index(position)
+
+    def _read_line(self, line_index: int) -> str:
+        start = self._offsets[line_index]
+        end = self._mm.find(b'\n', start)
+        if end == -1:
+            end = len(self._mm)
+
+        return self._mm[start:end].decode().strip()
+
+    def __getitem__(self, position: int) -> str:
+        if not 0 <= position < len(self):
+            raise IndexError(f"Key position {position} is out of the selection")
+
+        return self._read_line(self._line_index(position))
+
+    def items(self) -> Iterator[Tuple[int, str]]:
+        """ Yields (account_id, private_key) pairs """
+
+        for position in range(len(self)):
+            line_index = self._line_index(position)
+            yield line_index, self._read_line(line_index)
+
+    def __iter__(self) -> Iterator[str]:
+        for _, key in self.items():
+            yield key
@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+
+class MetadataSnapshot:
+    """ Versioned on-disk metadata of the previous runs (exchange currencies and markets, chain ids, withdrawal
+    times), so a new run starts warm. Every key is kept in its own JSON file, so a put rewrites only that key.
+    Puts are written together after a short delay, the files are replaced atomically """
+
+    VERSION = 2  # Files of other versions are ignored
+    PATH = os.getenv('METADATA_SNAPSHOT_PATH', 'metadata')  # Directory. Empty path disables the snapshot
+    SAVE_DELAY = 1  # seconds
+
+    _default: Optional['MetadataSnapshot'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._entries: Dict[str, Optional[Tuple[float, Any]]] = {}  # key -> (save time, value). None - no value
+        self._dirty: Set[str] = set()
+        self._save_timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # Saves of the same key must not overlap
+
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def get_default() -> Optional['MetadataSnapshot']:
+        """ Method that returns the process-wide snapshot configured by METADATA_SNAPSHOT_PATH """
+
+        if not MetadataSnapshot.PATH:
+            return None
+
+        with MetadataSnapshot._default_lock:
+            if MetadataSnapshot._default is None:
+                MetadataSnapshot._default = MetadataSnapshot(MetadataSnapshot.PATH)
+
+            return MetadataSnapshot._default
+
+    def _get_file_path(self, key: str) -> str:
+        return os.path.join(self.path, re.sub(r'[^\w.-]', '_', key) + '.json')
+
+    def _load(self, key: str) -> Optional[Tuple[float, Any]]:
+        file_path = self._get_file_path(key)
+        if not os.path.exists(file_path):
+            return None
+
+        try:
+            with open(file_path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Unable to read the {key} metadata snapshot: {ex}")
+            return None
+
+        if data.get('version') != self.VERSION or data.get('key') != key:
+            return None
+
+        return data['saved_at'], data['value']
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        """ Method that returns (save time, value) of the key. The file is read on the first request """
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = self._load(key)
+
+            return self._entries[key]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._dirty.add(key)
+            self._schedule_save()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries[key] = None
+            self._dirty.add(key)
+            self._schedule_save()
+
+    def _schedule_save(self) -> None:
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.SAVE_DELAY, self._save)
+            self._save_timer.start()
+
+    def _save(self) -> None:
+        with self._write_lock:
+            with self._lock:
+                self._save_timer = None
+                changes = [(key, self._entries.get(key)) for key in self._dirty]
+                self._dirty.clear()
+
+            self._write(changes)
+
+    def _write(self, changes: List[Tuple[str, Optional[Tuple[float, Any]]]]) -> None:
+        for key, entry in changes:
+            file_path = self._get_file_path(key)
+            try:
+                if entry is None:
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                    continue
+
+                tmp_path = f"{file_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as file:
+                    json.dump({'version': self.VERSION, 'key': key, 'saved_at': entry[0], 'value': entry[1]}, file,
+                              separators=(',', ':'), default=str)
+                os.replace(tmp_path, file_path)
+            except OSError as ex:
+                logger.warning(f"Unable to save the {key} metadata snapshot: {ex}")
@@ -0,0 +1,45 @@
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """ Thread-safe token bucket. Rate is measured in tokens per second """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive. Got: {rate}")
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """ Method that takes tokens from the bucket and returns the delay (seconds) the caller must wait
+        before using them. Tokens can go negative, so the following callers are queued behind this one """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0
+
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1) -> None:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    def sync(self, available: float) -> None:
+        """ Method that lowers the bucket to the amount reported by the server (e.g. by the used weight header) """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate, available)
+            self._updated_at = now
@@ -38,12 +38,18 @@ class WalletHelper:
 
         return keys_dir
 
+    def get_keys_filename(self, filename: str = "") -> str:
+        if filename:
+            return filename
+
+        keys_dir = self._prepare_keys_directory()
+        current_date = datetime.now().strftime('%Y-%m-%d')
+        current_time = datetime.now().strftime('%H-%M-%S')
+
+        return f"{keys_dir}/private_keys_{current_date}_{current_time}.txt"
+
     def to_txt(self, private_keys: List[str], filename: str = "") -> None:
-        if not filename:
-            keys_dir = self._prepare_keys_directory()
-            current_date = datetime.now().strftime('%Y-%m-%d')
-            current_time = datetime.now().strftime('%H-%M-%S')
-            filename = f"{keys_dir}/private_keys_{current_date}_{current_time}.txt"
+        filename = self.get_keys_filename(filename)
 
         with open(filename, 'a') as file:
             for key in private_keys: